@@ -1,29 +1,79 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from extensions import db
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 from datetime import datetime, timedelta
-import time
-from sqlalchemy.exc import OperationalError
 
 # Import models
-from models import User, Household, Account, Integration, Category, Budget, Transaction, RecurringTransaction, BalanceHistory
+from models import User, Household, Account, Integration, Category, Budget, Transaction, RecurringTransaction, BalanceHistory, SyncJob, MonthlySummary
 from currency_utils import CurrencyConverter
-from integrations.bybit_client import BybitClient
-from integrations.trading212_client import Trading212Client
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_secret')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///local.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db.init_app(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'auth'
-
-@app.context_processor
+from export_utils import export_query, export_chunks, parse_day
+import health
+import history_cache
+import identity
+from history_utils import build_target_dates, resample
+from import_utils import import_transactions, detect_format, open_text
+import instrumentation
+import replica
+from recurring_utils import materialize_due
+from retention_utils import history_conditions
+from rollup_utils import record_transaction, unrecord_transaction, rebuild_after_unlink
+from sync_worker import sync_integrations_async, is_stale, enqueue_sync, CLIENTS as SYNC_CLIENTS
+
+bp = Blueprint('main', __name__)
+
+# Rows per page on the transactions page and its "load more" endpoint
+TRANSACTIONS_PAGE_SIZE = 50
+
+login_manager = LoginManager()
+login_manager.login_view = 'main.auth'
+
+def engine_options(database_url):
+    """
+    Connection pool settings from the environment. Each worker process has
+    its own pool, so workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) has to stay
+    below the server's max_connections.
+    """
+    options = {
+        # Check connections on checkout, so a database restart or an idle
+        # timeout costs a reconnect instead of a failed request
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') not in ('', '0', 'false'),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    if not database_url.startswith('sqlite'):
+        options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 5))
+        options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+        options['pool_timeout'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    return options
+
+def create_app(config=None):
+    """
+    Build the app, with `config` applied over the environment's settings.
+
+    Nothing here touches the database: the schema is set up beforehand by
+    `python migrations.py`, and the integration clients are only imported
+    by the first sync that uses them.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_secret')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///local.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if os.environ.get('REPLICA_DATABASE_URL'):
+        app.config['SQLALCHEMY_BINDS'] = {replica.REPLICA_BIND: os.environ['REPLICA_DATABASE_URL']}
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    instrumentation.init_app(app)
+    health.init_app(app)
+    replica.init_app(app)
+    app.register_blueprint(bp)
+    return app
+
+@bp.app_context_processor
 def inject_currency():
     def currency_symbol(currency_code):
         return CurrencyConverter.get_symbol(currency_code)
@@ -31,97 +81,48 @@ def inject_currency():
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-def wait_for_db(app):
-    with app.app_context():
-        retries = 5
-        while retries > 0:
-            try:
-                db.engine.connect()
-                print("Database connection successful!")
-                return
-            except OperationalError:
-                retries -= 1
-                print(f"Database not ready. Waiting... ({retries} retries left)")
-                time.sleep(5)
-        raise Exception("Could not connect to the database after multiple retries.")
-
-with app.app_context():
-    wait_for_db(app)
-    db.create_all()
-
-def sync_integrations_helper(household_id):
-    household = Household.query.get(household_id)
-    if not household:
-        return
-
-    integrations = household.integrations
-    if not integrations:
-        return
-
-    print(f"=== SYNC START: Found {len(integrations)} integrations ===")
-    
-    for i in integrations:
-        balance = 0.0
-        client = None
-        
-        print(f"Processing integration: {i.platform}")
-        
-        try:
-            if i.platform == 'bybit':
-                client = BybitClient(i.api_key, i.api_secret)
-            elif i.platform == 'trading212':
-                client = Trading212Client(i.api_key, i.api_secret)
-                
-            if client:
-                balance = client.get_balance()
-                
-                # Update or Create Account
-                account_name = f"{i.platform.capitalize()} Account"
-                account = Account.query.filter_by(name=account_name, household_id=household_id).first()
-                
-                if account:
-                    account.balance = balance
-                else:
-                    account = Account(name=account_name, type='Investment', balance=balance, household_id=household_id)
-                    db.session.add(account)
-                    db.session.flush()
-                
-                # Record History
-                history = BalanceHistory(
-                    account_id=account.id,
-                    balance=balance,
-                    invested_amount=account.invested_amount,
-                    date=datetime.utcnow()
-                )
-                db.session.add(history)
-                
-                # Update last_synced
-                i.last_synced = datetime.utcnow()
-                db.session.commit()
-                
-        except Exception as e:
-            print(f"Error syncing {i.platform}: {e}")
-            
-    print("=== SYNC COMPLETE ===")
+    return identity.load(int(user_id))
+
+def dashboard_summary(household_id, base_currency):
+    """
+    Income/expense totals (in base currency) and the 5 most recent transactions.
+    Both are computed by the database, so the cost doesn't grow with the ledger.
+    Totals come from the monthly rollup, summed per currency and converted at
+    query time, so they follow the household's current base currency.
+    """
+    rows = db.session.query(
+        MonthlySummary.type,
+        MonthlySummary.currency,
+        db.func.sum(MonthlySummary.total)
+    ).filter(
+        MonthlySummary.household_id == household_id,
+        MonthlySummary.type.in_(['income', 'expense'])
+    ).group_by(MonthlySummary.type, MonthlySummary.currency).all()
+
+    total_income = 0
+    total_expenses = 0
+    for type, currency, total in rows:
+        amount = CurrencyConverter.convert(total, currency, base_currency)
+        if type == 'income':
+            total_income += amount
+        else:
+            total_expenses += amount
+
+    recent_transactions = Transaction.query.filter_by(household_id=household_id).order_by(Transaction.date.desc()).limit(5).all()
+
+    return total_income, total_expenses, recent_transactions
 
-@app.route('/')
+@bp.route('/')
 @login_required
 def index():
     # Auto-refresh logic
+    # Balances are refreshed by the background sync worker, a stale
+    # integration only queues a job so the page never waits on the network
     household = current_user.household
-    integrations = household.integrations
-    should_sync = False
-    for i in integrations:
-        if not i.last_synced or (datetime.utcnow() - i.last_synced).total_seconds() > 86400:
-            should_sync = True
-            break
-            
-    if should_sync:
-        sync_integrations_helper(household.id)
-        # Reload household to get updated data
-        db.session.expire(household)
+    if any(is_stale(i) and i.platform in SYNC_CLIENTS for i in household.integrations):
+        # The job is the worker's business, nothing this user reads back
+        with replica.unstamped():
+            enqueue_sync(household.id)
 
     # Dashboard calculations
     base_currency = household.base_currency
@@ -132,11 +133,8 @@ def index():
         net_worth += CurrencyConverter.convert(account.balance, account.currency, base_currency)
         
     # Income/Expenses
-    transactions = Transaction.query.filter_by(household_id=household.id).order_by(Transaction.date.desc()).all()
-    total_income = sum(t.amount_in_base_currency for t in transactions if t.type == 'income')
-    total_expenses = sum(t.amount_in_base_currency for t in transactions if t.type == 'expense')
-    
-    recent_transactions = transactions[:5]
+    with replica.from_replica():
+        total_income, total_expenses, recent_transactions = dashboard_summary(household.id, base_currency)
     
     return render_template('dashboard.html', 
                          net_worth=net_worth, 
@@ -144,30 +142,27 @@ def index():
                          total_expenses=total_expenses,
                          recent_transactions=recent_transactions)
 
-@app.route('/set_currency', methods=['POST'])
+@bp.route('/set_currency', methods=['POST'])
 @login_required
 def set_currency():
     currency = request.form.get('currency')
     if currency in ['USD', 'EUR', 'MKD']:
-        current_user.household.base_currency = currency
-        
-        # Recalculate transactions
-        transactions = Transaction.query.filter_by(household_id=current_user.household.id).all()
-        for t in transactions:
-            t.amount_in_base_currency = CurrencyConverter.convert(t.amount, t.currency, currency)
-            
+        # Base-currency totals are derived at query time, so switching
+        # doesn't touch the transactions
+        db.session.get(Household, current_user.household_id).base_currency = currency
         db.session.commit()
+        identity.invalidate(current_user.household_id)
         flash(f'Currency switched to {currency}', 'success')
     
-    return redirect(request.referrer or url_for('index'))
+    return redirect(request.referrer or url_for('main.index'))
 
-@app.route('/auth', methods=['GET'])
+@bp.route('/auth', methods=['GET'])
 def auth():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     return render_template('auth.html')
 
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
     username = request.form.get('username')
     password = request.form.get('password')
@@ -175,12 +170,13 @@ def login():
     
     if user and check_password_hash(user.password_hash, password):
         login_user(user)
-        return redirect(url_for('index'))
+        identity.forget()
+        return redirect(url_for('main.index'))
     
     flash('Invalid username or password')
-    return redirect(url_for('auth'))
+    return redirect(url_for('main.auth'))
 
-@app.route('/register', methods=['POST'])
+@bp.route('/register', methods=['POST'])
 def register():
     username = request.form.get('username')
     password = request.form.get('password')
@@ -188,7 +184,7 @@ def register():
     
     if User.query.filter_by(username=username).first():
         flash('Username already exists')
-        return redirect(url_for('auth'))
+        return redirect(url_for('main.auth'))
         
     hashed_password = generate_password_hash(password)
     
@@ -205,48 +201,51 @@ def register():
         household = Household.query.filter_by(join_code=join_code).first()
         if not household:
             flash('Invalid Join Code')
-            return redirect(url_for('auth'))
+            return redirect(url_for('main.auth'))
             
     new_user = User(username=username, password_hash=hashed_password, household=household)
     db.session.add(new_user)
     db.session.commit()
     
     login_user(new_user)
-    return redirect(url_for('index'))
+    identity.forget()
+    return redirect(url_for('main.index'))
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('auth'))
+    identity.forget()
+    return redirect(url_for('main.auth'))
 
-@app.route('/household')
+@bp.route('/household')
 @login_required
 def household():
     household = current_user.household
     members = User.query.filter_by(household_id=household.id).all()
     return render_template('household.html', household=household, members=members)
 
-@app.route('/remove_member/<int:user_id>')
+@bp.route('/remove_member/<int:user_id>')
 @login_required
 def remove_member(user_id):
     if user_id == current_user.id:
         flash('You cannot remove yourself from the household!', 'warning')
-        return redirect(url_for('household'))
+        return redirect(url_for('main.household'))
     
     user = User.query.get_or_404(user_id)
     if user.household_id != current_user.household_id:
         flash('User not found in your household!', 'warning')
-        return redirect(url_for('household'))
+        return redirect(url_for('main.household'))
     
     username = user.username
     user.household_id = None
     db.session.commit()
+    identity.invalidate(current_user.household_id)
     
     flash(f'{username} has been removed from the household.', 'success')
-    return redirect(url_for('household'))
+    return redirect(url_for('main.household'))
 
-@app.route('/transactions', methods=['GET', 'POST'])
+@bp.route('/transactions', methods=['GET', 'POST'])
 @login_required
 def transactions():
     if request.method == 'POST':
@@ -292,8 +291,9 @@ def transactions():
             household_id=current_user.household_id
         )
         db.session.add(t)
+        record_transaction(t)
         db.session.commit()
-        return redirect(url_for('transactions'))
+        return redirect(url_for('main.transactions'))
     
     # Date Filtering Logic
     now = datetime.utcnow()
@@ -304,11 +304,44 @@ def transactions():
         month = now.month
         year = now.year
 
-    # Calculate start and end date of the month
+    return render_transactions(year, month)
+
+def transaction_page(household_id, start_date, end_date, before=None, limit=TRANSACTIONS_PAGE_SIZE):
+    """
+    One page of a household's transactions between start_date and end_date,
+    newest first. Keyset paginated on (date, id): `before` is the (date, id)
+    of the last row already shown. Returns (transactions, next_cursor), the
+    cursor being None on the last page. Category and income source are
+    joined in, so rendering the rows issues no further queries.
+    """
+    query = Transaction.query.options(
+        db.joinedload(Transaction.category),
+        db.joinedload(Transaction.income_source)
+    ).filter(
+        Transaction.household_id == household_id,
+        Transaction.date >= start_date,
+        Transaction.date <= end_date
+    )
+    if before:
+        query = query.filter(db.tuple_(Transaction.date, Transaction.id) < before)
+
+    transactions = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        next_cursor = (transactions[-1].date, transactions[-1].id)
+    return transactions, next_cursor
+
+def month_bounds(year, month):
     import calendar
     num_days = calendar.monthrange(year, month)[1]
-    start_date = datetime(year, month, 1)
-    end_date = datetime(year, month, num_days, 23, 59, 59)
+    return datetime(year, month, 1), datetime(year, month, num_days, 23, 59, 59)
+
+def render_transactions(year, month, edit_transaction=None):
+    # Calculate start and end date of the month
+    import calendar
+    start_date, end_date = month_bounds(year, month)
     
     # Navigation Logic
     curr_date = datetime(year, month, 1)
@@ -321,33 +354,116 @@ def transactions():
     next_month = next_date.month
     next_year = next_date.year
 
-    transactions = Transaction.query.filter(
-        Transaction.household_id==current_user.household_id,
-        Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).order_by(Transaction.date.desc()).all()
+    transactions, next_cursor = transaction_page(current_user.household_id, start_date, end_date)
     
     recurring = RecurringTransaction.query.filter_by(household_id=current_user.household_id).all()
     categories = Category.query.filter_by(household_id=current_user.household_id).all()
     integrations = Integration.query.filter_by(household_id=current_user.household_id).all()
-    income_sources = RecurringTransaction.query.filter_by(household_id=current_user.household_id, type='income').all()
+    income_sources = [r for r in recurring if r.type == 'income']
     
     return render_template('transactions.html', 
                          transactions=transactions, 
+                         next_cursor=next_cursor,
                          recurring=recurring, 
                          categories=categories, 
                          integrations=integrations, 
                          income_sources=income_sources, 
                          today=datetime.utcnow().strftime('%Y-%m-%d'),
+                         edit_transaction=edit_transaction,
                          month=month,
                          year=year,
                          prev_month=prev_month,
                          prev_year=prev_year,
                          next_month=next_month,
                          next_year=next_year,
-                         month_name=calendar.month_name[month])
+                         month_name=calendar.month_name[month],
+                         month_start=start_date,
+                         month_end=end_date)
 
-@app.route('/add_recurring', methods=['POST'])
+@bp.route('/api/transactions')
+@login_required
+def api_transactions():
+    """
+    "Load more" for the transactions page: the page of the month's
+    transactions after the cursor given by before_date/before_id.
+    """
+    now = datetime.utcnow()
+    try:
+        month = int(request.args.get('month', now.month))
+        year = int(request.args.get('year', now.year))
+        before = None
+        if request.args.get('before_id'):
+            before = (datetime.fromisoformat(request.args['before_date']), int(request.args['before_id']))
+    except (ValueError, TypeError, KeyError):
+        return jsonify({'error': 'Invalid month or cursor'}), 400
+
+    start_date, end_date = month_bounds(year, month)
+    transactions, next_cursor = transaction_page(current_user.household_id, start_date, end_date, before=before)
+
+    return jsonify({
+        'transactions': [{
+            'id': t.id,
+            'date': t.date.strftime('%Y-%m-%d'),
+            'description': t.description,
+            'category': t.category.name if t.category else None,
+            'income_source': t.income_source.description if t.income_source else None,
+            'type': t.type,
+            'currency_symbol': CurrencyConverter.get_symbol(t.currency),
+            'amount': t.amount,
+            'edit_url': url_for('main.edit_transaction', id=t.id),
+            'delete_url': url_for('main.delete_transaction', id=t.id)
+        } for t in transactions],
+        'next': {'before_date': next_cursor[0].isoformat(), 'before_id': next_cursor[1]} if next_cursor else None
+    })
+
+@bp.route('/transactions/import', methods=['POST'])
+@login_required
+def import_transactions_file():
+    file = request.files.get('file')
+    if not file or not file.filename:
+        flash('Choose a CSV or OFX file to import.', 'warning')
+        return redirect(url_for('main.transactions'))
+
+    format = request.form.get('format') or detect_format(file.filename)
+    # Uploads past a small size are spooled to disk by werkzeug, and the
+    # importer reads them a row at a time
+    stream = open_text(file.stream)
+    result = import_transactions(stream, format, current_user.household_id, current_user.id)
+
+    # Only the first flashed message is shown, so the errors go in the same one
+    message = f'Imported {result.imported} transactions.'
+    if result.error_count:
+        more = f' (and {result.error_count - 10} more)' if result.error_count > 10 else ''
+        message += f" {result.error_count} rows skipped: {'; '.join(result.errors[:10])}{more}"
+    flash(message, 'warning' if result.error_count else 'success')
+    return redirect(url_for('main.transactions'))
+
+@bp.route('/export/transactions')
+@login_required
+def export_transactions():
+    """
+    Streams the household's transactions as CSV (default) or JSON, filtered
+    by ?start=YYYY-MM-DD, ?end=YYYY-MM-DD and ?category_id.
+    """
+    format = request.args.get('format', 'csv')
+    try:
+        start = parse_day(request.args.get('start'))
+        end = parse_day(request.args.get('end'))
+        category_id = int(request.args['category_id']) if request.args.get('category_id') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date or category'}), 400
+    if format not in ('csv', 'json'):
+        return jsonify({'error': 'Format must be csv or json'}), 400
+
+    query = export_query(current_user.household_id, start, end, category_id)
+    filename = f"transactions-{datetime.utcnow().strftime('%Y%m%d')}.{format}"
+    return Response(
+        stream_with_context(export_chunks(format, query, current_user.household.base_currency)),
+        mimetype='application/json' if format == 'json' else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@bp.route('/add_recurring', methods=['POST'])
 @login_required
 def add_recurring():
     amount = float(request.form.get('amount'))
@@ -364,6 +480,7 @@ def add_recurring():
         description=description,
         frequency=frequency,
         next_due_date=next_due_date,
+        anchor_day=next_due_date.day,
         type=type,
         currency=currency,
         category_id=int(category_id) if category_id else None,
@@ -371,96 +488,54 @@ def add_recurring():
     )
     db.session.add(r)
     db.session.commit()
-    return redirect(url_for('transactions'))
+    return redirect(url_for('main.transactions'))
 
-@app.route('/delete_recurring/<int:id>')
+@bp.route('/delete_recurring/<int:id>')
 @login_required
 def delete_recurring(id):
     r = RecurringTransaction.query.get_or_404(id)
     if r.household_id == current_user.household_id:
         db.session.delete(r)
+        rebuild_after_unlink(r.household_id)
         db.session.commit()
-    return redirect(url_for('transactions'))
+    return redirect(url_for('main.transactions'))
 
-@app.route('/check_recurring')
+@bp.route('/check_recurring')
 @login_required
 def check_recurring():
-    recurring = RecurringTransaction.query.filter_by(household_id=current_user.household_id).all()
-    today = datetime.utcnow()
-    
-    count = 0
-    for r in recurring:
-        if r.next_due_date <= today:
-            # Calculate amount in base currency
-            base_currency = current_user.household.base_currency
-            amount_in_base = CurrencyConverter.convert(r.amount, r.currency, base_currency)
-
-            t = Transaction(
-                amount=r.amount,
-                currency=r.currency,
-                amount_in_base_currency=amount_in_base,
-                description=f"{r.description} (Recurring)",
-                type=r.type,
-                date=today,
-                category_id=r.category_id,
-                user_id=current_user.id,
-                household_id=current_user.household_id
-            )
-            db.session.add(t)
-            
-            if r.frequency == 'weekly':
-                r.next_due_date += timedelta(weeks=1)
-            elif r.frequency == 'monthly':
-                r.next_due_date += timedelta(days=30) 
-            elif r.frequency == 'yearly':
-                r.next_due_date += timedelta(days=365)
-                
-            count += 1
-            
-    db.session.commit()
+    # Same pass the worker runs for every household, limited to this one
+    count = materialize_due(household_id=current_user.household_id, user_id=current_user.id)
     flash(f'Processed {count} recurring transactions.')
-    return redirect(url_for('transactions'))
+    return redirect(url_for('main.transactions'))
 
-@app.route('/transactions/delete/<int:id>')
+@bp.route('/transactions/delete/<int:id>')
 @login_required
 def delete_transaction(id):
     t = Transaction.query.get_or_404(id)
     if t.household_id == current_user.household_id:
+        unrecord_transaction(t)
         db.session.delete(t)
         db.session.commit()
-    return redirect(url_for('transactions'))
+    return redirect(url_for('main.transactions'))
 
-@app.route('/transactions/edit/<int:id>')
+@bp.route('/transactions/edit/<int:id>')
 @login_required
 def edit_transaction(id):
     t = Transaction.query.get_or_404(id)
     if t.household_id != current_user.household_id:
         flash('Transaction not found', 'danger')
-        return redirect(url_for('transactions'))
+        return redirect(url_for('main.transactions'))
         
-    # Load context for the template
-    transactions = Transaction.query.filter_by(household_id=current_user.household_id).order_by(Transaction.date.desc()).all()
-    recurring = RecurringTransaction.query.filter_by(household_id=current_user.household_id).all()
-    categories = Category.query.filter_by(household_id=current_user.household_id).all()
-    integrations = Integration.query.filter_by(household_id=current_user.household_id).all()
-    income_sources = RecurringTransaction.query.filter_by(household_id=current_user.household_id, type='income').all()
-    
-    return render_template('transactions.html', 
-                         transactions=transactions, 
-                         recurring=recurring, 
-                         categories=categories, 
-                         integrations=integrations, 
-                         income_sources=income_sources, 
-                         today=datetime.utcnow().strftime('%Y-%m-%d'),
-                         edit_transaction=t)
+    # Show the month the transaction belongs to
+    return render_transactions(t.date.year, t.date.month, edit_transaction=t)
 
-@app.route('/transactions/update/<int:id>', methods=['POST'])
+@bp.route('/transactions/update/<int:id>', methods=['POST'])
 @login_required
 def update_transaction(id):
     t = Transaction.query.get_or_404(id)
     if t.household_id != current_user.household_id:
         flash('Transaction not found', 'danger')
-        return redirect(url_for('transactions'))
+        return redirect(url_for('main.transactions'))
         
     amount = float(request.form.get('amount'))
     description = request.form.get('description')
@@ -475,6 +550,9 @@ def update_transaction(id):
     base_currency = current_user.household.base_currency
     amount_in_base = CurrencyConverter.convert(amount, currency, base_currency)
     
+    # Move the transaction from its old rollup bucket to the new one
+    unrecord_transaction(t)
+    
     t.amount = amount
     t.currency = currency
     t.amount_in_base_currency = amount_in_base
@@ -484,12 +562,54 @@ def update_transaction(id):
     t.category_id = int(category_id) if category_id else None
     t.income_source_id = int(income_source_id) if income_source_id else None
     
+    record_transaction(t)
     db.session.commit()
     flash('Transaction updated successfully', 'success')
-    return redirect(url_for('transactions'))
+    return redirect(url_for('main.transactions'))
+
+def income_source_monthly_spent(income_sources, year, month):
+    """
+    Net spending per income source per month up to year/month, in the income
+    source's currency. Returns {income_source_id: {(year, month): spent}}.
+    Linked income transactions (e.g. cash added) reduce the spent amount,
+    expenses and investments increase it.
+    """
+    if not income_sources:
+        return {}
+
+    rows = db.session.query(
+        MonthlySummary.income_source_id,
+        MonthlySummary.year,
+        MonthlySummary.month,
+        MonthlySummary.currency,
+        MonthlySummary.type,
+        db.func.sum(MonthlySummary.total)
+    ).filter(
+        MonthlySummary.income_source_id.in_([inc.id for inc in income_sources]),
+        db.or_(
+            MonthlySummary.year < year,
+            db.and_(MonthlySummary.year == year, MonthlySummary.month <= month)
+        )
+    ).group_by(
+        MonthlySummary.income_source_id, MonthlySummary.year, MonthlySummary.month,
+        MonthlySummary.currency, MonthlySummary.type
+    ).all()
 
-@app.route('/budgets')
+    currencies = {inc.id: inc.currency for inc in income_sources}
+    spent = {}
+    for income_source_id, y, m, currency, type, total in rows:
+        # Convert each group sum to the income source's currency
+        amount = CurrencyConverter.convert(total, currency, currencies[income_source_id])
+        if type == 'income':
+            amount = -amount
+        by_month = spent.setdefault(income_source_id, {})
+        key = (int(y), int(m))
+        by_month[key] = by_month.get(key, 0) + amount
+    return spent
+
+@bp.route('/budgets')
 @login_required
+@replica.read_only
 def budgets():
     # Date Filtering Logic
     now = datetime.utcnow()
@@ -527,79 +647,29 @@ def budgets():
     # Get Income Sources
     income_sources = RecurringTransaction.query.filter_by(household_id=current_user.household_id, type='income').all()
     
-    # Calculate spent amount for each income source
     # Calculate spent amount and rollover for each income source
+    # Spending per income source per month, up to the viewed month, in one query
+    monthly_spent = income_source_monthly_spent(income_sources, year, month)
+    target_month = (year, month)
+    
     for inc in income_sources:
+        spent_by_month = monthly_spent.get(inc.id, {})
+        
         # 1. Calculate Rollover (Accumulated Surplus from previous months)
+        # Surplus = Income - Spent, summed over every month from the first
+        # linked transaction up to (not including) the month being viewed.
+        # Assumption: Income was same amount back then.
         rollover = 0
-        
-        # Find start date (earliest transaction or arbitrary start)
-        first_txn = Transaction.query.filter(
-            Transaction.income_source_id == inc.id
-        ).order_by(Transaction.date.asc()).first()
-        
-        if first_txn:
-            # Iteratively calculate surplus for previous months
-            # Start from the month of the first transaction
-            curr_iter_date = first_txn.date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            target_date = datetime(year, month, 1) # The month currently being viewed
-            
-            while curr_iter_date < target_date:
-                # Calculate start/end of iter month
-                import calendar
-                c_num_days = calendar.monthrange(curr_iter_date.year, curr_iter_date.month)[1]
-                c_start = curr_iter_date
-                c_end = datetime(curr_iter_date.year, curr_iter_date.month, c_num_days, 23, 59, 59)
-                
-                # Query spending for this past month
-                past_txns = Transaction.query.filter(
-                    Transaction.income_source_id == inc.id,
-                    Transaction.date >= c_start,
-                    Transaction.date <= c_end
-                ).all()
-                
-                past_month_spent = 0
-                for t in past_txns:
-                    amt = CurrencyConverter.convert(t.amount, t.currency, inc.currency)
-                    if t.type == 'income': 
-                         past_month_spent -= amt
-                    else:
-                         past_month_spent += amt
-                
-                # Surplus = Income - Spent
-                # Assumption: Income was same amount back then.
-                monthly_surplus = inc.amount - past_month_spent
-                rollover += monthly_surplus
-                
-                # Move to next month
-                # safe add month
-                next_month_iter = c_start.month + 1
-                next_year_iter = c_start.year
-                if next_month_iter > 12:
-                    next_month_iter = 1
-                    next_year_iter += 1
-                curr_iter_date = datetime(next_year_iter, next_month_iter, 1)
+        past_months = [m for m in spent_by_month if m < target_month]
+        if past_months:
+            first_year, first_month = min(past_months)
+            months_elapsed = (year - first_year) * 12 + (month - first_month)
+            rollover = inc.amount * months_elapsed - sum(spent_by_month[m] for m in past_months)
 
         inc.rollover = rollover
 
         # 2. Calculate Current Month Status
-        inc_spent = 0
-        # Filter Linked Transactions by Date Range
-        linked_transactions = Transaction.query.filter(
-            Transaction.income_source_id == inc.id,
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).all()
-        
-        for t in linked_transactions:
-            # Convert transaction amount to the income source's currency
-            amount_converted = CurrencyConverter.convert(t.amount, t.currency, inc.currency)
-            if t.type == 'income':
-                # If transaction is income (e.g. cash added), it reduces the 'spent' amount (increases remaining)
-                inc_spent -= amount_converted
-            else:
-                # Expenses or Investments increase spent amount
-                inc_spent += amount_converted
+        inc_spent = spent_by_month.get(target_month, 0)
         
         inc.spent = inc_spent
         
@@ -631,6 +701,24 @@ def budgets():
         # Convert to base currency for the total
         total_expected_income += CurrencyConverter.convert(monthly_amount, inc.currency, current_user.household.base_currency)
         
+    # Spending per category and currency for the month, in one query
+    # For expense budgets, we sum expenses
+    spent_rows = db.session.query(
+        MonthlySummary.category_id,
+        MonthlySummary.currency,
+        db.func.sum(MonthlySummary.total)
+    ).filter(
+        MonthlySummary.category_id.in_([b.category_id for b in expense_budgets]),
+        MonthlySummary.household_id == current_user.household_id,
+        MonthlySummary.type.in_(['expense', 'investment']),
+        MonthlySummary.year == year,
+        MonthlySummary.month == month
+    ).group_by(MonthlySummary.category_id, MonthlySummary.currency).all()
+    
+    category_spent = {}
+    for category_id, currency, total in spent_rows:
+        category_spent.setdefault(category_id, []).append((currency, total))
+
     # Calculate Total Budgeted (Expenses)
     total_budgeted = 0
     for b in expense_budgets:
@@ -638,18 +726,8 @@ def budgets():
         
         # Calculate spent for this budget
         spent = 0
-        # Filter Category Transactions by Date Range and Household
-        category_transactions = Transaction.query.filter(
-            Transaction.category_id == b.category_id, 
-            Transaction.household_id == current_user.household_id,
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).all()
-        
-        # For expense budgets, we sum expenses
-        for t in category_transactions:
-            if t.type in ['expense', 'investment']:
-                spent += CurrencyConverter.convert(t.amount, t.currency, b.currency)
+        for currency, total in category_spent.get(b.category_id, []):
+            spent += CurrencyConverter.convert(total, currency, b.currency)
         
         b.spent = spent
 
@@ -667,27 +745,23 @@ def budgets():
                          next_year=next_year,
                          month_name=calendar.month_name[month])
 
-@app.route('/settings', methods=['GET', 'POST'])
+@bp.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
     if request.method == 'POST':
         base_currency = request.form.get('base_currency')
         if base_currency in ['USD', 'EUR', 'MKD']:
-            current_user.household.base_currency = base_currency
-            
-            transactions = Transaction.query.filter_by(household_id=current_user.household_id).all()
-            for t in transactions:
-                t.amount_in_base_currency = CurrencyConverter.convert(t.amount, t.currency, base_currency)
-            
+            db.session.get(Household, current_user.household_id).base_currency = base_currency
             db.session.commit()
+            identity.invalidate(current_user.household_id)
             flash('Settings updated successfully!', 'success')
         else:
             flash('Invalid currency selected.', 'danger')
-        return redirect(url_for('settings'))
+        return redirect(url_for('main.settings'))
         
     return render_template('settings.html')
 
-@app.route('/add_category', methods=['POST'])
+@bp.route('/add_category', methods=['POST'])
 @login_required
 def add_category():
     name = request.form.get('name')
@@ -696,20 +770,21 @@ def add_category():
     db.session.add(c)
     db.session.commit()
     flash(f'Category "{name}" added successfully!', 'success')
-    return redirect(url_for('budgets'))
+    return redirect(url_for('main.budgets'))
 
-@app.route('/delete_category/<int:id>')
+@bp.route('/delete_category/<int:id>')
 @login_required
 def delete_category(id):
     c = Category.query.get_or_404(id)
     if c.household_id == current_user.household_id:
         Budget.query.filter_by(category_id=id).delete()
         db.session.delete(c)
+        rebuild_after_unlink(c.household_id)
         db.session.commit()
         flash(f'Category deleted successfully!', 'success')
-    return redirect(url_for('budgets'))
+    return redirect(url_for('main.budgets'))
 
-@app.route('/set_budget', methods=['POST'])
+@bp.route('/set_budget', methods=['POST'])
 @login_required
 def set_budget():
     category_id = request.form.get('category_id')
@@ -725,25 +800,26 @@ def set_budget():
         db.session.add(b)
     
     db.session.commit()
-    return redirect(url_for('budgets'))
+    return redirect(url_for('main.budgets'))
 
-@app.route('/delete_budget/<int:id>')
+@bp.route('/delete_budget/<int:id>')
 @login_required
 def delete_budget(id):
     b = Budget.query.get_or_404(id)
     if b.household_id == current_user.household_id:
         db.session.delete(b)
         db.session.commit()
-    return redirect(url_for('budgets'))
+    return redirect(url_for('main.budgets'))
 
-@app.route('/accounts')
+@bp.route('/accounts')
 @login_required
 def accounts():
     accounts = Account.query.filter_by(household_id=current_user.household_id).all()
     integrations = Integration.query.filter_by(household_id=current_user.household_id).all()
-    return render_template('accounts.html', accounts=accounts, integrations=integrations)
+    last_sync = SyncJob.query.filter_by(household_id=current_user.household_id).order_by(SyncJob.created_at.desc()).first()
+    return render_template('accounts.html', accounts=accounts, integrations=integrations, last_sync=last_sync)
 
-@app.route('/add_account', methods=['POST'])
+@bp.route('/add_account', methods=['POST'])
 @login_required
 def add_account():
     name = request.form.get('name')
@@ -753,18 +829,18 @@ def add_account():
     
     a = Account(name=name, type=type, balance=balance, invested_amount=invested_amount, household_id=current_user.household_id)
     db.session.commit()
-    return redirect(url_for('accounts'))
+    return redirect(url_for('main.accounts'))
 
-@app.route('/update_invested/<int:id>', methods=['POST'])
+@bp.route('/update_invested/<int:id>', methods=['POST'])
 @login_required
 def update_invested(id):
     account = Account.query.get_or_404(id)
     if account.household_id == current_user.household_id:
         account.invested_amount = float(request.form.get('invested_amount'))
         db.session.commit()
-    return redirect(url_for('accounts'))
+    return redirect(url_for('main.accounts'))
 
-@app.route('/add_integration', methods=['POST'])
+@bp.route('/add_integration', methods=['POST'])
 @login_required
 def add_integration():
     platform = request.form.get('platform')
@@ -774,31 +850,59 @@ def add_integration():
     i = Integration(platform=platform, api_key=api_key, api_secret=api_secret, household_id=current_user.household_id)
     db.session.add(i)
     db.session.commit()
-    return redirect(url_for('accounts'))
+    return redirect(url_for('main.accounts'))
 
-@app.route('/delete_integration/<int:id>')
+@bp.route('/delete_integration/<int:id>')
 @login_required
 def delete_integration(id):
     i = Integration.query.get_or_404(id)
     if i.household_id == current_user.household_id:
         db.session.delete(i)
         db.session.commit()
-    return redirect(url_for('accounts'))
+    return redirect(url_for('main.accounts'))
 
-@app.route('/sync_integrations')
+@bp.route('/sync_integrations')
 @login_required
-def sync_integrations():
-    sync_integrations_helper(current_user.household_id)
-    flash('Integrations synced successfully!', 'success')
-    return redirect(url_for('accounts'))
+async def sync_integrations():
+    # Flask runs an async view to completion on the request's thread, so
+    # this still holds a server thread for the whole sync, like the sync
+    # helper would. Syncs that overlap across households happen in the
+    # worker (see sync_worker.SyncWorker.run_jobs).
+    errors = await sync_integrations_async(current_user.household_id)
+    if errors:
+        flash(f'Some integrations could not be synced: {"; ".join(errors)}', 'warning')
+    else:
+        flash('Integrations synced successfully!', 'success')
+    return redirect(url_for('main.accounts'))
 
-@app.route('/api/history')
+@bp.route('/api/history')
 @login_required
+@replica.read_only
 def api_history():
     time_range = request.args.get('range', 'all')
     resolution = request.args.get('resolution', 'daily')
-    
     now = datetime.utcnow()
+    household = current_user.household
+
+    # Repeat views are answered from the household's history version alone,
+    # see history_cache
+    key = (household.id, time_range, resolution, household.base_currency)
+    tag = history_cache.etag(key, household.history_version, now.date())
+    if request.if_none_match.contains(tag):
+        response = Response(status=304)
+    else:
+        body = history_cache.get(key, tag)
+        if body is None:
+            body = history_response(household, time_range, resolution, now).get_data()
+            history_cache.put(key, tag, body)
+        response = Response(body, mimetype='application/json')
+
+    response.set_etag(tag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def history_response(household, time_range, resolution, now):
     start_date = None
     
     if time_range == '7d':
@@ -810,10 +914,18 @@ def api_history():
     elif time_range == '1y':
         start_date = now - timedelta(days=365)
 
-    accounts = Account.query.filter_by(household_id=current_user.household_id).all()
-    
-    history = BalanceHistory.query.join(Account).filter(
-        Account.household_id == current_user.household_id
+    accounts = Account.query.filter_by(household_id=household.id).all()
+    
+    # Only the columns and the points the chart needs (the last of each day
+    # or week, see retention_utils), already sorted for the merge below
+    history = db.session.query(
+        BalanceHistory.account_id,
+        BalanceHistory.date,
+        BalanceHistory.balance,
+        BalanceHistory.invested_amount
+    ).join(Account).filter(
+        Account.household_id == household.id,
+        *history_conditions(resolution, start_date)
     ).order_by(BalanceHistory.date).all()
     
     if not history:
@@ -822,66 +934,27 @@ def api_history():
     if not start_date:
         start_date = history[0].date
 
-    target_dates = []
-    current_date = start_date
-    
-    if resolution == 'daily':
-        current_date = current_date.replace(hour=23, minute=59, second=59)
-    elif resolution == 'weekly':
-        days_ahead = 6 - current_date.weekday()
-        current_date = current_date + timedelta(days=days_ahead)
-        current_date = current_date.replace(hour=23, minute=59, second=59)
-    
-    while current_date <= now:
-        target_dates.append(current_date)
-        if resolution == 'daily':
-            current_date += timedelta(days=1)
-        elif resolution == 'weekly':
-            current_date += timedelta(weeks=1)
-        elif resolution == 'monthly':
-            current_date += timedelta(days=30) 
-    
-    if not target_dates or target_dates[-1] < now:
-        target_dates.append(now)
+    target_dates = build_target_dates(start_date, now, resolution)
 
     from collections import defaultdict
     account_history = defaultdict(list)
     for h in history:
-        account_history[h.account_id].append(h)
+        account_history[h.account_id].append((h.date, h.balance, h.invested_amount))
 
     # Get base currency
-    base_currency = current_user.household.base_currency
+    base_currency = household.base_currency
     
-    # Map account ID to currency
-    account_currencies = {acc.id: acc.currency for acc in accounts}
-
     datasets = []
     labels = [d.strftime('%Y-%m-%d') for d in target_dates]
     
     for acc in accounts:
-        acc_history = account_history.get(acc.id, [])
-        balances = []
-        invested_amounts = []
-        acc_currency = account_currencies.get(acc.id, 'USD')
+        balances, invested_amounts = resample(account_history.get(acc.id, []), target_dates)
         
-        for target_date in target_dates:
-            last_record = None
-            for h in acc_history:
-                if h.date <= target_date:
-                    last_record = h
-                else:
-                    break
-            
-            if last_record:
-                # Convert balance and invested amount to base currency
-                converted_balance = CurrencyConverter.convert(last_record.balance, acc_currency, base_currency)
-                converted_invested = CurrencyConverter.convert(last_record.invested_amount, acc_currency, base_currency)
-                
-                balances.append(converted_balance)
-                invested_amounts.append(converted_invested)
-            else:
-                balances.append(0)
-                invested_amounts.append(0)
+        # Dates before the account's first record are charted as 0;
+        # the rest is converted to base currency in one pass per account
+        missing = balances.count(None)
+        balances = [0] * missing + CurrencyConverter.convert_many(balances[missing:], acc.currency, base_currency)
+        invested_amounts = [0] * missing + CurrencyConverter.convert_many(invested_amounts[missing:], acc.currency, base_currency)
         
         datasets.append({
             'label': f'{acc.name} (Current)',
@@ -905,4 +978,4 @@ def api_history():
     return jsonify({'datasets': datasets, 'labels': labels})
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5002, debug=True)
+    create_app().run(host='0.0.0.0', port=5002, debug=True)
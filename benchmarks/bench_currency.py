@@ -0,0 +1,54 @@
+"""
+Microbenchmark of scalar vs batch currency conversion.
+
+Converts N random amounts in mixed currencies to one base currency, once
+with a convert() call per row and once with a single convert_batch(), and
+checks both give the same values.
+
+Usage: python benchmarks/bench_currency.py [rows]
+"""
+import os
+import sys
+import random
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from currency_utils import CurrencyConverter
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    random.seed(42)
+
+    codes = list(CurrencyConverter.RATES)
+    amounts = [round(random.uniform(1, 5000), 2) for _ in range(n)]
+    currencies = [random.choice(codes) for _ in range(n)]
+    print(f"{n} rows, currencies {codes}")
+
+    t0 = time.perf_counter()
+    scalar = [CurrencyConverter.convert(a, c, 'EUR') for a, c in zip(amounts, currencies)]
+    scalar_time = time.perf_counter() - t0
+    print(f"convert() per row:         {scalar_time * 1000:.0f} ms")
+
+    t0 = time.perf_counter()
+    batch = CurrencyConverter.convert_batch(amounts, currencies, 'EUR')
+    batch_time = time.perf_counter() - t0
+    print(f"convert_batch() on lists:  {batch_time * 1000:.0f} ms")
+
+    # Rows that already come as arrays, e.g. columns fetched for a batch job
+    amount_array = np.asarray(amounts)
+    currency_array = np.asarray(currencies)
+    t0 = time.perf_counter()
+    CurrencyConverter.convert_batch(amount_array, currency_array, 'EUR')
+    array_time = time.perf_counter() - t0
+    print(f"convert_batch() on arrays: {array_time * 1000:.0f} ms")
+
+    assert np.array_equal(np.asarray(scalar, dtype=float), batch), "batch and scalar conversions differ"
+    print(f"speedup: {scalar_time / batch_time:.1f}x from lists, {scalar_time / array_time:.1f}x from arrays")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark for the dashboard totals.
+
+Fills a throwaway SQLite database with one household and N transactions,
+then compares time and peak Python memory of loading every transaction
+(the old index() path) against dashboard_summary().
+
+Usage: python benchmarks/bench_dashboard.py [transactions] [--skip-legacy]
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+from app import create_app, dashboard_summary
+from extensions import db
+from migrations import create_schema
+from models import Household, User, Transaction
+from rollup_utils import rebuild as rebuild_rollup
+
+app = create_app()
+
+
+def populate(n, chunk_size=50000):
+    household = Household(name='Bench', join_code='bench', base_currency='EUR')
+    db.session.add(household)
+    db.session.flush()
+    user = User(username='bench', password_hash='-', household_id=household.id)
+    db.session.add(user)
+    db.session.commit()
+
+    now = datetime.utcnow()
+    for offset in range(0, n, chunk_size):
+        rows = []
+        for _ in range(min(chunk_size, n - offset)):
+            amount = round(random.uniform(1, 500), 2)
+            rows.append({
+                'amount': amount,
+                'currency': 'EUR',
+                'amount_in_base_currency': amount,
+                'description': 'bench',
+                'date': now - timedelta(minutes=random.randint(0, 60 * 24 * 365 * 5)),
+                'type': random.choice(['income', 'expense', 'expense', 'investment']),
+                'user_id': user.id,
+                'household_id': household.id,
+            })
+        db.session.execute(db.insert(Transaction), rows)
+        db.session.commit()
+
+    # Bulk inserts bypass the rollup hooks, backfill it like a migration would
+    t0 = time.perf_counter()
+    rebuild_rollup(household_id=household.id)
+    db.session.commit()
+    print(f"rollup rebuild: {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return household.id
+
+
+def legacy_summary(household_id):
+    transactions = Transaction.query.filter_by(household_id=household_id).order_by(Transaction.date.desc()).all()
+    total_income = sum(t.amount_in_base_currency for t in transactions if t.type == 'income')
+    total_expenses = sum(t.amount_in_base_currency for t in transactions if t.type == 'expense')
+    return total_income, total_expenses, transactions[:5]
+
+
+def measure(label, func, household_id):
+    db.session.expunge_all()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func(household_id)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label}: {elapsed * 1000:.0f} ms, peak {peak / 1024 / 1024:.1f} MiB")
+    return result
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n = int(args[0]) if args else 1000000
+    random.seed(42)
+
+    with app.app_context():
+        create_schema()
+        print(f"populating {n} transactions...")
+        household_id = populate(n)
+
+        income, expenses, recent = measure('dashboard_summary', lambda h: dashboard_summary(h, 'EUR'), household_id)
+        if '--skip-legacy' not in sys.argv:
+            legacy = measure('legacy .all()', legacy_summary, household_id)
+            assert round(legacy[0], 2) == round(income, 2) and round(legacy[1], 2) == round(expenses, 2)
+            assert [t.date for t in legacy[2]] == [t.date for t in recent]
+
+    os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
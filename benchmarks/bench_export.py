@@ -0,0 +1,112 @@
+"""
+Benchmark for the streaming ledger export.
+
+Fills a throwaway SQLite database with one household and N transactions,
+then streams /export/transactions through the test client. Reports the
+time to the first rows, the total time and the peak RSS growth. The
+memory growth should stay flat as N grows.
+
+Usage: python benchmarks/bench_export.py [transactions] [--json]
+"""
+import os
+import sys
+import multiprocessing
+import random
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set before the populate process is spawned, so it uses the same database
+if 'BENCH_EXPORT_DB' not in os.environ:
+    os.environ['BENCH_EXPORT_DB'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+db_path = os.environ['BENCH_EXPORT_DB']
+os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from extensions import db
+from migrations import create_schema
+from models import Household, User, Category, Transaction
+
+app = create_app()
+
+
+def populate(n, chunk_size=50000):
+    random.seed(42)
+    with app.app_context():
+        create_schema()
+        _populate(n, chunk_size)
+
+
+def _populate(n, chunk_size):
+    household = Household(name='Bench', join_code='bench', base_currency='EUR')
+    db.session.add(household)
+    db.session.flush()
+    user = User(username='bench', password_hash=generate_password_hash('bench'), household_id=household.id)
+    category = Category(name='Food', type='expense', household_id=household.id)
+    db.session.add_all([user, category])
+    db.session.commit()
+
+    now = datetime.utcnow()
+    for offset in range(0, n, chunk_size):
+        rows = []
+        for _ in range(min(chunk_size, n - offset)):
+            amount = round(random.uniform(1, 500), 2)
+            rows.append({
+                'amount': amount,
+                'currency': 'EUR',
+                'amount_in_base_currency': amount,
+                'description': 'bench',
+                'date': now - timedelta(minutes=random.randint(0, 60 * 24 * 365 * 5)),
+                'type': 'expense',
+                'category_id': category.id if random.random() < 0.5 else None,
+                'user_id': user.id,
+                'household_id': household.id,
+            })
+        db.session.execute(Transaction.__table__.insert(), rows)
+        db.session.commit()
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n = int(args[0]) if args else 1000000
+    format = 'json' if '--json' in sys.argv else 'csv'
+
+    # Populate in a separate process, so its memory doesn't hide the export's peak
+    t0 = time.perf_counter()
+    process = multiprocessing.get_context('spawn').Process(target=populate, args=(n,))
+    process.start()
+    process.join()
+    print(f"populated {n} transactions in {time.perf_counter() - t0:.1f} s")
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    response = client.get(f'/export/transactions?format={format}', buffered=False)
+    first_rows = None
+    size = 0
+    lines = 0
+    for chunk in response.response:
+        # The first chunk is the CSV header or the opening bracket
+        if first_rows is None and size:
+            first_rows = time.perf_counter() - t0
+        size += len(chunk)
+        lines += chunk.count(b'\n')
+    total = time.perf_counter() - t0
+    response.close()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f"{format}: {size / 1e6:.1f} MB, {lines} lines")
+    print(f"first rows after {first_rows * 1000:.0f} ms, total {total:.1f} s ({n / total:.0f} rows/s)")
+    print(f"peak RSS {rss_after / 1024:.0f} MB (+{(rss_after - rss_before) / 1024:.0f} MB during export)")
+    os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark for the /api/history resampling.
+
+Compares the old per-target-date scan against the forward merge in
+history_utils on a synthetic multi-year BalanceHistory.
+
+Usage: python benchmarks/bench_history.py [years] [accounts]
+"""
+import os
+import sys
+import random
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from currency_utils import CurrencyConverter
+from history_utils import build_target_dates, resample
+
+
+def synthetic_history(years, accounts, syncs_per_day=3):
+    now = datetime.utcnow()
+    start = now - timedelta(days=365 * years)
+    history = {}
+    for acc_id in range(accounts):
+        points = []
+        date = start
+        balance = 1000.0
+        while date <= now:
+            balance = max(0.0, balance + random.uniform(-50, 55))
+            points.append((date, balance, 500.0))
+            date += timedelta(hours=24 / syncs_per_day)
+        history[acc_id] = points
+    return start, now, history
+
+
+def legacy_scan(points, target_dates, currency, base_currency):
+    balances = []
+    for target_date in target_dates:
+        last_record = None
+        for h in points:
+            if h[0] <= target_date:
+                last_record = h
+            else:
+                break
+        if last_record:
+            balances.append(CurrencyConverter.convert(last_record[1], currency, base_currency))
+        else:
+            balances.append(0)
+    return balances
+
+
+def merge(points, target_dates, currency, base_currency):
+    balances, _ = resample(points, target_dates)
+    missing = balances.count(None)
+    return [0] * missing + CurrencyConverter.convert_many(balances[missing:], currency, base_currency)
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    random.seed(42)
+
+    start, now, history = synthetic_history(years, accounts)
+    target_dates = build_target_dates(start, now, 'daily')
+    rows = sum(len(p) for p in history.values())
+    print(f"{accounts} accounts, {rows} history rows, {len(target_dates)} target dates")
+
+    t0 = time.perf_counter()
+    merged = [merge(p, target_dates, 'MKD', 'EUR') for p in history.values()]
+    merge_time = time.perf_counter() - t0
+    print(f"forward merge: {merge_time * 1000:.1f} ms")
+
+    t0 = time.perf_counter()
+    legacy = [legacy_scan(p, target_dates, 'MKD', 'EUR') for p in history.values()]
+    legacy_time = time.perf_counter() - t0
+    print(f"legacy scan:   {legacy_time * 1000:.1f} ms")
+
+    assert merged == legacy, "resampled series differ"
+    print(f"speedup: {legacy_time / merge_time:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
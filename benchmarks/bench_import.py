@@ -0,0 +1,118 @@
+"""
+Benchmark for the bulk transaction import.
+
+Writes a synthetic bank export with N rows (CSV or OFX, a few of them
+malformed) and imports it into a throwaway SQLite database. Reports the
+time, peak memory and errors, and checks that the monthly rollup
+matches a rebuild from the ledger.
+
+Usage: python benchmarks/bench_import.py [rows] [--ofx]
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+import resource
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+db_path = os.path.join(tmp_dir, 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+from app import create_app
+from extensions import db
+from import_utils import import_transactions
+from migrations import create_schema
+from models import Household, User, Category, Transaction, MonthlySummary
+from rollup_utils import rebuild as rebuild_rollup
+
+app = create_app()
+
+CURRENCIES = ['EUR', 'USD', 'MKD']
+CATEGORIES = ['Food', 'Rent', 'Travel', '']
+
+
+def rows(n):
+    start = datetime(2020, 1, 1)
+    for i in range(n):
+        date = start + timedelta(minutes=random.randint(0, 60 * 24 * 365 * 5))
+        amount = round(random.uniform(-500, 500), 2)
+        if i % 10000 == 9999:
+            # One malformed row in ten thousand
+            yield 'not-a-date', amount, random.choice(CURRENCIES), random.choice(CATEGORIES), i
+        else:
+            yield date, amount, random.choice(CURRENCIES), random.choice(CATEGORIES), i
+
+
+def write_csv(path, n):
+    with open(path, 'w', newline='') as f:
+        f.write('Date,Description,Amount,Currency,Category\n')
+        for date, amount, currency, category, i in rows(n):
+            day = date if isinstance(date, str) else date.strftime('%Y-%m-%d')
+            f.write(f'{day},Payee {i},{amount},{currency},{category}\n')
+
+
+def write_ofx(path, n):
+    with open(path, 'w') as f:
+        f.write('OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>EUR<BANKTRANLIST>\n')
+        for date, amount, _, _, i in rows(n):
+            day = date if isinstance(date, str) else date.strftime('%Y%m%d%H%M%S')
+            f.write(f'<STMTTRN><TRNTYPE>{"DEBIT" if amount < 0 else "CREDIT"}<DTPOSTED>{day}'
+                    f'<TRNAMT>{amount}<FITID>{i}<NAME>Payee {i}</STMTTRN>\n')
+        f.write('</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n')
+
+
+def rollup_snapshot(household_id):
+    return sorted(
+        (r.year, r.month, r.category_id or 0, r.type, r.currency, round(r.total, 2), r.count)
+        for r in MonthlySummary.query.filter_by(household_id=household_id)
+    )
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n = int(args[0]) if args else 100000
+    format = 'ofx' if '--ofx' in sys.argv else 'csv'
+    random.seed(42)
+
+    path = os.path.join(tmp_dir, f'export.{format}')
+    (write_ofx if format == 'ofx' else write_csv)(path, n)
+    print(f"{n} rows, {os.path.getsize(path) / 1e6:.1f} MB of {format.upper()}")
+
+    with app.app_context():
+        create_schema()
+        household = Household(name='Bench', join_code='bench', base_currency='EUR')
+        db.session.add(household)
+        db.session.flush()
+        user = User(username='bench', password_hash='-', household_id=household.id)
+        db.session.add(user)
+        db.session.add_all(Category(name=name, type='expense', household_id=household.id) for name in CATEGORIES if name)
+        db.session.commit()
+        household_id, user_id = household.id, user.id
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            result = import_transactions(f, format, household_id, user_id)
+        elapsed = time.perf_counter() - t0
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        print(f"import: {elapsed:.2f} s, {result.imported / elapsed:.0f} rows/s, "
+              f"peak RSS {rss_after / 1024:.0f} MB (+{(rss_after - rss_before) / 1024:.0f} MB)")
+        print(f"imported {result.imported}, {result.error_count} errors, e.g. {result.errors[:1]}")
+        assert Transaction.query.filter_by(household_id=household_id).count() == result.imported
+
+        live = rollup_snapshot(household_id)
+        rebuild_rollup(household_id=household_id)
+        db.session.commit()
+        assert live == rollup_snapshot(household_id), "rollup differs from a rebuild"
+        print("rollup matches a rebuild")
+
+    os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark for the recurring-transaction scheduler.
+
+Creates H households with R recurring items each, all due a year ago, on a
+throwaway SQLite database. Runs one materialize_due() pass, which catches
+up every missed occurrence, then a second pass that should create nothing.
+
+Usage: python benchmarks/bench_recurring.py [households] [items_per_household]
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+from app import create_app
+from extensions import db
+from migrations import create_schema
+from models import Household, User, RecurringTransaction, Transaction
+from recurring_utils import materialize_due
+
+app = create_app()
+
+
+def populate(households, items):
+    now = datetime.utcnow()
+    for h in range(households):
+        household = Household(name=f'Bench {h}', join_code=f'bench{h}', base_currency=random.choice(['EUR', 'USD', 'MKD']))
+        db.session.add(household)
+        db.session.flush()
+        db.session.add(User(username=f'bench{h}', password_hash='-', household_id=household.id))
+        for i in range(items):
+            due = now - timedelta(days=365 - random.randint(0, 27))
+            db.session.add(RecurringTransaction(
+                amount=round(random.uniform(5, 500), 2), currency=random.choice(['EUR', 'USD', 'MKD']),
+                description=f'Item {i}', frequency=random.choice(['weekly', 'monthly', 'monthly', 'yearly']),
+                next_due_date=due, anchor_day=due.day, type='expense', household_id=household.id
+            ))
+    db.session.commit()
+
+
+def main():
+    households = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    random.seed(42)
+
+    with app.app_context():
+        create_schema()
+        populate(households, items)
+        print(f"{households} households x {items} recurring items, due a year ago")
+
+        t0 = time.perf_counter()
+        created = materialize_due()
+        elapsed = time.perf_counter() - t0
+        print(f"first pass: {created} transactions in {elapsed:.2f} s ({created / elapsed:.0f}/s)")
+
+        t0 = time.perf_counter()
+        again = materialize_due()
+        print(f"second pass: {again} transactions in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        assert again == 0
+        assert Transaction.query.count() == created
+
+    os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark for balance history levels and compaction.
+
+Fills a throwaway SQLite database with Y years of history for A accounts,
+synced S times a day, and computes the levels like the migration does.
+Times /api/history for a few ranges in three ways: reading every point,
+reading only the points at the chart's level, and the same after
+compaction.
+
+Usage: python benchmarks/bench_retention.py [years] [accounts] [syncs_per_day]
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+from werkzeug.security import generate_password_hash
+
+import app as app_module
+import history_cache
+from app import create_app
+from extensions import db
+from migrations import create_schema
+from models import Household, User, Account, BalanceHistory
+from retention_utils import backfill_levels, compact
+
+app = create_app()
+
+URLS = [
+    '/api/history?range=all&resolution=weekly',
+    '/api/history?range=1y&resolution=daily',
+    '/api/history?range=30d&resolution=daily',
+]
+
+
+def populate(years, accounts, syncs_per_day):
+    household = Household(name='Bench', join_code='bench', base_currency='EUR')
+    db.session.add(household)
+    db.session.flush()
+    db.session.add(User(username='bench', password_hash=generate_password_hash('bench'), household_id=household.id))
+    now = datetime.utcnow()
+    for a in range(accounts):
+        account = Account(name=f'Account {a}', type='Investment', balance=0, currency='USD', household_id=household.id)
+        db.session.add(account)
+        db.session.flush()
+        rows = []
+        date = now - timedelta(days=365 * years)
+        while date < now:
+            rows.append({'account_id': account.id, 'balance': random.uniform(0, 1000), 'invested_amount': 500.0, 'date': date})
+            date += timedelta(hours=24 / syncs_per_day)
+        db.session.execute(BalanceHistory.__table__.insert(), rows)
+    db.session.commit()
+    backfill_levels(db.session.connection())
+    db.session.commit()
+
+
+def timed(client, url, runs=5):
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        history_cache._cache.clear()
+        client.get(url)
+    return (time.perf_counter() - t0) / runs * 1000
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    syncs_per_day = int(sys.argv[3]) if len(sys.argv) > 3 else 24
+    random.seed(42)
+
+    with app.app_context():
+        create_schema()
+        populate(years, accounts, syncs_per_day)
+        print(f"{BalanceHistory.query.count()} points ({years} years, {accounts} accounts, {syncs_per_day} syncs/day)")
+
+        client = app.test_client()
+        client.post('/login', data={'username': 'bench', 'password': 'bench'})
+
+        level_filter = app_module.history_conditions
+        app_module.history_conditions = lambda resolution, start_date=None: []
+        every_point = {url: timed(client, url) for url in URLS}
+        app_module.history_conditions = level_filter
+        by_level = {url: timed(client, url) for url in URLS}
+
+        t0 = time.perf_counter()
+        deleted = compact()
+        db.session.commit()
+        print(f"compaction deleted {deleted} points in {(time.perf_counter() - t0) * 1000:.0f} ms, "
+              f"{BalanceHistory.query.count()} left")
+        compacted = {url: timed(client, url) for url in URLS}
+
+        print(f"{'':45} {'all points':>10} {'by level':>10} {'compacted':>10}")
+        for url in URLS:
+            print(f"{url:45} {every_point[url]:>8.0f}ms {by_level[url]:>8.0f}ms {compacted[url]:>8.0f}ms")
+
+    os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Load test of the production server at different worker counts.
+
+Generates a household (generate_household.py, fixed seed), then for each
+worker count starts gunicorn with gunicorn.conf.py, waits for /healthz and
+has CLIENTS threads request the main pages in a loop over keep-alive
+connections for SECONDS. Reports requests per second and latency
+percentiles per worker count.
+
+The load generator runs on the same machine, so throughput stops scaling
+once the workers and the clients together saturate the CPUs.
+
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+
+Usage: python benchmarks/bench_serving.py [--workers 1 2 4] [--threads N] [--clients N] [--seconds N] [--profile NAME]
+"""
+import argparse
+import http.client
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+URLS = ['/', '/transactions', '/budgets', '/api/history?range=1y&resolution=daily']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/healthz')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('server did not become healthy')
+
+
+def login(port, username, password):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    body = urllib.parse.urlencode({'username': username, 'password': password})
+    conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    return response.getheader('Set-Cookie').split(';')[0]
+
+
+def client_loop(port, cookie, stop, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    i = 0
+    while not stop.is_set():
+        url = URLS[i % len(URLS)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            conn.request('GET', url, headers={'Cookie': cookie})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - t0)
+
+
+def load(port, cookie, clients, seconds):
+    stop = threading.Event()
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=client_loop, args=(port, cookie, stop, latencies, errors)) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def main():
+    from generate_household import PROFILES
+
+    parser = argparse.ArgumentParser(description='Load test gunicorn at different worker counts.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='small')
+    args = parser.parse_args()
+
+    db_path = None
+    if not os.environ.get('DATABASE_URL'):
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app
+    from generate_household import generate_household, PASSWORD
+    from migrations import create_schema
+
+    with create_app().app_context():
+        create_schema()
+        household = generate_household(args.profile, seed=42)
+
+    print(f"{args.clients} clients, {args.threads} threads per worker, {args.seconds:.0f} s per run, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'errors':>7}")
+    for workers in args.workers:
+        port = free_port()
+        env = dict(os.environ, PORT=str(port), WEB_WORKERS=str(workers), WEB_THREADS=str(args.threads), WEB_ACCESS_LOG='')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'app:create_app()'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for(port)
+            cookie = login(port, household['usernames'][0], PASSWORD)
+            # Warm every worker up before measuring
+            load(port, cookie, args.clients, 1)
+            latencies, errors = load(port, cookie, args.clients, args.seconds)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        print(f"{workers:>7} {len(latencies) / args.seconds:>8.0f} {statistics.median(latencies) * 1000:>6.0f}ms "
+              f"{p95 * 1000:>6.0f}ms {len(errors):>7}")
+
+    if db_path:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark for app startup, as a new worker process pays for it.
+
+Starts fresh Python processes that import the app, call create_app() and
+serve a first request (the login page), and reports the median of each
+step. Also lists which integration client libraries got imported, which
+should be none until a sync runs. The schema setup the app no longer does
+at import is timed separately, as `python migrations.py` would run it.
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, sys, time
+t0 = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.test_client().get('/auth')
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - t0,
+    'create_app': created - imported,
+    'first request': served - created,
+    'total': served - t0,
+    'loaded': [m for m in ('pybit', 'requests') if m in sys.modules],
+}))
+"""
+
+SCHEMA = """
+import json, time
+from app import create_app
+from migrations import create_schema
+with create_app().app_context():
+    t0 = time.perf_counter()
+    create_schema()
+    print(json.dumps({'schema': time.perf_counter() - t0}))
+"""
+
+
+def run(code, env):
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+
+    first = run(SCHEMA, env)
+    print(f"schema setup: {first['schema'] * 1000:.0f} ms on a new database, "
+          f"{run(SCHEMA, env)['schema'] * 1000:.0f} ms on an up-to-date one")
+
+    results = [run(WORKER, env) for _ in range(runs)]
+    for step in ('import', 'create_app', 'first request', 'total'):
+        print(f"{step:15} {statistics.median(r[step] for r in results) * 1000:>6.0f} ms")
+    print(f"client libraries loaded: {', '.join(results[0]['loaded']) or 'none'}")
+
+    os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark for integration syncs against a local fake upstream.
+
+Times BybitClient and full sync_integrations_helper runs with concurrency 1
+(the old sequential behaviour) and with the configured concurrency. The
+second sync of each pair reuses the cached clients, so it shows the saved
+connections and the skipped Trading212 Live attempt.
+
+Then syncs `households` more households, each with both integrations: once
+one after another with sync_integrations_helper, as the worker used to, and
+once as a single sync worker pass, whose jobs overlap their upstream calls
+on one event loop (up to SYNC_JOB_CONCURRENCY at a time).
+
+Usage: python benchmarks/bench_sync.py [delay_seconds] [concurrency] [households]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+from fake_upstream import FakeUpstream
+
+import sync_worker
+from app import create_app
+from extensions import db
+from migrations import create_schema
+from models import Household, Integration
+from integrations.bybit_client import BybitClient
+from integrations.trading212_client import Trading212Client
+
+
+def clients_for(url):
+    class FakeBybit(BybitClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, base_url=url, **kwargs)
+
+    class FakeTrading212(Trading212Client):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, base_url=f'{url}/t212/', **kwargs)
+
+    return {'bybit': FakeBybit, 'trading212': FakeTrading212}
+
+
+def timed(label, func, upstream=None):
+    requests_before = upstream.requests if upstream else 0
+    connections_before = upstream.connections if upstream else 0
+    t0 = time.perf_counter()
+    result = func()
+    line = f"{label}: {(time.perf_counter() - t0) * 1000:.0f} ms -> {result}"
+    if upstream:
+        line += (f" ({upstream.requests - requests_before} requests,"
+                 f" {upstream.connections - connections_before} new connections)")
+    print(line)
+    return result
+
+
+def add_households(count):
+    ids = []
+    for n in range(count):
+        household = Household(name=f'Bench {n}', join_code=f'bench-{n}')
+        db.session.add(household)
+        db.session.flush()
+        db.session.add(Integration(platform='bybit', api_key=f'k{n}', api_secret='s', household_id=household.id))
+        db.session.add(Integration(platform='trading212', api_key=f'k{n}', api_secret='s', household_id=household.id))
+        ids.append(household.id)
+    db.session.commit()
+    return ids
+
+
+def throughput(label, func, count, upstream):
+    # Fresh clients, so neither run profits from what the other learned
+    sync_worker._clients.clear()
+    t0 = time.perf_counter()
+    timed(label, func, upstream)
+    print(f"  {count / (time.perf_counter() - t0):.1f} households/s")
+
+
+def main():
+    delay = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+    households = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    # A demo Trading212 key, so the first sync pays for the failed Live attempt
+    app = create_app()
+    with FakeUpstream(delay=delay, t212_environment='demo') as upstream, app.app_context():
+        create_schema()
+        household = Household(name='Bench', join_code='bench')
+        db.session.add(household)
+        db.session.flush()
+        db.session.add(Integration(platform='bybit', api_key='k', api_secret='s', household_id=household.id))
+        db.session.add(Integration(platform='trading212', api_key='k', api_secret='s', household_id=household.id))
+        db.session.commit()
+
+        clients = clients_for(upstream.url)
+        # Measure real upstream calls, not the balance cache
+        sync_worker.BALANCE_CACHE_TTL = 0
+        print(f"upstream delay {delay * 1000:.0f} ms per request")
+
+        for workers in (1, concurrency):
+            sync_worker.SYNC_CONCURRENCY = workers
+            bybit = clients['bybit']('k', 's', max_workers=workers)
+            timed(f"bybit get_balance, concurrency {workers}", bybit.get_balance, upstream)
+            for run in (1, 2):
+                timed(f"household sync #{run}, concurrency {workers}",
+                      lambda: sync_worker.sync_integrations_helper(household.id, clients=clients), upstream)
+
+        ids = add_households(households)
+        throughput(f"{households} household syncs, one after another",
+                   lambda: sum(1 for h in ids if not sync_worker.sync_integrations_helper(h, clients=clients)),
+                   households, upstream)
+
+        for h in ids:
+            sync_worker.enqueue_sync(h)
+        worker = sync_worker.SyncWorker(app, clients=clients)
+        throughput(f"{households} household syncs, one worker pass (up to {sync_worker.SYNC_JOB_CONCURRENCY} at once)",
+                   lambda: len(worker.run_once()), households, upstream)
+
+    os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Query-plan check for the hot endpoints.
+
+Requests /budgets, /transactions, /api/history and /export/transactions
+for a small synthetic household, captures the SQL each one issues, runs
+EXPLAIN on it and asserts that the composite indexes on the ledger and
+rollup tables are used.
+
+Runs on a throwaway SQLite database unless DATABASE_URL is set (Postgres
+works too; give it enough rows that the planner prefers the indexes).
+
+Usage: python benchmarks/check_query_plans.py
+"""
+import os
+import sys
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+db_path = None
+if 'DATABASE_URL' not in os.environ:
+    db_path = os.path.join(tempfile.mkdtemp(), 'plans.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from extensions import db
+from migrations import create_schema
+from models import Household, User, Account, BalanceHistory, Category, Budget, Transaction, RecurringTransaction
+from retention_utils import backfill_levels
+from rollup_utils import rebuild as rebuild_rollup
+
+EXPECTED = {
+    '/budgets': ['ix_monthly_summary_income_source_month', 'ix_monthly_summary_household_month'],
+    '/transactions': ['ix_transaction_household_date'],
+    '/api/history?range=all&resolution=daily': ['ix_balance_history_account_level_date'],
+    '/export/transactions?start=2020-01-01': ['ix_transaction_household_date'],
+}
+
+
+def populate():
+    household = Household(name='Plans', join_code=f'plans{random.randint(0, 10 ** 6)}', base_currency='EUR')
+    db.session.add(household)
+    db.session.flush()
+    user = User(username=f'plans{household.id}', password_hash=generate_password_hash('plans'), household_id=household.id)
+    category = Category(name='Food', type='expense', household_id=household.id)
+    income = RecurringTransaction(amount=1000, currency='EUR', description='Salary', frequency='monthly',
+                                  next_due_date=datetime.utcnow(), type='income', household_id=household.id)
+    account = Account(name='Cash', type='Cash', balance=100, currency='EUR', household_id=household.id)
+    db.session.add_all([user, category, income, account])
+    db.session.flush()
+    db.session.add(Budget(category_id=category.id, amount_limit=300, currency='EUR', household_id=household.id))
+
+    now = datetime.utcnow()
+    for day in range(400):
+        db.session.add(Transaction(amount=10, currency='EUR', amount_in_base_currency=10, type='expense',
+                                   date=now - timedelta(days=day), category_id=category.id,
+                                   income_source_id=income.id, user_id=user.id, household_id=household.id))
+        db.session.add(BalanceHistory(account_id=account.id, balance=100 + day, invested_amount=0,
+                                      date=now - timedelta(days=day)))
+    db.session.commit()
+    # Bulk-added history has no levels yet, compute them like the migration does
+    backfill_levels(db.session.connection())
+    rebuild_rollup(household_id=household.id)
+    db.session.commit()
+    return user.username
+
+
+def explain(statement, parameters):
+    conn = db.session.connection()
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    else:
+        rows = conn.exec_driver_sql(f'EXPLAIN {statement}', parameters).fetchall()
+    return '\n'.join(' '.join(str(col) for col in row) for row in rows)
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        create_schema()
+        username = populate()
+
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': 'plans'})
+
+        failures = 0
+        for url, indexes in EXPECTED.items():
+            captured = []
+
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                if statement.lstrip().upper().startswith('SELECT'):
+                    captured.append((statement, parameters))
+
+            db.event.listen(db.engine, 'before_cursor_execute', capture)
+            response = client.get(url)
+            # Streamed responses only run their queries as the body is read
+            response.get_data()
+            db.event.remove(db.engine, 'before_cursor_execute', capture)
+            assert response.status_code == 200, f"{url} returned {response.status_code}"
+
+            plans = '\n'.join(explain(statement, parameters) for statement, parameters in captured)
+            for index in indexes:
+                used = index in plans
+                failures += not used
+                print(f"{'ok  ' if used else 'FAIL'} {url} uses {index}")
+
+    if db_path:
+        os.remove(db_path)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
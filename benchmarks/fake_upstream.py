@@ -0,0 +1,96 @@
+"""
+Local fake of the Bybit and Trading212 endpoints the integration clients use.
+
+Every response is delayed by `delay` seconds to stand in for real upstream
+latency. Point BybitClient at http://127.0.0.1:<port> and Trading212Client
+at http://127.0.0.1:<port>/t212/ through their base_url argument. Only
+`t212_environment` ('live' or 'demo') accepts Trading212 requests. The
+server speaks keep-alive HTTP/1.1 and counts requests and connections.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+WALLET_BALANCE = {
+    'retCode': 0,
+    'retMsg': 'OK',
+    'result': {'list': [{'totalEquity': '100.0', 'coin': [{'coin': 'USDT', 'usdValue': '10.0'}]}]},
+}
+
+COINS_BALANCE = {
+    'retCode': 0,
+    'retMsg': 'OK',
+    'result': {'balance': [{'coin': 'USDT', 'walletBalance': '5.0'}]},
+}
+
+T212_SUMMARY = {'totalValue': 250.0}
+
+
+class FakeUpstream:
+    def __init__(self, delay=0.2, port=0, t212_environment='live'):
+        self.delay = delay
+        self.t212_environment = t212_environment
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with upstream.lock:
+                    upstream.connections += 1
+
+            def do_GET(self):
+                with upstream.lock:
+                    upstream.requests += 1
+                time.sleep(upstream.delay)
+
+                path = urlparse(self.path).path
+                if path == '/v5/account/wallet-balance':
+                    body = WALLET_BALANCE
+                elif path == '/v5/asset/transfer/query-account-coins-balance':
+                    body = COINS_BALANCE
+                elif path.endswith('/equity/account/summary'):
+                    # Only the configured environment accepts the key
+                    if f'/{upstream.t212_environment}/' not in path:
+                        self.send_response(401)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    body = T212_SUMMARY
+                else:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,248 @@
+"""
+Synthetic household generator for benchmarks and local testing.
+
+Builds households that look like real ones at a chosen size: members,
+categories and budgets in mixed currencies, income sources and recurring
+items, years of daily transactions, investment accounts with integrations,
+and BalanceHistory synced several times a day. Rows go in through bulk
+Core inserts: the history points get their retention levels as they are
+generated and the rollup is rebuilt afterwards, like a migration would.
+
+Writes to DATABASE_URL, so it fills a local SQLite file or Postgres alike.
+Every member's password is "bench".
+
+Usage: python benchmarks/generate_household.py [--profile NAME] [--households N] [--seed N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'bench'
+CURRENCIES = ['USD', 'EUR', 'MKD']
+CHUNK_SIZE = 5000
+
+PROFILES = {
+    'small': dict(years=1, members=1, categories=30, transactions_per_day=5, recurring=10, accounts=2, syncs_per_day=1),
+    'medium': dict(years=3, members=2, categories=200, transactions_per_day=20, recurring=40, accounts=4, syncs_per_day=4),
+    'large': dict(years=5, members=4, categories=500, transactions_per_day=60, recurring=100, accounts=8, syncs_per_day=24),
+}
+
+# Integrations the generated households have, with the account a sync writes to
+INTEGRATIONS = [('bybit', 'Bybit Account'), ('trading212', 'Trading212 Account')]
+
+
+def insert(table, rows):
+    from extensions import db
+    for offset in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[offset:offset + CHUNK_SIZE])
+
+
+def add_categories(household_id, count, rng):
+    from extensions import db
+    from models import Category, Budget
+
+    types = ['expense'] * 8 + ['income', 'savings']
+    insert(Category.__table__, [
+        {'name': f'Category {i}', 'type': types[i % len(types)], 'household_id': household_id}
+        for i in range(count)
+    ])
+    categories = db.session.execute(
+        db.select(Category.id, Category.type).where(Category.household_id == household_id)
+    ).all()
+
+    insert(Budget.__table__, [
+        {'category_id': c.id, 'amount_limit': round(rng.uniform(50, 2000), 2), 'currency': rng.choice(CURRENCIES),
+         'period': 'monthly', 'household_id': household_id}
+        for c in categories if c.type != 'income' and rng.random() < 0.6
+    ])
+    return categories
+
+
+def add_recurring(household_id, count, expense_ids, now, rng):
+    from extensions import db
+    from models import RecurringTransaction
+
+    rows = []
+    for i in range(count):
+        # Every fourth item is an income source that budgets roll over from
+        income = i % 4 == 0
+        due = now + timedelta(days=rng.randint(1, 28))
+        rows.append({
+            'amount': round(rng.uniform(500, 5000) if income else rng.uniform(5, 500), 2),
+            'currency': rng.choice(CURRENCIES),
+            'description': f'{"Salary" if income else "Bill"} {i}',
+            'frequency': 'monthly' if income else rng.choice(['weekly', 'monthly', 'monthly', 'yearly']),
+            'next_due_date': due,
+            'anchor_day': due.day,
+            'type': 'income' if income else 'expense',
+            'category_id': None if income else rng.choice(expense_ids),
+            'household_id': household_id,
+        })
+    insert(RecurringTransaction.__table__, rows)
+    return db.session.execute(
+        db.select(RecurringTransaction.id).where(
+            RecurringTransaction.household_id == household_id,
+            RecurringTransaction.type == 'income'
+        )
+    ).scalars().all()
+
+
+def add_transactions(household_id, base_currency, user_ids, expense_ids, income_source_ids, years, per_day, now, rng):
+    from currency_utils import CurrencyConverter
+    from models import Transaction
+
+    start = now - timedelta(days=365 * years)
+    rows = []
+    for day in range(365 * years):
+        date = start + timedelta(days=day)
+        for _ in range(max(0, int(rng.gauss(per_day, per_day / 3)))):
+            kind = rng.choices(['expense', 'income', 'investment'], weights=[85, 10, 5])[0]
+            rows.append({
+                'amount': round(rng.lognormvariate(3, 1) if kind == 'expense' else rng.uniform(100, 3000), 2),
+                # Most spending is in the household's own currency
+                'currency': base_currency if rng.random() < 0.8 else rng.choice(CURRENCIES),
+                'description': f'{kind.capitalize()} {rng.randint(1, 500)}',
+                'date': date + timedelta(seconds=rng.randint(0, 86399)),
+                'type': kind,
+                'category_id': rng.choice(expense_ids) if kind == 'expense' else None,
+                'income_source_id': rng.choice(income_source_ids) if kind == 'expense' and income_source_ids and rng.random() < 0.3 else None,
+                'user_id': rng.choice(user_ids),
+                'household_id': household_id,
+            })
+
+    for offset in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[offset:offset + CHUNK_SIZE]
+        converted = CurrencyConverter.convert_batch(
+            np.array([r['amount'] for r in chunk]), np.array([r['currency'] for r in chunk]), base_currency
+        )
+        for row, amount in zip(chunk, converted.tolist()):
+            row['amount_in_base_currency'] = amount
+    insert(Transaction.__table__, rows)
+    return len(rows)
+
+
+def add_accounts(household_id, count, years, syncs_per_day, now, rng):
+    from extensions import db
+    from models import Account, BalanceHistory, Integration
+    from retention_utils import bucket_level, MONTHLY
+
+    names = [name for _, name in INTEGRATIONS] + [f'Account {i}' for i in range(max(0, count - len(INTEGRATIONS)))]
+    insert(Account.__table__, [
+        {'name': name, 'type': 'Investment' if i < len(INTEGRATIONS) or i % 2 else 'Cash',
+         'balance': 0.0, 'invested_amount': 0.0, 'currency': rng.choice(CURRENCIES), 'household_id': household_id}
+        for i, name in enumerate(names[:count])
+    ])
+    insert(Integration.__table__, [
+        {'platform': platform, 'api_key': 'bench', 'api_secret': 'bench', 'last_synced': now, 'household_id': household_id}
+        for platform, _ in INTEGRATIONS
+    ])
+    account_ids = db.session.execute(
+        db.select(Account.id).where(Account.household_id == household_id)
+    ).scalars().all()
+
+    # A random walk per account, with the levels retention_utils would give it
+    step = timedelta(hours=24 / syncs_per_day)
+    points = 0
+    for account_id in account_ids:
+        balance = invested = rng.uniform(1000, 50000)
+        dates = []
+        date = now - timedelta(days=365 * years)
+        while date < now:
+            dates.append(date)
+            date += step
+        rows = []
+        for date, following in zip(dates, dates[1:] + [None]):
+            balance = max(0.0, balance * rng.gauss(1.0003, 0.01))
+            invested += rng.choice([0.0, 0.0, 0.0, 100.0])
+            rows.append({
+                'account_id': account_id, 'balance': balance, 'invested_amount': invested, 'date': date,
+                'level': bucket_level(date, following) if following else MONTHLY,
+            })
+        insert(BalanceHistory.__table__, rows)
+        db.session.execute(
+            db.update(Account).where(Account.id == account_id).values(balance=balance, invested_amount=invested)
+        )
+        points += len(rows)
+    return points
+
+
+def generate_household(profile='medium', seed=None, **overrides):
+    """
+    Adds one synthetic household and commits. `overrides` replace single
+    settings of the profile. Returns a dict with its ids, the members'
+    usernames and row counts. Needs an app context.
+    """
+    from werkzeug.security import generate_password_hash
+
+    from extensions import db
+    from models import Household, User
+    from rollup_utils import rebuild
+
+    settings = dict(PROFILES[profile], **overrides)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    # The seed fixes the data, the join code stays unique so reruns can share a database
+    join_code = uuid.uuid4().hex[:8]
+    household = Household(name=f'Bench {join_code}', join_code=join_code, base_currency=rng.choice(CURRENCIES))
+    db.session.add(household)
+    db.session.flush()
+
+    password_hash = generate_password_hash(PASSWORD)
+    members = [User(username=f'bench-{join_code}-{m}', password_hash=password_hash, household_id=household.id)
+               for m in range(settings['members'])]
+    db.session.add_all(members)
+    db.session.flush()
+
+    categories = add_categories(household.id, settings['categories'], rng)
+    expense_ids = [c.id for c in categories if c.type == 'expense']
+    income_source_ids = add_recurring(household.id, settings['recurring'], expense_ids, now, rng)
+    transactions = add_transactions(
+        household.id, household.base_currency, [m.id for m in members], expense_ids, income_source_ids,
+        settings['years'], settings['transactions_per_day'], now, rng
+    )
+    points = add_accounts(household.id, settings['accounts'], settings['years'], settings['syncs_per_day'], now, rng)
+
+    # Bulk inserts bypass the rollup hooks
+    rebuild(household_id=household.id)
+    db.session.commit()
+
+    return {
+        'household_id': household.id,
+        'usernames': [m.username for m in members],
+        'settings': settings,
+        'transactions': transactions,
+        'history_points': points,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add synthetic households to the database at DATABASE_URL.')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='medium')
+    parser.add_argument('--households', type=int, default=1)
+    parser.add_argument('--seed', type=int, help='make the data reproducible')
+    args = parser.parse_args()
+
+    from app import create_app
+    from migrations import create_schema
+    with create_app().app_context():
+        create_schema()
+        for h in range(args.households):
+            t0 = time.perf_counter()
+            seed = None if args.seed is None else args.seed + h
+            result = generate_household(args.profile, seed=seed)
+            print(f"Household {result['household_id']} ({', '.join(result['usernames'])}): "
+                  f"{result['transactions']} transactions, {result['history_points']} history points "
+                  f"in {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
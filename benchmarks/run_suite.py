@@ -0,0 +1,232 @@
+"""
+Benchmark suite on a synthetic household.
+
+Generates one household with generate_household.py (fixed seed, so every
+run sees the same data) and times the main code paths against it:
+index, transactions, budgets, api_history (from its response cache and
+computed), set_currency and a sync_integrations_helper run with the stub
+clients. Each case runs once to warm up and then RUNS times. The median
+time and the SQL statements per run are recorded. Requests are made
+outside any app context, so each gets its own, as in production: the
+logged-in user is loaded and the session starts empty every time.
+
+Results are saved as JSON under benchmarks/results/, one file per run with
+the commit it ran on. Each run is compared with the latest earlier run of
+the same profile, database and RESULTS_FORMAT. A case whose median got
+THRESHOLD percent slower, or that runs more statements than before, is
+reported as a regression and the script exits with status 1.
+
+Uses a throwaway SQLite database unless DATABASE_URL is set, e.g. to a local
+Postgres.
+
+Usage: python benchmarks/run_suite.py [--profile NAME] [--runs N] [--threshold PCT] [--no-save]
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Slowdowns under this many milliseconds are noise, whatever the percentage
+MIN_REGRESSION_MS = 1.0
+# Bumped when the measurement changes, so earlier results aren't compared.
+# 2: each request in its own app context
+RESULTS_FORMAT = 2
+
+
+def git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_cases(app, client, household_id):
+    import history_cache
+    import sync_worker
+
+    def get(url):
+        def run():
+            response = client.get(url)
+            assert response.status_code == 200, f'{url}: {response.status_code}'
+        return run
+
+    def uncached(url):
+        fetch = get(url)
+        def run():
+            history_cache._cache.clear()
+            fetch()
+        return run
+
+    currencies = iter(['USD', 'EUR'] * 1000)
+
+    def set_currency():
+        response = client.post('/set_currency', data={'currency': next(currencies)})
+        assert response.status_code == 302, f'/set_currency: {response.status_code}'
+
+    def sync():
+        # The stub clients answer at once, so this times the bookkeeping
+        # around the upstream calls
+        with app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+            errors = sync_worker.sync_integrations_helper(household_id, clients=sync_worker.LOCAL_CLIENTS)
+        assert not errors, errors
+
+    sync_worker.BALANCE_CACHE_TTL = 0
+
+    return [
+        ('index', get('/')),
+        ('transactions', get('/transactions')),
+        ('budgets', get('/budgets')),
+        ('api_history all weekly', get('/api/history?range=all&resolution=weekly')),
+        ('api_history 1y daily', get('/api/history?range=1y&resolution=daily')),
+        ('api_history 30d daily', get('/api/history?range=30d&resolution=daily')),
+        ('api_history 1y daily uncached', uncached('/api/history?range=1y&resolution=daily')),
+        ('set_currency', set_currency),
+        ('sync_integrations_helper', sync),
+    ]
+
+
+def measure(run, runs, statements):
+    run()
+    times = []
+    counts = []
+    for _ in range(runs):
+        before = statements[0]
+        t0 = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - t0) * 1000)
+        counts.append(statements[0] - before)
+    return {
+        'median_ms': round(statistics.median(times), 3),
+        'min_ms': round(min(times), 3),
+        'max_ms': round(max(times), 3),
+        'queries': max(counts),
+    }
+
+
+def previous_result(profile, database):
+    for path in sorted(glob.glob(os.path.join(RESULTS_DIR, '*.json')), reverse=True):
+        with open(path) as f:
+            result = json.load(f)
+        if (result.get('profile') == profile and result.get('database') == database
+                and result.get('format', 1) == RESULTS_FORMAT):
+            return path, result
+    return None, None
+
+
+def compare(cases, previous, threshold):
+    """Prints the cases next to the previous run. Returns the names that regressed."""
+    regressions = []
+    print(f"{'case':30} {'median':>10} {'before':>10} {'change':>8} {'queries':>8} {'before':>7}")
+    for name, current in cases.items():
+        before = (previous or {}).get('cases', {}).get(name)
+        if not before:
+            print(f"{name:30} {current['median_ms']:>8.1f}ms {'-':>10} {'-':>8} {current['queries']:>8} {'-':>7}")
+            continue
+
+        change = (current['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0.0
+        slower = change > threshold and current['median_ms'] - before['median_ms'] > MIN_REGRESSION_MS
+        more_queries = current['queries'] > before['queries']
+        flag = '  REGRESSION' if slower or more_queries else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:30} {current['median_ms']:>8.1f}ms {before['median_ms']:>8.1f}ms {change:>+7.0f}% "
+              f"{current['queries']:>8} {before['queries']:>7}{flag}")
+    return regressions
+
+
+def main():
+    from generate_household import PROFILES
+
+    parser = argparse.ArgumentParser(description='Time the main code paths on a synthetic household.')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='medium')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--threshold', type=float, default=25.0, help='percent slowdown reported as a regression')
+    parser.add_argument('--no-save', action='store_true', help="don't store the results")
+    args = parser.parse_args()
+
+    db_path = None
+    if not os.environ.get('DATABASE_URL'):
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from sqlalchemy import event
+
+    from app import create_app
+    from extensions import db
+    from generate_household import generate_household, PASSWORD
+    from migrations import create_schema
+
+    app = create_app()
+    with app.app_context():
+        create_schema()
+        t0 = time.perf_counter()
+        household = generate_household(args.profile, seed=42)
+        print(f"{args.profile}: {household['transactions']} transactions, {household['history_points']} history points, "
+              f"generated in {time.perf_counter() - t0:.1f} s")
+        engine = db.engine
+
+    # Outside the app context above, or every request would share its g
+    # (the loaded user) and its session
+    client = app.test_client()
+    client.post('/login', data={'username': household['usernames'][0], 'password': PASSWORD})
+
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    event.listen(engine, 'after_cursor_execute', count)
+    cases = {name: measure(run, args.runs, statements) for name, run in build_cases(app, client, household['household_id'])}
+    event.remove(engine, 'after_cursor_execute', count)
+    database = engine.dialect.name
+
+    result = {
+        'format': RESULTS_FORMAT,
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'database': database,
+        'profile': args.profile,
+        'settings': household['settings'],
+        'runs': args.runs,
+        'cases': cases,
+    }
+
+    previous_path, previous = previous_result(args.profile, database)
+    if previous_path:
+        print(f"compared with {os.path.basename(previous_path)} ({previous['commit']})")
+    regressions = compare(cases, previous, args.threshold)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{result['timestamp'].replace(':', '')}-{result['commit'] or 'unknown'}.json")
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"saved {os.path.relpath(path, ROOT)}")
+
+    if db_path:
+        os.remove(db_path)
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+import numpy as np
+
 class CurrencyConverter:
     # Static rates for now (Base: USD)
     RATES = {
@@ -28,6 +30,52 @@ class CurrencyConverter:
         
         return round(target_amount, 2)
 
+    @staticmethod
+    def convert_many(amounts, from_currency, to_currency):
+        """
+        Convert a list of amounts that share one currency pair.
+        """
+        if from_currency == to_currency:
+            return list(amounts)
+
+        return CurrencyConverter.convert_batch(amounts, from_currency, to_currency).tolist()
+
+    @staticmethod
+    def rates_for(currencies):
+        """
+        USD rate of every currency code in `currencies`, as an array of the
+        same shape. Unknown codes get 1.0, like in convert().
+        """
+        currencies = np.asarray(currencies)
+        if currencies.ndim == 0:
+            return np.float64(CurrencyConverter.RATES.get(currencies.item(), 1.0))
+
+        # One vectorised comparison per known currency
+        rates = np.ones(currencies.shape)
+        for code, rate in CurrencyConverter.RATES.items():
+            if rate != 1.0:
+                rates[currencies == code] = rate
+        return rates
+
+    @staticmethod
+    def convert_batch(amounts, from_currencies, to_currencies):
+        """
+        Convert many amounts in one array operation.
+
+        `from_currencies` and `to_currencies` are either a sequence of codes
+        as long as `amounts` or a single code for every row. Returns a NumPy
+        array with the same values convert() gives row by row.
+        """
+        amounts = np.asarray(amounts, dtype=float)
+        from_currencies = np.asarray(from_currencies)
+        to_currencies = np.asarray(to_currencies)
+
+        converted = amounts / CurrencyConverter.rates_for(from_currencies) * CurrencyConverter.rates_for(to_currencies)
+        converted = np.round(converted, 2)
+
+        # Same-currency rows are passed through unrounded, as in convert()
+        return np.where(from_currencies == to_currencies, amounts, converted)
+
     @staticmethod
     def get_symbol(currency):
         return CurrencyConverter.SYMBOLS.get(currency, currency)
@@ -0,0 +1,145 @@
+"""
+Streaming export of a household's ledger, as CSV or JSON.
+
+The filters go into the SQL, and the rows are read with yield_per: a
+server-side cursor on Postgres, batched fetches on SQLite. They are
+encoded one batch at a time, so memory use doesn't depend on the size of
+the ledger and the first bytes go out as soon as the first batch is read.
+
+Amounts are also given in the household's current base currency, converted
+one batch at a time as the rows are encoded; the column header names the
+currency. The stored amount_in_base_currency isn't used, it's a snapshot
+in whatever the base currency was when the row was entered.
+
+Usage: python export_utils.py --household ID [--format csv|json] [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--category ID] [-o FILE]
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime, timedelta
+
+from currency_utils import CurrencyConverter
+from extensions import db
+from models import Category, Household, RecurringTransaction, Transaction
+
+BATCH_SIZE = 2000
+
+def columns(base_currency):
+    return ['id', 'date', 'description', 'type', 'amount', 'currency',
+            f'amount_in_{base_currency}', 'category', 'income_source']
+
+def export_query(household_id, start=None, end=None, category_id=None):
+    """The select for a household's transactions, oldest first. `end` is inclusive."""
+    query = db.select(
+        Transaction.id,
+        Transaction.date,
+        Transaction.description,
+        Transaction.type,
+        Transaction.amount,
+        Transaction.currency,
+        Category.name.label('category'),
+        RecurringTransaction.description.label('income_source')
+    ).outerjoin(
+        Category, Transaction.category_id == Category.id
+    ).outerjoin(
+        RecurringTransaction, Transaction.income_source_id == RecurringTransaction.id
+    ).where(
+        Transaction.household_id == household_id
+    ).order_by(Transaction.date, Transaction.id)
+
+    if start:
+        query = query.where(Transaction.date >= start)
+    if end:
+        query = query.where(Transaction.date < end + timedelta(days=1))
+    if category_id:
+        query = query.where(Transaction.category_id == category_id)
+    return query
+
+def batches(query, batch_size=BATCH_SIZE):
+    """Yields lists of rows, `batch_size` at a time, from a streaming cursor."""
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+def format_rows(partition, base_currency):
+    base_amounts = CurrencyConverter.convert_batch(
+        [row.amount for row in partition],
+        [row.currency for row in partition],
+        base_currency
+    ).tolist()
+    return [
+        [
+            row.id,
+            row.date.isoformat() if row.date else None,
+            row.description,
+            row.type,
+            row.amount,
+            row.currency,
+            base_amount,
+            row.category,
+            row.income_source
+        ]
+        for row, base_amount in zip(partition, base_amounts)
+    ]
+
+def csv_chunks(query, base_currency, batch_size=BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns(base_currency))
+    yield buffer.getvalue()
+
+    for partition in batches(query, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(format_rows(partition, base_currency))
+        yield buffer.getvalue()
+
+def json_chunks(query, base_currency, batch_size=BATCH_SIZE):
+    names = columns(base_currency)
+    yield '['
+    first = True
+    for partition in batches(query, batch_size):
+        chunk = ',\n'.join(json.dumps(dict(zip(names, values))) for values in format_rows(partition, base_currency))
+        yield ('\n' if first else ',\n') + chunk
+        first = False
+    yield '\n]\n'
+
+def export_chunks(format, query, base_currency, batch_size=BATCH_SIZE):
+    if format == 'json':
+        return json_chunks(query, base_currency, batch_size)
+    return csv_chunks(query, base_currency, batch_size)
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a household's transactions.")
+    parser.add_argument('--household', type=int, required=True)
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+    parser.add_argument('--start', type=parse_day, help='first day, YYYY-MM-DD')
+    parser.add_argument('--end', type=parse_day, help='last day, YYYY-MM-DD')
+    parser.add_argument('--category', type=int, help='only this category id')
+    parser.add_argument('-o', '--output', help='file to write, stdout by default')
+    args = parser.parse_args()
+
+    from app import create_app
+    with create_app().app_context():
+        household = db.session.get(Household, args.household)
+        if household is None:
+            parser.error(f"household {args.household} not found")
+        query = export_query(args.household, args.start, args.end, args.category)
+        out = open(args.output, 'w', newline='') if args.output else sys.stdout
+        try:
+            for chunk in export_chunks(args.format, query, household.base_currency):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+
+if __name__ == '__main__':
+    main()
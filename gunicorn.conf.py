@@ -0,0 +1,35 @@
+"""
+Production server settings, read by gunicorn from the working directory:
+
+    gunicorn 'app:create_app()'
+
+Preforked worker processes with a few threads each, so a slow request
+(a sync waiting on an exchange) doesn't hold up the rest. Every setting can
+be overridden from the environment. The master process waits for the
+database to be reachable and migrated before it starts any worker.
+
+`python app.py` stays the single-process development server.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5002)}"
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Keep at most DB_POOL_SIZE, so no thread waits for a connection
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+keepalive = 5
+# Set WEB_ACCESS_LOG empty to turn the access log off
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-') or None
+
+def on_starting(server):
+    from app import create_app
+    from extensions import db
+    from health import wait_until_healthy
+
+    app = create_app()
+    with app.app_context():
+        wait_until_healthy()
+        # Connections mustn't be shared with the forked workers
+        db.engine.dispose()
@@ -0,0 +1,76 @@
+"""
+Health checks of the database the app depends on.
+
+check() lists what keeps the app from serving: the database or its read
+replica can't be reached, or the schema is missing migrations. The
+production server waits on it before starting any worker (see
+gunicorn.conf.py), migrations.py waits for the database to be reachable,
+and /healthz serves it to load balancers and the container's health check.
+"""
+import os
+import time
+
+from flask import jsonify
+from sqlalchemy.exc import DBAPIError
+
+from extensions import db
+from replica import REPLICA_BIND
+
+# Seconds to wait at startup for the database to become healthy
+HEALTH_TIMEOUT = float(os.environ.get('HEALTH_TIMEOUT', 60))
+HEALTH_INTERVAL = float(os.environ.get('HEALTH_INTERVAL', 2))
+
+def check(schema=True):
+    """
+    Problems that keep the app from serving, empty if there are none. With
+    `schema`, pending migrations count as a problem. Needs an app context.
+
+    /healthz serves these unauthenticated, so they never include the
+    driver's error, which can name the database host, port and user; that
+    is only printed to the log.
+    """
+    from migrations import pending_versions
+
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(db.text('SELECT 1'))
+            pending = pending_versions(conn) if schema else []
+    except DBAPIError as e:
+        print(f"Health check: database unreachable: {e.orig}")
+        return ["database unreachable"]
+
+    problems = []
+    if pending:
+        problems.append(f"pending migrations: {', '.join(str(v) for v in pending)}, run python migrations.py")
+
+    if REPLICA_BIND in db.engines:
+        try:
+            with db.engines[REPLICA_BIND].connect() as conn:
+                conn.execute(db.text('SELECT 1'))
+        except DBAPIError as e:
+            print(f"Health check: read replica unreachable: {e.orig}")
+            problems.append("read replica unreachable")
+    return problems
+
+def wait_until_healthy(schema=True, timeout=None, interval=None):
+    """Retry check() until it passes. Raises RuntimeError once `timeout` seconds have passed."""
+    timeout = HEALTH_TIMEOUT if timeout is None else timeout
+    interval = HEALTH_INTERVAL if interval is None else interval
+    deadline = time.monotonic() + timeout
+    while True:
+        problems = check(schema)
+        if not problems:
+            print("Database connection successful!")
+            return
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"Database not healthy after {timeout:.0f}s: {'; '.join(problems)}")
+        print(f"Database not ready, retrying in {interval:.0f}s: {'; '.join(problems)}")
+        time.sleep(interval)
+
+def healthz():
+    problems = check()
+    return jsonify({'status': 'error' if problems else 'ok', 'problems': problems}), 503 if problems else 200
+
+def init_app(app):
+    """Serve /healthz on `app`."""
+    app.add_url_rule('/healthz', 'healthz', healthz)
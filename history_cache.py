@@ -0,0 +1,92 @@
+"""
+Response cache for /api/history.
+
+The history chart only changes when an account's balance history does, so
+every household carries a history_version, bumped in the same database
+transaction as the write:
+
+- when a BalanceHistory point is added or deleted, or an account is added,
+  deleted, renamed or changes currency, by the before_flush hook below
+- when compaction bulk-deletes points, by retention_utils.compact()
+
+Each response gets an ETag from the household's history version and the
+day, since the chart ranges are relative to today. A browser that already
+has that version gets a 304 without anything being computed. Other repeat
+views are served from an in-process LRU of HISTORY_CACHE_SIZE responses,
+one per household, range, resolution and base currency.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+
+from extensions import db
+from models import Household, Account, BalanceHistory
+
+HISTORY_CACHE_SIZE = int(os.environ.get('HISTORY_CACHE_SIZE', 512))
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def invalidate(household_id=None):
+    """
+    Bump the history version of a household, of every household if None.
+    Doesn't commit.
+    """
+    household = Household.__table__
+    update = household.update().values(history_version=household.c.history_version + 1)
+    if household_id is not None:
+        update = update.where(household.c.id == household_id)
+    db.session.execute(update)
+
+@event.listens_for(Session, 'before_flush')
+def _before_flush(session, flush_context, instances):
+    account_ids = set()
+    household_ids = set()
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, BalanceHistory):
+            account_ids.add(obj.account_id)
+        elif isinstance(obj, Account):
+            household_ids.add(obj.household_id)
+    for obj in session.dirty:
+        if isinstance(obj, Account) and any(
+            attributes.get_history(obj, name).has_changes() for name in ('currency', 'name')
+        ):
+            household_ids.add(obj.household_id)
+
+    account_ids.discard(None)
+    household_ids.discard(None)
+    if not account_ids and not household_ids:
+        return
+
+    household = Household.__table__
+    account = Account.__table__
+    owners = db.select(account.c.household_id).where(account.c.id.in_(account_ids))
+    session.connection().execute(
+        household.update()
+        .where(db.or_(household.c.id.in_(household_ids), household.c.id.in_(owners)))
+        .values(history_version=household.c.history_version + 1)
+    )
+
+def etag(key, version, day):
+    """ETag of the response for `key` at a household's history version, on `day`."""
+    return hashlib.sha1(repr((key, version, day.isoformat())).encode()).hexdigest()[:20]
+
+def get(key, tag):
+    """The cached body for `key` if it's still at `tag`, else None."""
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] != tag:
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+def put(key, tag, body):
+    with _lock:
+        _cache[key] = (tag, body)
+        _cache.move_to_end(key)
+        while len(_cache) > HISTORY_CACHE_SIZE:
+            _cache.popitem(last=False)
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+
+def build_target_dates(start_date, now, resolution):
+    """
+    Build the list of sample dates for the history chart.
+    """
+    target_dates = []
+    current_date = start_date
+
+    if resolution in ('daily', 'monthly'):
+        current_date = current_date.replace(hour=23, minute=59, second=59)
+    elif resolution == 'weekly':
+        days_ahead = 6 - current_date.weekday()
+        current_date = current_date + timedelta(days=days_ahead)
+        current_date = current_date.replace(hour=23, minute=59, second=59)
+
+    while current_date <= now:
+        target_dates.append(current_date)
+        if resolution == 'daily':
+            current_date += timedelta(days=1)
+        elif resolution == 'weekly':
+            current_date += timedelta(weeks=1)
+        elif resolution == 'monthly':
+            current_date += timedelta(days=30)
+
+    if not target_dates or target_dates[-1] < now:
+        target_dates.append(now)
+
+    return target_dates
+
+
+def resample(points, target_dates):
+    """
+    As-of resample of one account's history onto the target dates.
+
+    `points` is a list of (date, balance, invested_amount) tuples sorted by
+    date and `target_dates` must be sorted too. Both lists are walked once in
+    a single forward merge, so the cost is O(len(points) + len(target_dates)).
+    Dates before the first point get None.
+    """
+    balances = []
+    invested_amounts = []
+
+    last = None
+    idx = 0
+    n = len(points)
+    for target_date in target_dates:
+        while idx < n and points[idx][0] <= target_date:
+            last = points[idx]
+            idx += 1
+
+        if last:
+            balances.append(last[1])
+            invested_amounts.append(last[2])
+        else:
+            balances.append(None)
+            invested_amounts.append(None)
+
+    return balances, invested_amounts
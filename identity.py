@@ -0,0 +1,106 @@
+"""
+Loading of the logged-in user.
+
+Without a cache, load_user() reads the user and their household in one
+joined query. The fields nearly every page needs (user id and name,
+household name and base currency) are then kept in the signed session
+cookie. For IDENTITY_CACHE_TTL seconds after that, load_user() builds the
+user from the cookie and reads only the user's household_id, with the
+household row in the same statement. Views that need more of the household
+than the cached fields use that row, so they don't load it again.
+
+household_id decides what a user may see and change, so it never comes
+from the cookie: a member removed by a request in another worker process
+loses access at their next request. If it no longer matches the cookie,
+the identity is loaded afresh.
+
+invalidate() drops the cached identities of a household: the current
+user's at once, and those of the other members in this process. Other
+worker processes notice a changed name or base currency after at most
+IDENTITY_CACHE_TTL. set_currency, settings and remove_member call it.
+"""
+import os
+import time
+
+from flask import session
+from flask_login import UserMixin
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import User, Household
+
+IDENTITY_CACHE_TTL = float(os.environ.get('IDENTITY_CACHE_TTL', 30))
+
+# Household id -> when its cached identities were last invalidated
+_invalidated = {}
+
+class HouseholdSnapshot:
+    """The cached fields of a household. Any other attribute is read from its Household row."""
+    def __init__(self, id, name, base_currency, row):
+        self.id = id
+        self.name = name
+        self.base_currency = base_currency
+        # Held here, the session only keeps a weak reference to it
+        self._row = row
+
+    def __getattr__(self, name):
+        # Only called for what the snapshot doesn't have
+        if name.startswith('__') or name == '_row':
+            raise AttributeError(name)
+        return getattr(self._row, name)
+
+class CachedUser(UserMixin):
+    """The logged-in user as cached in the session cookie, with their Household row."""
+    def __init__(self, data, household):
+        self.id = data['user_id']
+        self.username = data['username']
+        self.household_id = data['household_id']
+        self.household = None
+        if household is not None:
+            self.household = HouseholdSnapshot(household.id, data['household_name'], data['base_currency'], household)
+
+def remember(user):
+    """Cache `user`, with their household loaded, in the session."""
+    household = user.household
+    session['identity'] = {
+        'user_id': user.id,
+        'username': user.username,
+        'household_id': household.id if household else None,
+        'household_name': household.name if household else None,
+        'base_currency': household.base_currency if household else None,
+        'cached_at': time.time(),
+    }
+
+def forget():
+    session.pop('identity', None)
+
+def _fresh(data):
+    age = time.time() - data['cached_at']
+    return age < IDENTITY_CACHE_TTL and data['cached_at'] > _invalidated.get(data['household_id'], 0)
+
+def load(user_id):
+    """The user with id `user_id`, from the session cache if it's fresh, else None if there's no such user."""
+    data = session.get('identity')
+    if data and data['user_id'] == user_id and _fresh(data):
+        row = db.session.execute(
+            db.select(User.household_id, Household)
+            .outerjoin(Household, Household.id == User.household_id)
+            .where(User.id == user_id)
+        ).first()
+        if row is not None and row.household_id == data['household_id']:
+            return CachedUser(data, row.Household)
+
+    user = db.session.execute(
+        db.select(User).options(joinedload(User.household)).where(User.id == user_id)
+    ).scalar_one_or_none()
+    if user is None:
+        forget()
+        return None
+    if IDENTITY_CACHE_TTL > 0:
+        remember(user)
+    return user
+
+def invalidate(household_id):
+    """Drop the cached identities of the household's members."""
+    _invalidated[household_id] = time.time()
+    forget()
@@ -0,0 +1,258 @@
+"""
+Bulk import of bank exports, CSV or OFX.
+
+The file is parsed as a stream and written in chunks. For each chunk the
+amounts are converted to the base currency in one convert_batch() call,
+the rows go in with one executemany INSERT, the rollup is updated and the
+chunk is committed. Memory stays bounded by the chunk size, whatever the
+size of the file. A row that can't be parsed is reported and skipped, and
+the rest of the file still goes in.
+
+CSV files need a header row with date, amount and description columns.
+Currency, type and category columns are optional. Without a type column,
+negative amounts are expenses and positive ones income. Categories are
+matched by name; unknown ones are left blank.
+
+Files are read as UTF-8, and bytes that aren't valid UTF-8 as cp1252, the
+encoding of most bank exports that aren't UTF-8 (see open_text()). If the
+file still can't be read to the end, the rows before that point are
+imported and the error is reported.
+
+Usage: python import_utils.py FILE --household ID --user ID [--format csv|ofx] [--chunk-size N]
+"""
+import argparse
+import codecs
+import csv
+import html
+import io
+import math
+import re
+from datetime import datetime
+
+from currency_utils import CurrencyConverter
+from extensions import db
+from models import Category, Household, Transaction
+from rollup_utils import record_mappings
+
+CHUNK_SIZE = 5000
+# Per-row errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+DATE_FORMATS = ('%d/%m/%Y', '%d.%m.%Y', '%m/%d/%Y')
+TYPES = ('income', 'expense', 'investment')
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+def _decode_as_cp1252(error):
+    """Codec error handler: decode the bytes that aren't UTF-8 as cp1252."""
+    return error.object[error.start:error.end].decode('cp1252', errors='replace'), error.end
+
+codecs.register_error('import_cp1252', _decode_as_cp1252)
+
+def open_text(binary):
+    """A text stream over a binary upload or file, in the encoding imports expect."""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', errors='import_cp1252', newline='')
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, where, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"{where}: {message}")
+
+def detect_format(filename):
+    return 'ofx' if filename.lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+def parse_date(value):
+    value = value.strip()
+    # OFX dates: YYYYMMDD, optionally followed by a time and timezone
+    if value[:8].isdigit():
+        return datetime(int(value[:4]), int(value[4:6]), int(value[6:8]))
+    # ISO dates are the common case, and fromisoformat is much faster than strptime
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"unrecognised date '{value}'")
+
+def parse_amount(value):
+    value = value.strip().replace(' ', '')
+    # 1.234,56 and 1234,56 -> 1234.56
+    if ',' in value and (value.rfind(',') > value.rfind('.')):
+        value = value.replace('.', '').replace(',', '.')
+    else:
+        value = value.replace(',', '')
+    try:
+        amount = float(value)
+    except ValueError:
+        raise ValueError(f"invalid amount '{value}'")
+    # float() takes nan and inf, which would poison every total they reach
+    if not math.isfinite(amount):
+        raise ValueError(f"invalid amount '{value}'")
+    return amount
+
+def read_csv(stream):
+    """Yields (where, fields) for each data row of a CSV export."""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for row in reader:
+        yield f"line {reader.line_num}", row
+
+def ofx_elements(stream, block_size=65536):
+    """Yields (closing, tag, value) for each OFX tag, reading the stream in blocks."""
+    buffer = ''
+    for block in iter(lambda: stream.read(block_size), ''):
+        buffer += block
+        # Keep the last, possibly incomplete, tag for the next block
+        cut = buffer.rfind('<')
+        for match in OFX_TAG.finditer(buffer, 0, cut):
+            yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+        buffer = buffer[cut:]
+    for match in OFX_TAG.finditer(buffer):
+        yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+
+def read_ofx(stream):
+    """Yields (where, fields) for each STMTTRN of an OFX export, SGML or XML."""
+    currency = None
+    current = None
+    number = 0
+    for closing, tag, value in ofx_elements(stream):
+        if tag == 'STMTTRN':
+            if not closing:
+                number += 1
+                current = {}
+            elif current is not None:
+                yield f"transaction {number}", current
+                current = None
+        elif closing:
+            continue
+        elif tag == 'CURDEF':
+            currency = value
+        elif current is not None:
+            value = html.unescape(value)
+            if tag == 'DTPOSTED':
+                current['date'] = value
+            elif tag == 'TRNAMT':
+                current['amount'] = value
+            elif tag == 'NAME' or (tag == 'MEMO' and not current.get('description')):
+                current['description'] = value
+            if currency and 'currency' not in current:
+                current['currency'] = currency
+
+def build_mapping(fields, household, user_id, categories):
+    """Turns a parsed row into the dict inserted for it, or raises ValueError."""
+    if not fields.get('date'):
+        raise ValueError("missing date")
+    if not fields.get('amount'):
+        raise ValueError("missing amount")
+    date = parse_date(fields['date'])
+    amount = parse_amount(fields['amount'])
+
+    currency = (fields.get('currency') or household.base_currency).strip().upper()
+    if currency not in CurrencyConverter.RATES:
+        raise ValueError(f"unsupported currency '{currency}'")
+
+    type = (fields.get('type') or '').strip().lower()
+    if not type:
+        type = 'expense' if amount < 0 else 'income'
+    elif type not in TYPES:
+        raise ValueError(f"invalid type '{type}'")
+
+    category = categories.get((fields.get('category') or '').strip().lower())
+    return {
+        'amount': abs(amount),
+        'currency': currency,
+        'description': (fields.get('description') or '').strip()[:200],
+        'type': type,
+        'date': date,
+        'category_id': category,
+        'income_source_id': None,
+        'user_id': user_id,
+        'household_id': household.id
+    }
+
+def write_chunk(chunk, household, result):
+    mappings = [mapping for _, mapping in chunk]
+    base_amounts = CurrencyConverter.convert_batch(
+        [m['amount'] for m in mappings],
+        [m['currency'] for m in mappings],
+        household.base_currency
+    ).tolist()
+    for mapping, base_amount in zip(mappings, base_amounts):
+        mapping['amount_in_base_currency'] = base_amount
+
+    try:
+        db.session.execute(Transaction.__table__.insert(), mappings)
+        record_mappings(mappings)
+        db.session.commit()
+        result.imported += len(mappings)
+    except Exception as e:
+        db.session.rollback()
+        result.error(f"{chunk[0][0]} to {chunk[-1][0]}", f"chunk not imported ({e.__class__.__name__})")
+
+def import_transactions(stream, format, household_id, user_id, chunk_size=CHUNK_SIZE):
+    """
+    Imports a text stream of CSV or OFX into a household, committing every
+    `chunk_size` rows. Returns an ImportResult.
+    """
+    household = Household.query.get(household_id)
+    categories = {c.name.lower(): c.id for c in Category.query.filter_by(household_id=household_id)}
+    rows = read_ofx(stream) if format == 'ofx' else read_csv(stream)
+
+    result = ImportResult()
+    chunk = []
+    where = 'start of file'
+    while True:
+        try:
+            where, fields = next(rows)
+        except StopIteration:
+            break
+        except (UnicodeDecodeError, csv.Error) as e:
+            # The stream can't be resumed, keep what was read before
+            result.error(f"after {where}", f"file could not be read further ({e})")
+            break
+        try:
+            chunk.append((where, build_mapping(fields, household, user_id, categories)))
+        except ValueError as e:
+            result.error(where, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            write_chunk(chunk, household, result)
+            chunk = []
+    if chunk:
+        write_chunk(chunk, household, result)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Import a CSV or OFX bank export.')
+    parser.add_argument('file')
+    parser.add_argument('--household', type=int, required=True)
+    parser.add_argument('--user', type=int, required=True, help='user the transactions are recorded as')
+    parser.add_argument('--format', choices=['csv', 'ofx'], help='detected from the file name by default')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from app import create_app
+    with create_app().app_context():
+        if Household.query.get(args.household) is None:
+            parser.error(f"household {args.household} not found")
+        with open_text(open(args.file, 'rb')) as f:
+            result = import_transactions(f, args.format or detect_format(args.file),
+                                         args.household, args.user, args.chunk_size)
+        print(f"Imported {result.imported} transactions, {result.error_count} errors")
+        for error in result.errors:
+            print(f"  {error}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Per-request SQL instrumentation.
+
+Engine event hooks count and time every statement a request runs. Once the
+response has been sent, including any streamed body, the numbers are added
+to per-endpoint totals. /metrics serves those totals in the Prometheus text
+format:
+
+- budget_requests_total, budget_db_queries_total and budget_db_seconds_total
+- budget_db_queries_per_request, a histogram
+- budget_db_slowest_statement_seconds: the slowest statement shapes per
+  endpoint, with their worst time
+- budget_db_repeated_statements_total: requests in which one statement
+  shape ran N_PLUS_ONE_THRESHOLD times or more, usually an N+1 lazy load
+
+With SQL_DEBUG=1 each of those requests is also logged with the repeated
+statement.
+
+The statement shapes and timings are not for the public. With METRICS_TOKEN
+set, /metrics wants it as "Authorization: Bearer <token>". Without, it only
+answers the addresses in METRICS_ALLOWED_IPS, by default this host's own.
+"""
+import hmac
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SQL_DEBUG = os.environ.get('SQL_DEBUG', '') not in ('', '0', 'false')
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = {ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()}
+SLOWEST_STATEMENTS = 5
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# Placeholder lists of expanded IN clauses, in the SQLite, Postgres and named styles
+IN_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*\)')
+
+def statement_shape(statement):
+    """The statement with whitespace and IN lists normalised, so repeats compare equal."""
+    return IN_LIST.sub('(...)', ' '.join(statement.split()))
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self.repeated = 0
+        self.buckets = [0] * len(QUERY_BUCKETS)
+        self.slowest = {}
+
+    def add(self, queries, seconds, durations, repeated):
+        self.requests += 1
+        self.queries += queries
+        self.seconds += seconds
+        self.repeated += repeated
+        for i, bound in enumerate(QUERY_BUCKETS):
+            if queries <= bound:
+                self.buckets[i] += 1
+        for shape, duration in durations.items():
+            if duration > self.slowest.get(shape, 0.0):
+                self.slowest[shape] = duration
+        if len(self.slowest) > SLOWEST_STATEMENTS:
+            keep = sorted(self.slowest.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_STATEMENTS]
+            self.slowest = dict(keep)
+
+_stats = defaultdict(EndpointStats)
+_lock = threading.Lock()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context, so one that fails leaves nothing behind
+    context.query_start = time.perf_counter()
+
+class RequestQueries:
+    """The statements of one request, by shape."""
+    def __init__(self):
+        self.shapes = Counter()
+        self.durations = {}
+        self.seconds = 0.0
+
+    def add(self, statement, elapsed):
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        self.seconds += elapsed
+        self.durations[shape] = max(self.durations.get(shape, 0.0), elapsed)
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_start
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries.add(statement, elapsed)
+
+def _start_request():
+    g.sql_queries = RequestQueries()
+
+def _finish_request(response):
+    queries = g.pop('sql_queries', None)
+    if queries is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    if response.is_streamed:
+        # A streamed body runs its queries after this, record them once it's sent
+        g.sql_queries = queries
+        response.call_on_close(lambda: _record(endpoint, queries))
+    else:
+        _record(endpoint, queries)
+    return response
+
+def _record(endpoint, queries):
+    count = sum(queries.shapes.values())
+    repeated = [(shape, n) for shape, n in queries.shapes.items() if n >= N_PLUS_ONE_THRESHOLD]
+
+    with _lock:
+        _stats[endpoint].add(count, queries.seconds, queries.durations, 1 if repeated else 0)
+
+    if SQL_DEBUG and repeated:
+        for shape, n in repeated:
+            print(f"Possible N+1 in {endpoint}: {n}x {shape[:300]}")
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+def render_metrics():
+    """The per-endpoint totals in the Prometheus text format."""
+    with _lock:
+        stats = {endpoint: (s.requests, s.queries, s.seconds, s.repeated, list(s.buckets), dict(s.slowest))
+                 for endpoint, s in _stats.items()}
+
+    lines = [
+        '# HELP budget_requests_total Requests handled, per endpoint.',
+        '# TYPE budget_requests_total counter',
+    ]
+    lines += [f'budget_requests_total{{endpoint="{_label(e)}"}} {s[0]}' for e, s in sorted(stats.items())]
+    lines += [
+        '# HELP budget_db_queries_total SQL statements run, per endpoint.',
+        '# TYPE budget_db_queries_total counter',
+    ]
+    lines += [f'budget_db_queries_total{{endpoint="{_label(e)}"}} {s[1]}' for e, s in sorted(stats.items())]
+    lines += [
+        '# HELP budget_db_seconds_total Time spent in SQL statements, per endpoint.',
+        '# TYPE budget_db_seconds_total counter',
+    ]
+    lines += [f'budget_db_seconds_total{{endpoint="{_label(e)}"}} {s[2]:.6f}' for e, s in sorted(stats.items())]
+    lines += [
+        f'# HELP budget_db_repeated_statements_total Requests that ran one statement shape {N_PLUS_ONE_THRESHOLD}+ times.',
+        '# TYPE budget_db_repeated_statements_total counter',
+    ]
+    lines += [f'budget_db_repeated_statements_total{{endpoint="{_label(e)}"}} {s[3]}' for e, s in sorted(stats.items())]
+
+    lines += [
+        '# HELP budget_db_queries_per_request SQL statements per request.',
+        '# TYPE budget_db_queries_per_request histogram',
+    ]
+    for e, s in sorted(stats.items()):
+        for bound, count in zip(QUERY_BUCKETS, s[4]):
+            lines.append(f'budget_db_queries_per_request_bucket{{endpoint="{_label(e)}",le="{bound}"}} {count}')
+        lines.append(f'budget_db_queries_per_request_bucket{{endpoint="{_label(e)}",le="+Inf"}} {s[0]}')
+        lines.append(f'budget_db_queries_per_request_sum{{endpoint="{_label(e)}"}} {s[1]}')
+        lines.append(f'budget_db_queries_per_request_count{{endpoint="{_label(e)}"}} {s[0]}')
+
+    lines += [
+        '# HELP budget_db_slowest_statement_seconds Worst time of the slowest statement shapes, per endpoint.',
+        '# TYPE budget_db_slowest_statement_seconds gauge',
+    ]
+    for e, s in sorted(stats.items()):
+        for shape, duration in sorted(s[5].items(), key=lambda item: item[1], reverse=True):
+            lines.append(f'budget_db_slowest_statement_seconds{{endpoint="{_label(e)}",statement="{_label(shape[:200])}"}} {duration:.6f}')
+
+    return '\n'.join(lines) + '\n'
+
+def metrics_allowed():
+    """Whether this request may read /metrics."""
+    if METRICS_TOKEN:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}')
+    return request.remote_addr in METRICS_ALLOWED_IPS
+
+def metrics():
+    if not metrics_allowed():
+        abort(403)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    """Hook the request bookkeeping into `app` and serve /metrics."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
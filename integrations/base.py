@@ -1,11 +1,56 @@
+import asyncio
 from abc import ABC, abstractmethod
 
+class IntegrationError(Exception):
+    """Raised when an upstream could not provide a balance."""
+    pass
+
+class RateLimitError(IntegrationError):
+    """Raised when an upstream rejects a call for exceeding its rate limit."""
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        # Seconds the upstream asked us to wait, if it said
+        self.retry_after = retry_after
+
 class IntegrationClient(ABC):
-    def __init__(self, api_key, api_secret):
+    def __init__(self, api_key, api_secret, timeout=10, max_workers=4, base_url=None):
         self.api_key = api_key
         self.api_secret = api_secret
+        # Seconds before a single upstream call is abandoned
+        self.timeout = timeout
+        # Upper bound on upstream calls made in parallel by one client
+        self.max_workers = max_workers
+        # Overrides the upstream API root, e.g. to point at a local fake server
+        self.base_url = base_url
+        # aiohttp sessions of get_balance_async(), per event loop
+        self.async_sessions = {}
 
     @abstractmethod
     def get_balance(self):
-        """Returns the total equity in USD."""
+        """Returns the total equity in USD. Raises IntegrationError if it can't be fetched."""
         pass
+
+    async def get_balance_async(self):
+        """
+        get_balance() for use on an event loop. By default it runs
+        get_balance() in a thread; clients override it to await the upstream
+        without holding one.
+        """
+        return await asyncio.to_thread(self.get_balance)
+
+    def async_session(self):
+        """The aiohttp session for the running event loop, kept until aclose()."""
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self.async_sessions.get(loop)
+        if session is None:
+            session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.async_sessions[loop] = session
+        return session
+
+    async def aclose(self):
+        """Close the running event loop's aiohttp session, if any."""
+        session = self.async_sessions.pop(asyncio.get_running_loop(), None)
+        if session:
+            await session.close()
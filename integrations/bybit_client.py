@@ -1,83 +1,246 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pybit.unified_trading import HTTP
-from .base import IntegrationClient
+from requests.adapters import HTTPAdapter
+from .base import IntegrationClient, IntegrationError, RateLimitError
 
 class BybitClient(IntegrationClient):
-    def get_balance(self):
-        try:
+    EQUITY_ACCOUNT_TYPES = ["UNIFIED", "CONTRACT", "SPOT"]
+    FUND_ACCOUNT_TYPES = ["SPOT", "CONTRACT", "UNIFIED", "OPTION", "INVESTMENT", "FUND"]
+
+    # Bybit's rate-limit retCode and the HTTP statuses of its IP rate limit
+    RATE_LIMIT_CODES = (10006, 403, 429)
+    # retCode of a query for an account type this account doesn't have,
+    # e.g. "accountType only support UNIFIED". Only those wallets are
+    # skipped, any other failure fails the whole balance.
+    UNSUPPORTED_ACCOUNT_CODES = (10001,)
+
+    # What get_balance_async calls directly: the mainnet API, the endpoints
+    # behind pybit's get_wallet_balance and get_coins_balance, and the
+    # milliseconds a signed request stays valid (pybit's default)
+    API_URL = "https://api.bybit.com"
+    WALLET_BALANCE_PATH = "/v5/account/wallet-balance"
+    COINS_BALANCE_PATH = "/v5/asset/transfer/query-account-coins-balance"
+    RECV_WINDOW = 5000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = None
+
+    def get_session(self):
+        """
+        The pybit session is built once and reused by every sync of this
+        integration, so its keep-alive connections survive between calls.
+        """
+        if self.session is None:
             session = HTTP(
                 testnet=False, # Use Mainnet
                 api_key=self.api_key,
-                api_secret=self.api_secret
+                api_secret=self.api_secret,
+                timeout=self.timeout,
+                # Rate limits are surfaced to the caller's backoff instead of
+                # pybit sleeping on them inside the sync
+                retry_codes={10002}
             )
+            if self.base_url:
+                session.endpoint = self.base_url
+            # Room for every parallel wallet query below
+            session.client.mount('https://', HTTPAdapter(pool_maxsize=max(10, self.max_workers)))
+            session.client.mount('http://', HTTPAdapter(pool_maxsize=max(10, self.max_workers)))
+            self.session = session
+        return self.session
+
+    def rate_limit_error(self, e):
+        """A RateLimitError if the pybit exception `e` is a rate limit, else None."""
+        return self.rate_limit(getattr(e, 'status_code', None), getattr(e, 'resp_headers', None), e)
+
+    def rate_limit(self, code, headers, detail):
+        """A RateLimitError if the HTTP status or retCode `code` is a rate limit, else None."""
+        if code not in self.RATE_LIMIT_CODES:
+            return None
+
+        retry_after = None
+        reset = (headers or {}).get('X-Bapi-Limit-Reset-Timestamp')
+        if reset:
+            retry_after = max(0.0, int(reset) / 1000 - time.time())
+        return RateLimitError(f"Bybit rate limit: {detail}", retry_after=retry_after)
+
+    def unsupported(self, account_type, code, detail):
+        """None if retCode `code` means the account has no `account_type` wallet, else an IntegrationError to raise."""
+        if code in self.UNSUPPORTED_ACCOUNT_CODES:
+            print(f"Bybit {account_type} not available: {detail}")
+            return None
+        return IntegrationError(f"Bybit {account_type}: {detail}")
+
+    def parse_equity(self, account_type, response):
+        """The USD equity in a wallet balance response, None if the account has no such wallet."""
+        if response['retCode'] == 0 and response['result']['list']:
+            account_info = response['result']['list'][0]
+            
+            # For UNIFIED, use totalEquity
+            if account_type == "UNIFIED":
+                equity = float(account_info.get('totalEquity', 0.0))
+                print(f"Bybit UNIFIED totalEquity: {equity}")
+                return equity
             
-            total_balance = 0.0
+            # For SPOT and others, sum coin USD values
+            equity = 0.0
+            for coin in account_info.get('coin', []):
+                coin_value = float(coin.get('usdValue', 0.0))
+                if coin_value > 0:
+                    print(f"Bybit {account_type} {coin.get('coin', 'Unknown')}: {coin_value}")
+                equity += coin_value
+            
+            print(f"Bybit {account_type} total: {equity}")
+            return equity
+        elif response['retCode'] == 0:
+            return 0.0
+        error = self.unsupported(account_type, response['retCode'], f"retCode {response['retCode']} {response.get('retMsg', '')}")
+        if error:
+            raise error
+        return None
+
+    def parse_fund_balance(self, account_type, response):
+        """The FUND total in a coins balance response, None if the account has no such wallet."""
+        if response['retCode'] == 0:
+            fund_total = 0.0
+            for coin_data in response['result'].get('balance', []):
+                wallet_balance = float(coin_data.get('walletBalance', 0.0))
+                if wallet_balance > 0:
+                    print(f"Bybit FUND {coin_data.get('coin', 'Unknown')}: {wallet_balance}")
+                    # Note: This is in coin units, not USD. For accurate USD value,
+                    # we'd need to convert using market prices, but for now we'll sum as-is
+                    fund_total += wallet_balance
+            print(f"Bybit FUND total: {fund_total}")
+            return fund_total
+        error = self.unsupported(f"FUND {account_type}", response['retCode'], f"retCode {response['retCode']} {response.get('retMsg', '')}")
+        if error:
+            raise error
+        return None
+
+    def total(self, results):
+        """
+        The sum of the wallet results. Raises the first error among them, a
+        rate limit before anything else: a total missing a wallet that
+        failed would be written as the account's balance.
+        """
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise next((e for e in errors if isinstance(e, RateLimitError)), errors[0])
+        # Some account types may legitimately be unavailable, but if
+        # none is the total would be a bogus 0
+        if all(r is None for r in results):
+            raise IntegrationError("Bybit: the account has none of the queried wallets")
+        total_balance = sum(r for r in results if r is not None)
+        
+        #SPOT, CONTRACT, UNIFIED, OPTION, INVESTMENT, FUND
+        print(f"Bybit Total Balance: {total_balance}")
+        return total_balance
+
+    def get_balance(self):
+        try:
+            session = self.get_session()
+
+            def failure(account_type, e):
+                # pybit raises on a non-zero retCode, with it as status_code
+                rate_limit = self.rate_limit_error(e)
+                if rate_limit:
+                    return rate_limit
+                return self.unsupported(account_type, getattr(e, 'status_code', None), e)
 
             def get_equity(account_type):
                 try:
-                    response = session.get_wallet_balance(accountType=account_type)
-                    if response['retCode'] == 0 and response['result']['list']:
-                        account_info = response['result']['list'][0]
-                        
-                        # For UNIFIED, use totalEquity
-                        if account_type == "UNIFIED":
-                            equity = float(account_info.get('totalEquity', 0.0))
-                            print(f"Bybit UNIFIED totalEquity: {equity}")
-                            return equity
-                        
-                        # For SPOT and others, sum coin USD values
-                        equity = 0.0
-                        for coin in account_info.get('coin', []):
-                            coin_value = float(coin.get('usdValue', 0.0))
-                            if coin_value > 0:
-                                print(f"Bybit {account_type} {coin.get('coin', 'Unknown')}: {coin_value}")
-                            equity += coin_value
-                        
-                        print(f"Bybit {account_type} total: {equity}")
-                        return equity
-                    else:
-                        print(f"Bybit {account_type} returned retCode: {response.get('retCode', 'unknown')}")
-                    return 0.0
+                    return self.parse_equity(account_type, session.get_wallet_balance(accountType=account_type))
+                except IntegrationError:
+                    raise
                 except Exception as e:
-                    print(f"Bybit {account_type} Error: {e}")
-                    return 0.0
+                    error = failure(account_type, e)
+                    if error:
+                        raise error
+                    return None
 
             def get_fund_balance(account_type):
                 """Get FUND account balance using get_coins_balance endpoint"""
                 try:
                     # Get all coins in FUND account (without specifying coin)
-                    response = session.get_coins_balance(accountType=account_type)
-                    if response['retCode'] == 0:
-                        fund_total = 0.0
-                        for coin_data in response['result'].get('balance', []):
-                            wallet_balance = float(coin_data.get('walletBalance', 0.0))
-                            if wallet_balance > 0:
-                                print(f"Bybit FUND {coin_data.get('coin', 'Unknown')}: {wallet_balance}")
-                                # Note: This is in coin units, not USD. For accurate USD value,
-                                # we'd need to convert using market prices, but for now we'll sum as-is
-                                fund_total += wallet_balance
-                        print(f"Bybit FUND total: {fund_total}")
-                        return fund_total
-                    else:
-                        print(f"Bybit FUND returned retCode: {response.get('retCode', 'unknown')}")
-                    return 0.0
+                    return self.parse_fund_balance(account_type, session.get_coins_balance(accountType=account_type))
+                except IntegrationError:
+                    raise
                 except Exception as e:
-                    print(f"Bybit FUND Error: {e}")
-                    return 0.0
+                    error = failure(f"FUND {account_type}", e)
+                    if error:
+                        raise error
+                    return None
 
             # Combine all account types
-            total_balance += get_equity("UNIFIED")
-            total_balance += get_equity("CONTRACT")
-            total_balance += get_equity("SPOT")
-            total_balance += get_fund_balance("SPOT")
-            total_balance += get_fund_balance("CONTRACT")
-            total_balance += get_fund_balance("UNIFIED")
-            total_balance += get_fund_balance("OPTION")
-            total_balance += get_fund_balance("INVESTMENT")
-            total_balance += get_fund_balance("FUND")
-            
-            #SPOT, CONTRACT, UNIFIED, OPTION, INVESTMENT, FUND
-            print(f"Bybit Total Balance: {total_balance}")
-            return total_balance
+            # The calls are independent, so they run in parallel and the
+            # total time is bounded by the slowest one
+            calls = [(get_equity, t) for t in self.EQUITY_ACCOUNT_TYPES]
+            calls += [(get_fund_balance, t) for t in self.FUND_ACCOUNT_TYPES]
+            with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+                futures = [pool.submit(call, account_type) for call, account_type in calls]
+            return self.total([f.exception() or f.result() for f in futures])
+        except IntegrationError:
+            raise
         except Exception as e:
             print(f"Bybit Exception: {e}")
-            return 0.0
+            raise IntegrationError(f"Bybit: {e}")
+
+    def signed_headers(self, payload):
+        """
+        Authentication headers of a v5 request whose query string is
+        `payload`: an HMAC-SHA256 of timestamp + key + recv window + payload.
+        """
+        timestamp = str(int(time.time() * 1000))
+        message = f"{timestamp}{self.api_key}{self.RECV_WINDOW}{payload}"
+        return {
+            "X-BAPI-API-KEY": self.api_key,
+            "X-BAPI-SIGN": hmac.new(self.api_secret.encode(), message.encode(), hashlib.sha256).hexdigest(),
+            "X-BAPI-SIGN-TYPE": "2",
+            "X-BAPI-TIMESTAMP": timestamp,
+            "X-BAPI-RECV-WINDOW": str(self.RECV_WINDOW),
+        }
+
+    async def fetch_async(self, path, params):
+        """GET a private v5 endpoint over aiohttp. Returns the decoded response."""
+        # Sorted, unencoded key=value pairs, as Bybit signs them
+        payload = "&".join(f"{key}={value}" for key, value in sorted(params.items()))
+        url = f"{self.base_url or self.API_URL}{path}?{payload}"
+        async with self.async_session().get(url, headers=self.signed_headers(payload)) as response:
+            rate_limit = self.rate_limit(response.status, response.headers, f"HTTP {response.status}")
+            if rate_limit:
+                raise rate_limit
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        rate_limit = self.rate_limit(data.get('retCode'), response.headers, data.get('retMsg'))
+        if rate_limit:
+            raise rate_limit
+        return data
+
+    async def get_balance_async(self):
+        try:
+            semaphore = asyncio.Semaphore(max(1, self.max_workers))
+
+            # Timeouts and connection errors propagate, and fail the balance
+            async def get_equity(account_type):
+                async with semaphore:
+                    response = await self.fetch_async(self.WALLET_BALANCE_PATH, {'accountType': account_type})
+                return self.parse_equity(account_type, response)
+
+            async def get_fund_balance(account_type):
+                async with semaphore:
+                    response = await self.fetch_async(self.COINS_BALANCE_PATH, {'accountType': account_type})
+                return self.parse_fund_balance(account_type, response)
+
+            calls = [get_equity(t) for t in self.EQUITY_ACCOUNT_TYPES]
+            calls += [get_fund_balance(t) for t in self.FUND_ACCOUNT_TYPES]
+            return self.total(await asyncio.gather(*calls, return_exceptions=True))
+        except IntegrationError:
+            raise
+        except Exception as e:
+            print(f"Bybit Exception: {e}")
+            raise IntegrationError(f"Bybit: {e}")
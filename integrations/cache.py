@@ -0,0 +1,101 @@
+import threading
+import time
+from .base import IntegrationError, RateLimitError
+
+class CircuitOpenError(IntegrationError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+    pass
+
+class CachedClient:
+    """
+    Wraps an IntegrationClient with a cache of the last good balance,
+    rate-limit backoff and a circuit breaker, for both get_balance() and
+    get_balance_async().
+
+    - A balance fetched less than `ttl` seconds ago is served without a call.
+    - A rate-limit response backs off right away, for at least as long as
+      the upstream asked.
+    - After `failure_threshold` consecutive failures the circuit opens and
+      calls fail fast with CircuitOpenError. Once the backoff has passed one
+      trial call goes through: success closes the circuit, failure reopens
+      it for twice as long (capped at `backoff_max`).
+
+    Failures are raised, never turned into a 0 balance, so the caller keeps
+    the last stored balance instead of recording a bogus one.
+    """
+    def __init__(self, client, ttl=300, failure_threshold=3, backoff_base=60, backoff_max=3600, clock=time.monotonic):
+        self.client = client
+        self.ttl = ttl
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+
+        self.balance = None
+        self.fetched_at = None
+        self.failures = 0
+        self.open_until = None
+        self.lock = threading.Lock()
+
+    def backoff(self, attempt):
+        return min(self.backoff_max, self.backoff_base * 2 ** max(0, attempt))
+
+    @property
+    def state(self):
+        if self.open_until is None:
+            return 'closed'
+        return 'open' if self.clock() < self.open_until else 'half-open'
+
+    def fresh(self):
+        """
+        Whether the cached balance can be served without a call. Raises
+        CircuitOpenError while the circuit is open.
+        """
+        with self.lock:
+            now = self.clock()
+            if self.fetched_at is not None and now - self.fetched_at < self.ttl:
+                return True
+            if self.open_until is not None and now < self.open_until:
+                raise CircuitOpenError(f"circuit open, next attempt in {self.open_until - now:.0f}s")
+            return False
+
+    def failed(self, error):
+        with self.lock:
+            self.failures += 1
+            if isinstance(error, RateLimitError):
+                delay = max(error.retry_after or 0, self.backoff(self.failures - 1))
+                self.open_until = self.clock() + delay
+            elif self.failures >= self.failure_threshold:
+                self.open_until = self.clock() + self.backoff(self.failures - self.failure_threshold)
+
+    def succeeded(self, balance):
+        with self.lock:
+            self.balance = balance
+            self.fetched_at = self.clock()
+            self.failures = 0
+            self.open_until = None
+
+    def get_balance(self):
+        if self.fresh():
+            return self.balance
+        try:
+            balance = self.client.get_balance()
+        except Exception as e:
+            self.failed(e)
+            raise
+        self.succeeded(balance)
+        return balance
+
+    async def get_balance_async(self):
+        if self.fresh():
+            return self.balance
+        try:
+            balance = await self.client.get_balance_async()
+        except Exception as e:
+            self.failed(e)
+            raise
+        self.succeeded(balance)
+        return balance
+
+    async def aclose(self):
+        await self.client.aclose()
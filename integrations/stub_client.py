@@ -0,0 +1,11 @@
+from .base import IntegrationClient
+
+class StubClient(IntegrationClient):
+    """Offline client used by the sync worker's local mode. Never touches the network."""
+    balance = 1000.0
+
+    def get_balance(self):
+        return self.balance
+
+    async def get_balance_async(self):
+        return self.balance
@@ -1,36 +1,100 @@
+import base64
+import time
 import requests
-from .base import IntegrationClient
+from requests.adapters import HTTPAdapter
+from .base import IntegrationClient, IntegrationError, RateLimitError
 
 class Trading212Client(IntegrationClient):
+    # URLs
+    LIVE_URL = "https://live.trading212.com/api/v0/"
+    DEMO_URL = "https://demo.trading212.com/api/v0/"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Keep-alive connections, reused by every sync of this integration
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=max(10, self.max_workers)))
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=max(10, self.max_workers)))
+        # The environment that answered last time, tried first on the next sync
+        self.environment_url = None
+
+    def rate_limit_error(self, response):
+        retry_after = None
+        reset = response.headers.get('x-ratelimit-reset')
+        if reset:
+            retry_after = max(0.0, float(reset) - time.time())
+        elif response.headers.get('Retry-After', '').isdigit():
+            retry_after = float(response.headers['Retry-After'])
+        return RateLimitError("Trading212 rate limit", retry_after=retry_after)
+
+    def environments(self):
+        """
+        The Live and Demo API roots in the order to try them: the one that
+        answered last time, otherwise Live first, then Demo if Live failed.
+        """
+        live_url = f"{self.base_url}live/" if self.base_url else self.LIVE_URL
+        demo_url = f"{self.base_url}demo/" if self.base_url else self.DEMO_URL
+        urls = [live_url, demo_url]
+        if self.environment_url in urls:
+            urls.remove(self.environment_url)
+            urls.insert(0, self.environment_url)
+        return urls
+
     def get_balance(self):
-        # URLs
-        LIVE_URL = "https://live.trading212.com/api/v0/"
-        DEMO_URL = "https://demo.trading212.com/api/v0/"
-        
         # Use HTTP Basic Auth with api_key as username and api_secret as password
         auth = (self.api_key, self.api_secret) if self.api_secret else None
         
         def fetch_from(base_url):
             try:
-                response = requests.get(
+                response = self.session.get(
                     f"{base_url}equity/account/summary",
-                    auth=auth
+                    auth=auth,
+                    timeout=self.timeout
                 )
+                if response.status_code == 429:
+                    raise self.rate_limit_error(response)
                 if response.status_code == 200:
                     return float(response.json().get('totalValue', 0.0))
                 return None
+            except RateLimitError:
+                raise
             except:
                 return None
 
-        # Try Live first
-        balance = fetch_from(LIVE_URL)
-        if balance is not None:
-            return balance
-            
-        # Try Demo if Live failed
-        balance = fetch_from(DEMO_URL)
-        if balance is not None:
-            return balance
+        for url in self.environments():
+            balance = fetch_from(url)
+            if balance is not None:
+                self.environment_url = url
+                return balance
             
         print("T212 Error: Could not fetch balance from Live or Demo.")
-        return 0.0
+        raise IntegrationError("Trading212: could not fetch balance from Live or Demo")
+
+    async def get_balance_async(self):
+        session = self.async_session()
+        headers = {}
+        if self.api_secret:
+            credentials = base64.b64encode(f"{self.api_key}:{self.api_secret}".encode()).decode()
+            headers['Authorization'] = f"Basic {credentials}"
+
+        async def fetch_from(base_url):
+            try:
+                async with session.get(f"{base_url}equity/account/summary", headers=headers) as response:
+                    if response.status == 429:
+                        raise self.rate_limit_error(response)
+                    if response.status == 200:
+                        return float((await response.json()).get('totalValue', 0.0))
+                    return None
+            except RateLimitError:
+                raise
+            except Exception:
+                return None
+
+        for url in self.environments():
+            balance = await fetch_from(url)
+            if balance is not None:
+                self.environment_url = url
+                return balance
+
+        print("T212 Error: Could not fetch balance from Live or Demo.")
+        raise IntegrationError("Trading212: could not fetch balance from Live or Demo")
@@ -0,0 +1,143 @@
+"""
+Versioned schema migrations.
+
+db.create_all() only creates missing tables, it can't change the ones an
+existing database already has. Every change to existing tables is added to
+MIGRATIONS as a numbered step; upgrade() applies the steps a database
+hasn't seen yet, in order, and records each one in the schema_version table.
+Steps must be safe on a freshly created schema too, since create_all()
+may already have done part of their work.
+
+The app never sets up the schema itself. Running this script does, once per
+deploy, before the app and the worker start: it waits for the database,
+creates the missing tables and applies the pending migrations. The
+server refuses to start while migrations are pending (see health).
+
+Usage: python migrations.py [--status]
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy.schema import CreateIndex
+
+from extensions import db
+from models import Household, Transaction, BalanceHistory, RecurringTransaction, MonthlySummary, SyncJob, SchemaVersion
+from retention_utils import backfill_levels
+from rollup_utils import rebuild as rebuild_rollup
+
+schema_version = SchemaVersion.__table__
+
+def create_indexes(*names):
+    """A migration step that creates the named model indexes if missing."""
+    def step(conn):
+        for table in (Transaction.__table__, BalanceHistory.__table__, RecurringTransaction.__table__, MonthlySummary.__table__):
+            for index in table.indexes:
+                if index.name in names:
+                    # IF NOT EXISTS rather than checkfirst, which can't see expression indexes
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+    return step
+
+def add_columns(*columns):
+    """
+    A migration step that adds the given model columns if missing. They must
+    be nullable or have a server default.
+    """
+    def step(conn):
+        for column in columns:
+            existing = {c['name'] for c in db.inspect(conn).get_columns(column.table.name)}
+            if column.name not in existing:
+                preparer = conn.dialect.identifier_preparer
+                definition = f"{preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}"
+                if column.server_default is not None:
+                    definition += f" NOT NULL DEFAULT {column.server_default.arg}"
+                conn.execute(db.text(
+                    f"ALTER TABLE {preparer.format_table(column.table)} ADD COLUMN {definition}"
+                ))
+    return step
+
+def steps(*functions):
+    def step(conn):
+        for function in functions:
+            function(conn)
+    return step
+
+MIGRATIONS = [
+    (1, 'Composite indexes for the hot query shapes', create_indexes(
+        'ix_transaction_household_date',
+        'ix_transaction_income_source_date',
+        'ix_transaction_category_household_date',
+        'ix_balance_history_account_date',
+    )),
+    (2, 'Backfill the monthly transaction rollup', rebuild_rollup),
+    (3, 'Recurring scheduler: occurrence keys, anchor days and due-date index', steps(
+        add_columns(Transaction.__table__.c.recurring_id, RecurringTransaction.__table__.c.anchor_day),
+        create_indexes('uq_transaction_recurring_date', 'ix_recurring_transaction_next_due_date'),
+    )),
+    (4, 'Balance history levels for retention and downsampling', steps(
+        add_columns(BalanceHistory.__table__.c.level),
+        backfill_levels,
+        create_indexes('ix_balance_history_account_level_date'),
+    )),
+    (5, 'Household history versions for the history response cache', add_columns(Household.__table__.c.history_version)),
+    # The rebuild merges any duplicate buckets the index would reject
+    (6, 'Unique rollup buckets', steps(
+        rebuild_rollup,
+        create_indexes('uq_monthly_summary_bucket'),
+    )),
+    (7, 'Sync job heartbeats', add_columns(SyncJob.__table__.c.heartbeat_at)),
+]
+
+def applied_versions(conn):
+    schema_version.create(bind=conn, checkfirst=True)
+    return {row.version for row in conn.execute(db.select(schema_version.c.version))}
+
+def pending_versions(conn):
+    """The migrations a database hasn't had yet, without changing anything."""
+    if not db.inspect(conn).has_table(schema_version.name):
+        return [version for version, _, _ in MIGRATIONS]
+    done = {row.version for row in conn.execute(db.select(schema_version.c.version))}
+    return [version for version, _, _ in MIGRATIONS if version not in done]
+
+def upgrade(engine=None):
+    """Apply every pending migration. Returns the versions applied."""
+    engine = engine or db.engine
+    applied = []
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+        for version, description, step in MIGRATIONS:
+            if version in done:
+                continue
+            print(f"Applying migration {version}: {description}")
+            step(conn)
+            conn.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+            applied.append(version)
+    return applied
+
+def create_schema():
+    """Create the missing tables and apply every pending migration. Returns the versions applied."""
+    # Only the primary: a replica gets its schema by replication
+    db.create_all(bind_key=None)
+    return upgrade()
+
+def main():
+    parser = argparse.ArgumentParser(description='Create missing tables and apply pending schema migrations.')
+    parser.add_argument('--status', action='store_true', help='list migrations without applying them')
+    args = parser.parse_args()
+
+    from app import create_app
+    from health import wait_until_healthy
+    with create_app().app_context():
+        wait_until_healthy(schema=False)
+        if args.status:
+            with db.engine.begin() as conn:
+                done = applied_versions(conn)
+            for version, description, _ in MIGRATIONS:
+                print(f"{version:>4} {'applied' if version in done else 'pending':<8} {description}")
+        else:
+            applied = create_schema()
+            print(f"Applied {len(applied)} migrations")
+
+if __name__ == '__main__':
+    main()
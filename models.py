@@ -8,6 +8,9 @@ class Household(db.Model):
     join_code = db.Column(db.String(20), unique=True, nullable=False)
     base_currency = db.Column(db.String(3), default='USD', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped whenever the balance history chart of the household changes,
+    # see history_cache
+    history_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     users = db.relationship('User', backref='household', lazy=True)
     accounts = db.relationship('Account', backref='household', lazy=True)
@@ -33,11 +36,21 @@ class Account(db.Model):
     history = db.relationship('BalanceHistory', backref='account', lazy=True)
 
 class BalanceHistory(db.Model):
+    __table_args__ = (
+        # As-of lookups and the latest point of an account
+        db.Index('ix_balance_history_account_date', 'account_id', 'date', postgresql_include=['balance', 'invested_amount']),
+        # History chart reads, which only want the points at a given level or above
+        db.Index('ix_balance_history_account_level_date', 'account_id', 'level', 'date', postgresql_include=['balance', 'invested_amount']),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     balance = db.Column(db.Float, nullable=False)
     invested_amount = db.Column(db.Float, nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
+    # Coarsest bucket this point is the last of: 0 raw, 1 day, 2 week, 3 month.
+    # Maintained by retention_utils.record_history and used for compaction.
+    level = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 class Integration(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -47,6 +60,18 @@ class Integration(db.Model):
     last_synced = db.Column(db.DateTime, default=None, nullable=True)
     household_id = db.Column(db.Integer, db.ForeignKey('household.id'), nullable=False)
 
+class SyncJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    household_id = db.Column(db.Integer, db.ForeignKey('household.id'), nullable=False)
+    status = db.Column(db.String(20), default='queued', nullable=False) # 'queued', 'running', 'success', 'failed'
+    error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Last time the worker running the job showed it was still at it, see
+    # sync_worker.fail_abandoned_jobs
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
@@ -64,9 +89,24 @@ class Budget(db.Model):
     household_id = db.Column(db.Integer, db.ForeignKey('household.id'), nullable=False)
 
 class Transaction(db.Model):
+    __table_args__ = (
+        # Dashboard, transaction listing and exports
+        db.Index('ix_transaction_household_date', 'household_id', 'date'),
+        # Income-source rollover in budgets
+        db.Index('ix_transaction_income_source_date', 'income_source_id', 'date', postgresql_include=['type', 'currency', 'amount']),
+        # Per-category budget spend
+        db.Index('ix_transaction_category_household_date', 'category_id', 'household_id', 'date', postgresql_include=['type', 'currency', 'amount']),
+        # One generated transaction per recurring item and due date, so a rerun
+        # of the recurring scheduler can't duplicate entries
+        db.Index('uq_transaction_recurring_date', 'recurring_id', 'date', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)
     currency = db.Column(db.String(3), default='USD', nullable=False)
+    # Snapshot in the household's base currency at the time of entry. Totals are
+    # derived from amount/currency at query time instead, so a base-currency
+    # switch never has to rewrite this.
     amount_in_base_currency = db.Column(db.Float, nullable=False, default=0.0)
     description = db.Column(db.String(200))
     date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -74,16 +114,57 @@ class Transaction(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
     income_source_id = db.Column(db.Integer, db.ForeignKey('recurring_transaction.id'), nullable=True)
     income_source = db.relationship('RecurringTransaction', backref='funded_transactions', lazy=True)
+    # The recurring item this occurrence was generated from. A plain id, not a
+    # foreign key, so stopping the recurring item keeps its history.
+    recurring_id = db.Column(db.Integer, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     household_id = db.Column(db.Integer, db.ForeignKey('household.id'), nullable=False)
 
+# Transaction totals per household, month, category, income source, type and
+# currency. Kept in step with Transaction by rollup_utils so reports read a few
+# rows instead of the whole ledger.
+class MonthlySummary(db.Model):
+    __table_args__ = (
+        db.Index('ix_monthly_summary_household_month', 'household_id', 'year', 'month'),
+        db.Index('ix_monthly_summary_income_source_month', 'income_source_id', 'year', 'month'),
+        # One row per bucket. NULLs never collide in a unique index, so the
+        # nullable ids are compared as 0 (never a real id)
+        db.Index('uq_monthly_summary_bucket', 'household_id', 'year', 'month',
+                 db.text('coalesce(category_id, 0)'), db.text('coalesce(income_source_id, 0)'),
+                 'type', 'currency', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    household_id = db.Column(db.Integer, db.ForeignKey('household.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    category_id = db.Column(db.Integer, nullable=True)
+    income_source_id = db.Column(db.Integer, nullable=True)
+    type = db.Column(db.String(20), nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
 class RecurringTransaction(db.Model):
+    __table_args__ = (
+        # The scheduler's scan for due items across all households
+        db.Index('ix_recurring_transaction_next_due_date', 'next_due_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)
     currency = db.Column(db.String(3), default='USD', nullable=False)
     description = db.Column(db.String(200))
     frequency = db.Column(db.String(20), nullable=False) # 'weekly', 'monthly', 'yearly'
     next_due_date = db.Column(db.DateTime, nullable=False)
+    # Day of the month monthly and yearly items fall on. A Jan 31 item is due
+    # Feb 28 and then Mar 31 again, not Mar 28.
+    anchor_day = db.Column(db.Integer, nullable=True)
     type = db.Column(db.String(20), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
     household_id = db.Column(db.Integer, db.ForeignKey('household.id'), nullable=False)
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,195 @@
+"""
+Scheduler for recurring transactions.
+
+materialize_due() makes one pass over every recurring item that is due,
+in every household or just one. Each item gets a Transaction for every
+occurrence it has missed, dated on the day it fell due. Months and years
+are stepped by the calendar from the item's anchor day, so monthly items
+don't drift by a few days each time. The pass works in batches of items.
+For each batch it bulk-inserts the occurrences, updates the rollup,
+advances next_due_date and commits.
+
+Reruns are idempotent. An item's next_due_date only moves in the same
+commit as its occurrences, and the unique (recurring_id, date) index
+rejects an occurrence that a concurrent pass already inserted. When it
+does, the batch is written again one item at a time, each in a savepoint,
+so only the items whose occurrences already exist are skipped and keep
+their next_due_date.
+
+The sync worker runs a pass on every poll. For cron:
+
+Usage: python recurring_utils.py [--household ID]
+"""
+import argparse
+import calendar
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from currency_utils import CurrencyConverter
+from extensions import db
+from models import Household, RecurringTransaction, Transaction, User
+from rollup_utils import record_mappings
+
+BATCH_SIZE = 500
+# Occurrences generated per item and pass; a longer backlog continues on the next pass
+MAX_CATCH_UP = 1000
+
+def add_months(date, months, day):
+    """`date` moved by `months` calendar months, on `day` or the month's last day."""
+    month_index = date.month - 1 + months
+    year = date.year + month_index // 12
+    month = month_index % 12 + 1
+    return date.replace(year=year, month=month, day=min(day, calendar.monthrange(year, month)[1]))
+
+def next_occurrence(date, frequency, anchor_day):
+    if frequency == 'weekly':
+        return date + timedelta(weeks=1)
+    elif frequency == 'monthly':
+        return add_months(date, 1, anchor_day)
+    elif frequency == 'yearly':
+        return add_months(date, 12, anchor_day)
+    return None
+
+def occurrences(due, frequency, anchor_day, now):
+    """The due dates up to `now`, starting at `due`, and the next due date after them."""
+    dates = []
+    while due is not None and due <= now and len(dates) < MAX_CATCH_UP:
+        dates.append(due)
+        due = next_occurrence(due, frequency, anchor_day)
+    return dates, due
+
+def due_query(now, household_id=None):
+    # Scheduled occurrences are recorded as the household's first member
+    first_member = db.select(
+        User.household_id, db.func.min(User.id).label('user_id')
+    ).group_by(User.household_id).subquery()
+
+    query = db.select(
+        RecurringTransaction.id,
+        RecurringTransaction.amount,
+        RecurringTransaction.currency,
+        RecurringTransaction.description,
+        RecurringTransaction.frequency,
+        RecurringTransaction.next_due_date,
+        RecurringTransaction.anchor_day,
+        RecurringTransaction.type,
+        RecurringTransaction.category_id,
+        RecurringTransaction.household_id,
+        Household.base_currency,
+        first_member.c.user_id
+    ).join(
+        Household, RecurringTransaction.household_id == Household.id
+    ).outerjoin(
+        first_member, RecurringTransaction.household_id == first_member.c.household_id
+    ).where(
+        RecurringTransaction.next_due_date <= now
+    ).order_by(RecurringTransaction.id)
+
+    if household_id is not None:
+        query = query.where(RecurringTransaction.household_id == household_id)
+    return query
+
+def plan_batch(rows, now, user_id=None):
+    """The occurrences of each due item in `rows`: a list of (advance, transaction mappings)."""
+    items = []
+    for r in rows:
+        user = user_id or r.user_id
+        if user is None:
+            # A household nobody belongs to any more
+            continue
+        dates, next_due = occurrences(r.next_due_date, r.frequency, r.anchor_day or r.next_due_date.day, now)
+        if next_due is None:
+            print(f"Recurring transaction {r.id} has unknown frequency '{r.frequency}', skipped")
+            continue
+
+        mappings = []
+        for date in dates:
+            mappings.append({
+                'amount': r.amount,
+                'currency': r.currency,
+                'base_currency': r.base_currency,
+                'description': f"{r.description} (Recurring)",
+                'type': r.type,
+                'date': date,
+                'category_id': r.category_id,
+                'income_source_id': None,
+                'recurring_id': r.id,
+                'user_id': user,
+                'household_id': r.household_id
+            })
+        items.append(({'row_id': r.id, 'old_due': r.next_due_date, 'new_due': next_due}, mappings))
+
+    mappings = [m for _, item_mappings in items for m in item_mappings]
+    if mappings:
+        base_amounts = CurrencyConverter.convert_batch(
+            [m['amount'] for m in mappings],
+            [m['currency'] for m in mappings],
+            [m.pop('base_currency') for m in mappings]
+        ).tolist()
+        for mapping, base_amount in zip(mappings, base_amounts):
+            mapping['amount_in_base_currency'] = base_amount
+    return items
+
+def write_items(items):
+    """Inserts the occurrences of `items` and advances them. Returns the number of transactions inserted."""
+    advances = [advance for advance, _ in items]
+    mappings = [m for _, item_mappings in items for m in item_mappings]
+    recurring = RecurringTransaction.__table__
+    if advances:
+        # Only moves items still due where this pass found them
+        db.session.execute(
+            recurring.update().where(
+                recurring.c.id == db.bindparam('row_id'),
+                recurring.c.next_due_date == db.bindparam('old_due')
+            ).values(next_due_date=db.bindparam('new_due')),
+            advances
+        )
+    if mappings:
+        db.session.execute(Transaction.__table__.insert(), mappings)
+        record_mappings(mappings)
+    return len(mappings)
+
+def materialize_due(now=None, household_id=None, user_id=None, batch_size=BATCH_SIZE):
+    """
+    Generates the transactions of every due recurring item, for all
+    households or one. `user_id` records them as that user instead of the
+    household's first member. Returns the number of transactions created.
+    """
+    now = now or datetime.utcnow()
+    query = due_query(now, household_id).limit(batch_size)
+
+    created = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(query.where(RecurringTransaction.id > last_id)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        items = plan_batch(rows, now, user_id)
+        try:
+            with db.session.begin_nested():
+                created += write_items(items)
+        except IntegrityError:
+            # Some of these items already have occurrences on their due
+            # dates, e.g. written by a concurrent pass. Write the others.
+            for item in items:
+                try:
+                    with db.session.begin_nested():
+                        created += write_items([item])
+                except IntegrityError:
+                    print(f"Recurring item {item[0]['row_id']} already has transactions on its due dates, skipped")
+        db.session.commit()
+    return created
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the transactions of due recurring items.')
+    parser.add_argument('--household', type=int, help='only this household')
+    args = parser.parse_args()
+
+    from app import create_app
+    with create_app().app_context():
+        print(f"Created {materialize_due(household_id=args.household)} recurring transactions")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Routing of read-only queries to a replica database.
+
+With REPLICA_DATABASE_URL set, create_app() adds it as the "replica" bind.
+The read-heavy views (the history chart, budgets and the dashboard totals)
+run under from_replica(), during which RoutingSession sends SELECTs to the
+replica. Everything else, and all writes, stays on the primary.
+
+A replica lags behind the primary, so a user who just wrote something
+would not see it there. Any request whose INSERT, UPDATE or DELETE
+statements changed rows stamps the user's session cookie, and for
+REPLICA_READ_YOUR_WRITES seconds after that the user's reads stay on the
+primary too. Statements that matched no rows don't count, nor do writes
+under unstamped(), for bookkeeping the user never reads back.
+
+To try it locally, point REPLICA_DATABASE_URL at a copy of the SQLite file:
+reads from the replica won't show writes made after the copy.
+"""
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = 'replica'
+REPLICA_READ_YOUR_WRITES = float(os.environ.get('REPLICA_READ_YOUR_WRITES', 10))
+
+class RoutingSession(Session):
+    """Sends SELECTs to the replica inside from_replica(), everything else to the primary."""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and isinstance(clause, Select) and not self._flushing:
+            if g.get('read_replica') and REPLICA_BIND in self._db.engines:
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or g.get('unstamped_writes'):
+        return
+    # rowcount is -1 where the driver can't tell, which counts as a write
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete) and cursor.rowcount != 0:
+        g.database_write = True
+
+def replica_allowed():
+    """Whether this request may read from the replica, i.e. the user hasn't written just now."""
+    return time.time() - session.get('last_write', 0) >= REPLICA_READ_YOUR_WRITES
+
+@contextmanager
+def from_replica():
+    """Read from the replica, if allowed, until the block ends."""
+    previous = g.get('read_replica', False)
+    g.read_replica = replica_allowed()
+    try:
+        yield
+    finally:
+        g.read_replica = previous
+
+@contextmanager
+def unstamped():
+    """Writes in the block don't keep the user's reads on the primary."""
+    previous = g.get('unstamped_writes', False)
+    g.unstamped_writes = True
+    try:
+        yield
+    finally:
+        g.unstamped_writes = previous
+
+def read_only(view):
+    """Runs a view under from_replica(). Only for views that never write."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with from_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+def _stamp_write(response):
+    if g.pop('database_write', False):
+        session['last_write'] = time.time()
+    return response
+
+def init_app(app):
+    app.after_request(_stamp_write)
@@ -0,0 +1,126 @@
+"""
+Retention and downsampling of BalanceHistory.
+
+Every point carries a level: the coarsest bucket (day, week or month) it is
+currently the last point of. A new point starts at MONTHLY, since it is the
+latest of everything so far, and demotes the account's previous point to
+the bucket the two have in common. So at any time:
+
+- the points with level >= DAILY are the last point of each day,
+- the points with level >= WEEKLY include the last point of each week,
+- the points with level == MONTHLY include the last point of each month.
+
+The history chart samples as-of at the end of each day or week, so those
+points are all it needs. compact() deletes everything else once it gets
+old: raw points after RAW_RETENTION_DAYS, daily ones after
+DAILY_RETENTION_DAYS, weekly ones after WEEKLY_RETENTION_DAYS. Monthly
+points are kept forever. The sync worker runs it every COMPACTION_INTERVAL.
+
+Usage: python retention_utils.py
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import history_cache
+from extensions import db
+from models import BalanceHistory
+
+RAW, DAILY, WEEKLY, MONTHLY = 0, 1, 2, 3
+
+RAW_RETENTION_DAYS = int(os.environ.get('RAW_RETENTION_DAYS', 7))
+DAILY_RETENTION_DAYS = int(os.environ.get('DAILY_RETENTION_DAYS', 365))
+WEEKLY_RETENTION_DAYS = int(os.environ.get('WEEKLY_RETENTION_DAYS', 3 * 365))
+COMPACTION_INTERVAL = int(os.environ.get('COMPACTION_INTERVAL', 3600))
+
+# Level of the points a chart at each resolution needs. Monthly charts
+# sample at the end of every 30th day, not at month ends, so they read the
+# daily points.
+RESOLUTION_LEVELS = {'daily': DAILY, 'weekly': WEEKLY, 'monthly': DAILY}
+
+def bucket_level(earlier, later):
+    """Level of a point at `earlier` once a point at `later` follows it."""
+    if (earlier.year, earlier.month) != (later.year, later.month):
+        return MONTHLY
+    if earlier.isocalendar()[:2] != later.isocalendar()[:2]:
+        return WEEKLY
+    if earlier.date() != later.date():
+        return DAILY
+    return RAW
+
+def record_history(account_id, balance, invested_amount, date):
+    """Adds a BalanceHistory point, demoting the account's previous latest point. Doesn't commit."""
+    previous = BalanceHistory.query.filter_by(account_id=account_id).order_by(BalanceHistory.date.desc()).first()
+    level = MONTHLY
+    if previous is not None:
+        if previous.date <= date:
+            previous.level = bucket_level(previous.date, date)
+        else:
+            level = bucket_level(date, previous.date)
+
+    point = BalanceHistory(account_id=account_id, balance=balance, invested_amount=invested_amount, date=date, level=level)
+    db.session.add(point)
+    return point
+
+def history_conditions(resolution, start_date=None):
+    """
+    Filters selecting the points a chart at `resolution` from `start_date`
+    needs. Before the start, only the points that can carry the as-of value
+    into the range are kept: those up to a month earlier, and month ends.
+    """
+    conditions = [BalanceHistory.level >= RESOLUTION_LEVELS.get(resolution, RAW)]
+    if start_date:
+        conditions.append(db.or_(
+            BalanceHistory.date >= start_date - timedelta(days=32),
+            BalanceHistory.level == MONTHLY
+        ))
+    return conditions
+
+def backfill_levels(conn):
+    """Computes the level of every existing point, one account at a time."""
+    history = BalanceHistory.__table__
+    conn.execute(history.update().values(level=RAW))
+    account_ids = conn.execute(db.select(history.c.account_id).distinct()).scalars().all()
+    for account_id in account_ids:
+        points = conn.execute(
+            db.select(history.c.id, history.c.date)
+            .where(history.c.account_id == account_id)
+            .order_by(history.c.date, history.c.id)
+        ).all()
+        updates = [
+            {'row_id': point.id, 'new_level': bucket_level(point.date, following.date)}
+            for point, following in zip(points, points[1:])
+        ]
+        updates = [u for u in updates if u['new_level'] != RAW]
+        updates.append({'row_id': points[-1].id, 'new_level': MONTHLY})
+        conn.execute(
+            history.update().where(history.c.id == db.bindparam('row_id')).values(level=db.bindparam('new_level')),
+            updates
+        )
+
+def compact(now=None):
+    """Deletes the points past their level's retention. Returns how many. Doesn't commit."""
+    now = now or datetime.utcnow()
+    history = BalanceHistory.__table__
+    result = db.session.execute(history.delete().where(db.or_(
+        db.and_(history.c.level == RAW, history.c.date < now - timedelta(days=RAW_RETENTION_DAYS)),
+        db.and_(history.c.level == DAILY, history.c.date < now - timedelta(days=DAILY_RETENTION_DAYS)),
+        db.and_(history.c.level == WEEKLY, history.c.date < now - timedelta(days=WEEKLY_RETENTION_DAYS)),
+    )))
+    if result.rowcount:
+        history_cache.invalidate()
+    return result.rowcount
+
+def main():
+    parser = argparse.ArgumentParser(description='Delete balance history past its retention.')
+    parser.parse_args()
+
+    from app import create_app
+    with create_app().app_context():
+        before = BalanceHistory.query.count()
+        deleted = compact()
+        db.session.commit()
+        print(f"Deleted {deleted} of {before} balance history points")
+
+if __name__ == '__main__':
+    main()
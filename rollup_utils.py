@@ -0,0 +1,202 @@
+"""
+Maintenance of the MonthlySummary rollup.
+
+Every code path that writes a Transaction calls record_transaction() /
+unrecord_transaction() (record_mappings() for bulk inserts) in the same
+database transaction, so the rollup commits (or rolls back) together with
+the ledger. rebuild() recomputes it from scratch in one set-based
+statement, for backfills and repairs, and when deleting a category or
+recurring item nulls that column on its transactions (see
+rebuild_after_unlink()).
+
+Usage: python rollup_utils.py [--household ID]
+"""
+import argparse
+
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import MonthlySummary, Transaction
+
+def _key(t):
+    return (t.household_id, t.date.year, t.date.month, t.category_id, t.income_source_id, t.type, t.currency)
+
+def _bucket(key):
+    """WHERE clauses matching the rollup row of `key`."""
+    summary = MonthlySummary.__table__
+    household_id, year, month, category_id, income_source_id, type, currency = key
+    return [
+        summary.c.household_id == household_id,
+        summary.c.year == year,
+        summary.c.month == month,
+        summary.c.category_id.is_(None) if category_id is None else summary.c.category_id == category_id,
+        summary.c.income_source_id.is_(None) if income_source_id is None else summary.c.income_source_id == income_source_id,
+        summary.c.type == type,
+        summary.c.currency == currency,
+    ]
+
+def _increment(key, total, count):
+    """Add to the row of `key`. False if there's no such row."""
+    summary = MonthlySummary.__table__
+    # Increments rather than new values, so concurrent writers can't lose updates
+    result = db.session.execute(summary.update().where(*_bucket(key)).values(
+        total=summary.c.total + total,
+        count=summary.c.count + count
+    ))
+    return result.rowcount > 0
+
+def _adjust(key, total, count):
+    summary = MonthlySummary.__table__
+    if not _increment(key, total, count):
+        household_id, year, month, category_id, income_source_id, type, currency = key
+        try:
+            with db.session.begin_nested():
+                db.session.execute(summary.insert().values(
+                    household_id=household_id,
+                    year=year,
+                    month=month,
+                    category_id=category_id,
+                    income_source_id=income_source_id,
+                    type=type,
+                    currency=currency,
+                    total=total,
+                    count=count
+                ))
+        except IntegrityError:
+            # Another writer created the row first (uq_monthly_summary_bucket)
+            _increment(key, total, count)
+
+    if count < 0:
+        db.session.execute(summary.delete().where(*_bucket(key), summary.c.count <= 0))
+
+def record_transaction(t):
+    """Add a new (or just updated) transaction to the rollup. Doesn't commit."""
+    _adjust(_key(t), t.amount, 1)
+
+def unrecord_transaction(t):
+    """Take a transaction out of the rollup, before it's deleted or changed. Doesn't commit."""
+    _adjust(_key(t), -t.amount, -1)
+
+def rebuild_after_unlink(household_id):
+    """
+    Deleting a category or recurring item sets category_id/income_source_id
+    to NULL on its transactions, which leaves their rollup rows under an id
+    that no longer exists. Call after the delete is flushed. Doesn't commit.
+    """
+    db.session.flush()
+    rebuild(household_id=household_id)
+
+def record_mappings(mappings):
+    """
+    Add bulk-inserted transactions, given as the dicts passed to the insert,
+    to the rollup. Loads the affected months' rows in one query, then
+    updates and inserts them in one statement each, instead of a lookup
+    per group.
+    Doesn't commit.
+    """
+    groups = {}
+    for m in mappings:
+        key = (m['household_id'], m['date'].year, m['date'].month, m.get('category_id'),
+               m.get('income_source_id'), m['type'], m['currency'])
+        total, count = groups.get(key, (0.0, 0))
+        groups[key] = (total + m['amount'], count + 1)
+    if not groups:
+        return
+
+    households = {key[0] for key in groups}
+    months = {(key[1], key[2]) for key in groups}
+    summary = MonthlySummary.__table__
+    existing = {}
+    for row in db.session.execute(db.select(summary).where(
+        summary.c.household_id.in_(households),
+        db.tuple_(summary.c.year, summary.c.month).in_(months)
+    )):
+        existing[(row.household_id, row.year, row.month, row.category_id,
+                  row.income_source_id, row.type, row.currency)] = row.id
+
+    new_rows = []
+    increments = []
+    for key, (total, count) in groups.items():
+        if key in existing:
+            increments.append({'row_id': existing[key], 'add_total': total, 'add_count': count})
+        else:
+            household_id, year, month, category_id, income_source_id, type, currency = key
+            new_rows.append({
+                'household_id': household_id,
+                'year': year,
+                'month': month,
+                'category_id': category_id,
+                'income_source_id': income_source_id,
+                'type': type,
+                'currency': currency,
+                'total': total,
+                'count': count
+            })
+
+    if increments:
+        # Increments rather than new values, so concurrent writers can't lose updates
+        db.session.execute(
+            summary.update().where(summary.c.id == db.bindparam('row_id')).values(
+                total=summary.c.total + db.bindparam('add_total'),
+                count=summary.c.count + db.bindparam('add_count')
+            ),
+            increments
+        )
+    if new_rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(summary.insert(), new_rows)
+        except IntegrityError:
+            # Another writer created some of these rows meanwhile, add them one by one
+            for row in new_rows:
+                key = tuple(row[c] for c in ('household_id', 'year', 'month', 'category_id',
+                                             'income_source_id', 'type', 'currency'))
+                _adjust(key, row['total'], row['count'])
+
+def rebuild(bind=None, household_id=None):
+    """
+    Recompute the rollup from the Transaction table, for every household or
+    just one. `bind` is a Connection or Session, the current session by default.
+    """
+    bind = bind or db.session
+    year_col = db.cast(db.extract('year', Transaction.date), db.Integer)
+    month_col = db.cast(db.extract('month', Transaction.date), db.Integer)
+
+    delete = db.delete(MonthlySummary)
+    select = db.select(
+        Transaction.household_id,
+        year_col,
+        month_col,
+        Transaction.category_id,
+        Transaction.income_source_id,
+        Transaction.type,
+        Transaction.currency,
+        db.func.sum(Transaction.amount),
+        db.func.count()
+    ).group_by(
+        Transaction.household_id, year_col, month_col, Transaction.category_id,
+        Transaction.income_source_id, Transaction.type, Transaction.currency
+    )
+    if household_id is not None:
+        delete = delete.where(MonthlySummary.household_id == household_id)
+        select = select.where(Transaction.household_id == household_id)
+
+    bind.execute(delete)
+    bind.execute(db.insert(MonthlySummary).from_select(
+        ['household_id', 'year', 'month', 'category_id', 'income_source_id', 'type', 'currency', 'total', 'count'],
+        select
+    ))
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the monthly transaction rollup.')
+    parser.add_argument('--household', type=int, help='only rebuild this household')
+    args = parser.parse_args()
+
+    from app import create_app
+    with create_app().app_context():
+        rebuild(household_id=args.household)
+        db.session.commit()
+        print(f"Rebuilt {MonthlySummary.query.count()} rollup rows")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,421 @@
+"""
+Background sync of integration balances.
+
+The web app doesn't wait on the exchanges to render a page: it only queues
+a SyncJob when an integration is stale (Sync Now on the accounts page is
+the one exception). This worker runs the queued jobs and also schedules a
+job for every household whose integrations haven't synced within
+SYNC_INTERVAL. The jobs of a pass run on one event loop, so the upstream
+calls of up to SYNC_JOB_CONCURRENCY households wait at the same time. Each
+pass also generates the due recurring transactions of every household (see
+recurring_utils) and, every COMPACTION_INTERVAL, compacts the balance
+history (see retention_utils).
+
+Usage: python sync_worker.py [--once] [--local] [--poll SECONDS]
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import Household, Account, Integration, SyncJob
+from recurring_utils import materialize_due
+from retention_utils import record_history, compact, COMPACTION_INTERVAL
+from werkzeug.utils import import_string
+
+from integrations.cache import CachedClient
+
+# Seconds after which an integration is considered stale
+SYNC_INTERVAL = 86400
+
+# Upper bound on upstream calls made in parallel, per sync and per client
+SYNC_CONCURRENCY = int(os.environ.get('SYNC_CONCURRENCY', 4))
+
+# Households a worker syncs at once, their upstream calls overlapping on
+# one event loop
+SYNC_JOB_CONCURRENCY = int(os.environ.get('SYNC_JOB_CONCURRENCY', 16))
+
+# Seconds before a single upstream call is abandoned
+SYNC_TIMEOUT = float(os.environ.get('SYNC_TIMEOUT', 10))
+
+# Seconds between the heartbeats a worker writes to the jobs it's running
+SYNC_HEARTBEAT_INTERVAL = float(os.environ.get('SYNC_HEARTBEAT_INTERVAL', 30))
+
+# Seconds without a heartbeat after which a running job is taken for
+# abandoned by a worker that crashed or was killed
+SYNC_JOB_TIMEOUT = float(os.environ.get('SYNC_JOB_TIMEOUT', SYNC_HEARTBEAT_INTERVAL * 10))
+
+# Seconds a fetched balance is reused without calling the upstream again
+BALANCE_CACHE_TTL = float(os.environ.get('BALANCE_CACHE_TTL', 300))
+
+# Consecutive failures after which an integration's circuit breaker opens
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 3))
+
+# First backoff after a failure/rate limit, doubled on each repeat up to the max
+BACKOFF_BASE = float(os.environ.get('BACKOFF_BASE', 60))
+BACKOFF_MAX = float(os.environ.get('BACKOFF_MAX', 3600))
+
+# Client classes per platform, as import strings so the client libraries
+# are only loaded by the first sync that needs them. Classes work too.
+CLIENTS = {
+    'bybit': 'integrations.bybit_client:BybitClient',
+    'trading212': 'integrations.trading212_client:Trading212Client',
+}
+
+LOCAL_CLIENTS = {
+    'bybit': 'integrations.stub_client:StubClient',
+    'trading212': 'integrations.stub_client:StubClient',
+}
+
+# Clients are kept per integration so their HTTP sessions, and what they
+# learned about the upstream (environment, cached balance, failures), carry
+# over from one sync to the next
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(integration, clients):
+    client_class = clients.get(integration.platform)
+    if not client_class:
+        return None
+    if isinstance(client_class, str):
+        client_class = import_string(client_class)
+
+    key = (client_class, integration.api_key, integration.api_secret, SYNC_TIMEOUT, SYNC_CONCURRENCY)
+    with _clients_lock:
+        cached = _clients.get(integration.id)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        client = CachedClient(
+            client_class(integration.api_key, integration.api_secret, timeout=SYNC_TIMEOUT, max_workers=SYNC_CONCURRENCY),
+            ttl=BALANCE_CACHE_TTL,
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            backoff_base=BACKOFF_BASE,
+            backoff_max=BACKOFF_MAX
+        )
+        _clients[integration.id] = (key, client)
+        return client
+
+def is_stale(integration, now=None):
+    now = now or datetime.utcnow()
+    return not integration.last_synced or (now - integration.last_synced).total_seconds() > SYNC_INTERVAL
+
+def pending_syncs(household_id, clients):
+    """The household's integrations that have a client, with that client."""
+    household = Household.query.get(household_id)
+    if not household:
+        return []
+
+    integrations = household.integrations
+    if not integrations:
+        return []
+
+    print(f"=== SYNC START: Found {len(integrations)} integrations ===")
+
+    pending = []
+    for i in integrations:
+        client = get_client(i, clients)
+        if client:
+            pending.append((i, client))
+    return pending
+
+def record_balances(household_id, pending, results):
+    """
+    Store the balances fetched for `pending`, `results` holding a balance or
+    the exception raised per integration. Returns a list of error messages.
+    """
+    errors = []
+    for (i, _), result in zip(pending, results):
+        print(f"Processing integration: {i.platform}")
+
+        try:
+            if isinstance(result, BaseException):
+                raise result
+            balance = result
+
+            # Update or Create Account
+            account_name = f"{i.platform.capitalize()} Account"
+            account = Account.query.filter_by(name=account_name, household_id=household_id).first()
+
+            if account:
+                account.balance = balance
+            else:
+                account = Account(name=account_name, type='Investment', balance=balance, household_id=household_id)
+                db.session.add(account)
+                db.session.flush()
+
+            # Record History
+            record_history(account.id, balance, account.invested_amount, datetime.utcnow())
+
+            # Update last_synced
+            i.last_synced = datetime.utcnow()
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error syncing {i.platform}: {e}")
+            errors.append(f"{i.platform}: {e}")
+
+    print("=== SYNC COMPLETE ===")
+    return errors
+
+def sync_integrations_helper(household_id, clients=None):
+    """
+    Fetch the balance of every integration of the household and record it.
+    Returns a list of error messages, empty if every integration synced.
+    """
+    pending = pending_syncs(household_id, clients or CLIENTS)
+    if not pending:
+        return []
+
+    # The upstream calls of all integrations run in parallel, the
+    # database writes stay on this thread
+    with ThreadPoolExecutor(max_workers=max(1, min(SYNC_CONCURRENCY, len(pending)))) as pool:
+        futures = [pool.submit(client.get_balance) for _, client in pending]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return record_balances(household_id, pending, results)
+
+async def fetch_balances_async(pending):
+    """
+    The balance, or the exception raised, of each (integration, client) in
+    `pending`. Only awaits the upstreams, never touches the database, so
+    the fetches of many households can share one event loop.
+    """
+    semaphore = asyncio.Semaphore(max(1, SYNC_CONCURRENCY))
+
+    async def fetch(client):
+        async with semaphore:
+            return await client.get_balance_async()
+
+    try:
+        return await asyncio.gather(*(fetch(client) for _, client in pending), return_exceptions=True)
+    finally:
+        # HTTP sessions belong to this event loop, they can't outlive it
+        await asyncio.gather(*(client.aclose() for _, client in pending))
+
+async def sync_integrations_async(household_id, clients=None):
+    """
+    sync_integrations_helper() for use on an event loop: the upstream calls
+    are awaited instead of run in threads.
+    """
+    pending = pending_syncs(household_id, clients or CLIENTS)
+    if not pending:
+        return []
+    results = await fetch_balances_async(pending)
+    return record_balances(household_id, pending, results)
+
+def is_abandoned(job, now=None):
+    """Whether `job` is running without a heartbeat for SYNC_JOB_TIMEOUT."""
+    now = now or datetime.utcnow()
+    last_seen = job.heartbeat_at or job.started_at
+    return job.status == 'running' and (last_seen is None or (now - last_seen).total_seconds() > SYNC_JOB_TIMEOUT)
+
+def fail_abandoned_jobs(household_id=None, now=None):
+    """
+    Mark running jobs without a heartbeat for SYNC_JOB_TIMEOUT as failed,
+    for every household or one, so the household can be synced again.
+    Returns the number of jobs failed. Doesn't commit.
+    """
+    now = now or datetime.utcnow()
+    # Jobs claimed before heartbeats existed only have started_at
+    last_seen = db.func.coalesce(SyncJob.heartbeat_at, SyncJob.started_at)
+    query = SyncJob.query.filter(
+        SyncJob.status == 'running',
+        db.or_(last_seen.is_(None), last_seen < now - timedelta(seconds=SYNC_JOB_TIMEOUT))
+    )
+    if household_id is not None:
+        query = query.filter(SyncJob.household_id == household_id)
+    return query.update(
+        {'status': 'failed', 'error': 'abandoned: the worker running it stopped', 'finished_at': now},
+        synchronize_session=False
+    )
+
+def enqueue_sync(household_id):
+    """
+    Queue a sync for the household unless one is already queued or running.
+    A job left running by a worker that died doesn't count.
+    """
+    job = SyncJob.query.filter(
+        SyncJob.household_id == household_id,
+        SyncJob.status.in_(['queued', 'running'])
+    ).order_by(SyncJob.status == 'running').first()
+    if job is not None:
+        if not is_abandoned(job):
+            return job
+        # Only updated when there's one to fail, the dashboard calls this
+        # on every view of a stale household
+        fail_abandoned_jobs(household_id)
+
+    job = SyncJob(household_id=household_id, status='queued')
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+class SyncWorker:
+    def __init__(self, app, clients=None, poll_interval=60):
+        self.app = app
+        self.clients = clients or CLIENTS
+        self.poll_interval = poll_interval
+        self.last_compaction = None
+
+    def schedule_stale(self):
+        """Queue a job for every household with a stale integration this worker has a client for."""
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=SYNC_INTERVAL)
+        household_ids = db.session.query(Integration.household_id).filter(
+            db.or_(Integration.last_synced.is_(None), Integration.last_synced < cutoff),
+            # A job for the others would sync nothing, and they'd stay stale
+            Integration.platform.in_(list(self.clients))
+        ).distinct().all()
+        for (household_id,) in household_ids:
+            enqueue_sync(household_id)
+
+    def compact_history(self):
+        """Apply the balance history retention, at most every COMPACTION_INTERVAL."""
+        now = time.monotonic()
+        if self.last_compaction is not None and now - self.last_compaction < COMPACTION_INTERVAL:
+            return
+        deleted = compact()
+        db.session.commit()
+        self.last_compaction = now
+        if deleted:
+            print(f"Compacted {deleted} balance history points")
+
+    def claim(self, job):
+        """Mark a queued job as running. False if another worker got to it first."""
+        now = datetime.utcnow()
+        claimed = SyncJob.query.filter_by(id=job.id, status='queued').update(
+            {'status': 'running', 'started_at': now, 'heartbeat_at': now},
+            synchronize_session=False
+        )
+        db.session.commit()
+        return claimed == 1
+
+    def heartbeat(self, jobs):
+        """Show that `jobs` are still being run, so they aren't taken for abandoned."""
+        if jobs:
+            SyncJob.query.filter(SyncJob.id.in_([job.id for job in jobs]), SyncJob.status == 'running').update(
+                {'heartbeat_at': datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.session.commit()
+
+    def finish(self, job, errors):
+        """
+        Record the outcome of a running job. Leaves a job that is no longer
+        running alone, e.g. one failed as abandoned meanwhile.
+        """
+        finished = SyncJob.query.filter_by(id=job.id, status='running').update(
+            {
+                'status': 'failed' if errors else 'success',
+                'error': '; '.join(errors)[:500] if errors else None,
+                'finished_at': datetime.utcnow(),
+            },
+            synchronize_session=False
+        )
+        db.session.commit()
+        if not finished:
+            print(f"Sync job {job.id} was no longer running, its outcome wasn't recorded")
+
+    async def run_jobs(self, jobs):
+        """
+        Claim and run `jobs`, up to SYNC_JOB_CONCURRENCY at once. Returns the
+        ids of those run.
+
+        Only the upstream calls run concurrently, as tasks that never touch
+        the database. All the database work (claiming a job and reading its
+        integrations before, recording the balances after) is done here, one
+        job at a time, while the tasks are being awaited.
+        """
+        done = []
+        running = {}
+        position = 0
+        last_heartbeat = time.monotonic()
+        while True:
+            while len(running) < max(1, SYNC_JOB_CONCURRENCY) and position < len(jobs):
+                job = jobs[position]
+                position += 1
+                if not self.claim(job):
+                    continue
+                db.session.refresh(job)
+                try:
+                    pending = pending_syncs(job.household_id, self.clients)
+                except Exception as e:
+                    db.session.rollback()
+                    self.finish(job, [str(e)])
+                    done.append(job.id)
+                    continue
+                running[asyncio.ensure_future(fetch_balances_async(pending))] = (job, pending)
+            if not running:
+                return done
+
+            finished, _ = await asyncio.wait(running, timeout=SYNC_HEARTBEAT_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            if time.monotonic() - last_heartbeat >= SYNC_HEARTBEAT_INTERVAL:
+                self.heartbeat([job for job, _ in running.values()])
+                last_heartbeat = time.monotonic()
+            for task in finished:
+                job, pending = running.pop(task)
+                try:
+                    errors = record_balances(job.household_id, pending, task.result()) if pending else []
+                except Exception as e:
+                    db.session.rollback()
+                    errors = [str(e)]
+                self.finish(job, errors)
+                done.append(job.id)
+
+    def run_once(self):
+        """
+        Generate due recurring transactions, compact the balance history,
+        fail abandoned jobs, schedule stale households and run every
+        queued job. Returns the jobs run.
+        """
+        with self.app.app_context():
+            created = materialize_due()
+            if created:
+                print(f"Created {created} recurring transactions")
+            self.compact_history()
+            abandoned = fail_abandoned_jobs()
+            db.session.commit()
+            if abandoned:
+                print(f"Failed {abandoned} abandoned sync jobs")
+            self.schedule_stale()
+            jobs = SyncJob.query.filter_by(status='queued').order_by(SyncJob.created_at).all()
+            done = asyncio.run(self.run_jobs(jobs))
+            db.session.remove()
+            return done
+
+    def run_forever(self):
+        print(f"Sync worker started (poll every {self.poll_interval}s)")
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Sync worker error: {e}")
+            time.sleep(self.poll_interval)
+
+def main():
+    parser = argparse.ArgumentParser(description='Background sync of integration balances.')
+    parser.add_argument('--once', action='store_true', help='run one pass and exit')
+    parser.add_argument('--local', action='store_true', help='use stub clients instead of the real APIs')
+    parser.add_argument('--poll', type=int, default=60, help='seconds between passes')
+    args = parser.parse_args()
+
+    from app import create_app
+    worker = SyncWorker(create_app(), clients=LOCAL_CLIENTS if args.local else CLIENTS, poll_interval=args.poll)
+    if args.once:
+        print(f"Ran {len(worker.run_once())} sync jobs")
+    else:
+        worker.run_forever()
+
+if __name__ == '__main__':
+    main()
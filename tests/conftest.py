@@ -0,0 +1,75 @@
+import os
+import sys
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import db
+from migrations import create_schema
+from models import User
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+    })
+    with app.app_context():
+        create_schema()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register(client, household_name='Home', base_currency='USD'):
+    """Register a user with a new household through the views. Returns the user id and household id."""
+    username = f'user-{uuid.uuid4().hex[:8]}'
+    response = client.post('/register', data={
+        'username': username, 'password': 'secret',
+        'household_action': 'create', 'household_name': household_name, 'base_currency': base_currency,
+    })
+    assert response.status_code == 302
+    with client.application.app_context():
+        user = User.query.filter_by(username=username).one()
+        return user.id, user.household_id
+
+
+@pytest.fixture
+def household(client):
+    """A logged-in user's (user id, household id)."""
+    return register(client)
+
+
+class StatementCounter:
+    """Counts the statements run on `engine` inside a `with` block."""
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+    def __len__(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_statements(app):
+    with app.app_context():
+        engine = db.engine
+    return lambda: StatementCounter(engine)
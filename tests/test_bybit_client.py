@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from integrations.base import IntegrationError, RateLimitError
+from integrations.bybit_client import BybitClient
+
+WALLET = {'retCode': 0, 'result': {'list': [{'totalEquity': '1500.5', 'coin': [{'coin': 'BTC', 'usdValue': '1500.5'}]}]}}
+FUND = {'retCode': 0, 'result': {'balance': []}}
+UNSUPPORTED = {'retCode': 10001, 'retMsg': 'accountType only support UNIFIED.'}
+
+
+def balance(responses):
+    """get_balance_async() with each endpoint answered by `responses[(path, accountType)]`, a response or an exception."""
+    client = BybitClient('key', 'secret')
+
+    async def fetch_async(path, params):
+        response = responses(path, params['accountType'])
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client.fetch_async = fetch_async
+    return asyncio.run(client.get_balance_async())
+
+
+def test_unsupported_account_types_are_skipped():
+    def responses(path, account_type):
+        if path == BybitClient.WALLET_BALANCE_PATH:
+            return WALLET if account_type == 'UNIFIED' else UNSUPPORTED
+        return FUND
+    assert balance(responses) == pytest.approx(1500.5)
+
+
+def test_a_timeout_fails_the_balance_instead_of_dropping_the_wallet():
+    def responses(path, account_type):
+        if path == BybitClient.WALLET_BALANCE_PATH and account_type == 'UNIFIED':
+            return asyncio.TimeoutError()
+        return FUND
+    with pytest.raises(IntegrationError):
+        balance(responses)
+
+
+def test_any_other_error_code_fails_the_balance():
+    def responses(path, account_type):
+        if path == BybitClient.WALLET_BALANCE_PATH:
+            return {'retCode': 10002, 'retMsg': 'invalid request, please check your server timestamp'}
+        return FUND
+    with pytest.raises(IntegrationError):
+        balance(responses)
+
+
+def test_a_rate_limit_is_raised_before_other_errors():
+    def responses(path, account_type):
+        if path == BybitClient.COINS_BALANCE_PATH and account_type == 'FUND':
+            return RateLimitError('Bybit rate limit', retry_after=2)
+        return ConnectionError('reset')
+    with pytest.raises(RateLimitError):
+        balance(responses)
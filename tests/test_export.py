@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+
+import pytest
+
+from currency_utils import CurrencyConverter
+from export_utils import export_chunks, export_query
+from models import Category
+
+
+def add_transaction(client, **fields):
+    data = {'amount': '10', 'description': 'x', 'type': 'expense', 'date': '2024-05-10', 'currency': 'USD'}
+    data.update(fields)
+    assert client.post('/transactions', data=data).status_code == 302
+
+
+def test_amounts_are_in_the_current_base_currency(client, household):
+    add_transaction(client, amount='10', currency='USD')
+    add_transaction(client, amount='20', currency='EUR', date='2024-05-11')
+    # Entered while the base currency was USD
+    client.post('/set_currency', data={'currency': 'MKD'})
+
+    rows = list(csv.DictReader(io.StringIO(client.get('/export/transactions').get_data(as_text=True))))
+    assert 'amount_in_USD' not in rows[0]
+    assert [float(row['amount_in_MKD']) for row in rows] == [
+        CurrencyConverter.convert(10.0, 'USD', 'MKD'),
+        CurrencyConverter.convert(20.0, 'EUR', 'MKD'),
+    ]
+
+
+def test_json_matches_csv(client, household):
+    add_transaction(client, amount='10', currency='EUR')
+    rows = json.loads(client.get('/export/transactions?format=json').get_data(as_text=True))
+    assert rows[0]['amount_in_USD'] == pytest.approx(CurrencyConverter.convert(10.0, 'EUR', 'USD'))
+    assert rows[0]['currency'] == 'EUR'
+
+
+def test_filters_and_inclusive_end(app, client, household):
+    client.post('/add_category', data={'name': 'Food', 'type': 'expense'})
+    with app.app_context():
+        category_id = Category.query.one().id
+    add_transaction(client, date='2024-05-01', category_id=category_id)
+    add_transaction(client, date='2024-05-31', category_id=category_id)
+    add_transaction(client, date='2024-06-01', category_id=category_id)
+    add_transaction(client, date='2024-05-15')
+
+    body = client.get(f'/export/transactions?start=2024-05-01&end=2024-05-31&category_id={category_id}').get_data(as_text=True)
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert [row['date'][:10] for row in rows] == ['2024-05-01', '2024-05-31']
+    assert {row['category'] for row in rows} == {'Food'}
+
+
+def test_batches_are_joined_into_one_document(app, client, household):
+    for day in range(1, 6):
+        add_transaction(client, date=f'2024-05-{day:02}')
+    with app.app_context():
+        query = export_query(household[1])
+        rows = json.loads(''.join(export_chunks('json', query, 'EUR', batch_size=2)))
+        body = ''.join(export_chunks('csv', query, 'EUR', batch_size=2))
+    assert len(rows) == 5
+    assert len(list(csv.DictReader(io.StringIO(body)))) == 5
+
+
+def test_bad_filters_are_rejected(client, household):
+    assert client.get('/export/transactions?start=May').status_code == 400
+    assert client.get('/export/transactions?format=xml').status_code == 400
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import history_cache
+from extensions import db
+from models import Account
+from retention_utils import compact, record_history
+
+from conftest import register
+
+URL = '/api/history?range=30d&resolution=daily'
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    history_cache._cache.clear()
+
+
+@pytest.fixture
+def account_id(app, household):
+    with app.app_context():
+        account = Account(name='Broker', type='Investment', balance=100.0, currency='USD', household_id=household[1])
+        db.session.add(account)
+        db.session.flush()
+        record_history(account.id, 100.0, 0.0, datetime.utcnow() - timedelta(days=2))
+        db.session.commit()
+        return account.id
+
+
+def revalidate(client, tag):
+    return client.get(URL, headers={'If-None-Match': tag})
+
+
+def test_an_unchanged_history_is_a_304(client, account_id):
+    first = client.get(URL)
+    assert first.status_code == 200 and first.get_json()['datasets']
+    again = revalidate(client, first.headers['ETag'].strip('"'))
+    assert again.status_code == 304 and not again.data
+
+
+def test_repeat_views_are_served_from_the_cache(client, account_id, count_statements):
+    body = client.get(URL).data
+    with count_statements() as counted:
+        assert client.get(URL).data == body
+    assert not [s for s in counted.statements if 'balance_history' in s]
+
+
+def test_a_new_point_changes_the_etag(app, client, account_id):
+    tag = client.get(URL).headers['ETag'].strip('"')
+    with app.app_context():
+        record_history(account_id, 250.0, 0.0, datetime.utcnow() - timedelta(days=1))
+        db.session.commit()
+    response = revalidate(client, tag)
+    assert response.status_code == 200
+    assert 250.0 in response.get_json()['datasets'][0]['data']
+
+
+def test_renaming_an_account_changes_the_etag(app, client, account_id):
+    tag = client.get(URL).headers['ETag'].strip('"')
+    with app.app_context():
+        db.session.get(Account, account_id).name = 'Renamed'
+        db.session.commit()
+    assert revalidate(client, tag).status_code == 200
+
+
+def test_a_currency_switch_changes_the_etag(client, account_id):
+    tag = client.get(URL).headers['ETag'].strip('"')
+    client.post('/set_currency', data={'currency': 'EUR'})
+    assert revalidate(client, tag).status_code == 200
+
+
+def test_compaction_changes_the_etag(app, client, household, account_id):
+    with app.app_context():
+        account = Account(name='Savings', type='Cash', balance=1.0, currency='USD', household_id=household[1])
+        db.session.add(account)
+        db.session.flush()
+        # The first is overtaken the same day, so compaction deletes it
+        noon = datetime.utcnow().replace(hour=12, minute=0) - timedelta(days=30)
+        for date in (noon, noon + timedelta(hours=1), datetime.utcnow() - timedelta(days=1)):
+            record_history(account.id, 1.0, 0.0, date)
+            db.session.flush()
+        db.session.commit()
+    tag = client.get(URL).headers['ETag'].strip('"')
+    with app.app_context():
+        assert compact() > 0
+        db.session.commit()
+    assert revalidate(client, tag).status_code == 200
+
+
+def test_households_do_not_share_responses(app, client, account_id):
+    other = app.test_client()
+    register(other)
+    assert other.get(URL).get_json()['datasets'] == []
@@ -0,0 +1,62 @@
+import identity
+from extensions import db
+from models import Account, User, Household
+
+from conftest import register
+
+
+def add_account(app, household_id):
+    with app.app_context():
+        db.session.add(Account(name='Cash', type='Cash', balance=100.0, currency='USD', household_id=household_id))
+        db.session.commit()
+
+
+def cached_identity(client):
+    with client.session_transaction() as session:
+        return session.get('identity')
+
+
+def test_cached_dashboard_runs_no_more_statements_than_a_fresh_load(app, client, household, count_statements, monkeypatch):
+    add_account(app, household[1])
+
+    monkeypatch.setattr(identity, 'IDENTITY_CACHE_TTL', 0)
+    with count_statements() as uncached:
+        assert client.get('/').status_code == 200
+
+    monkeypatch.setattr(identity, 'IDENTITY_CACHE_TTL', 30)
+    client.get('/')
+    assert cached_identity(client) is not None
+    with count_statements() as cached:
+        assert client.get('/').status_code == 200
+
+    assert len(cached) <= len(uncached)
+    household_reads = [s for s in cached.statements if 'FROM household' in s or 'JOIN household' in s]
+    assert len(household_reads) == 1
+
+
+def test_currency_switch_invalidates_the_cached_identity(client, household):
+    client.get('/')
+    assert cached_identity(client)['base_currency'] == 'USD'
+
+    client.post('/set_currency', data={'currency': 'EUR'})
+    client.get('/')
+    assert cached_identity(client)['base_currency'] == 'EUR'
+
+
+def test_member_removed_by_another_process_loses_the_household(app, household, monkeypatch):
+    with app.app_context():
+        join_code = db.session.get(Household, household[1]).join_code
+    member = app.test_client()
+    member.post('/register', data={'username': 'member', 'password': 'secret',
+                                   'household_action': 'join', 'join_code': join_code})
+    member.get('/household')
+    assert cached_identity(member)['household_id'] == household[1]
+
+    # Another worker process removes the member, this one never hears of it
+    with app.app_context():
+        User.query.filter_by(username='member').one().household_id = None
+        db.session.commit()
+    monkeypatch.setattr(identity, '_invalidated', {})
+
+    member.get('/settings')
+    assert cached_identity(member)['household_id'] is None
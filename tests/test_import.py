@@ -0,0 +1,64 @@
+import io
+
+import pytest
+
+from import_utils import import_transactions, open_text, parse_amount
+from models import MonthlySummary, Transaction
+
+
+def run_import(app, household, data, format='csv', chunk_size=5000):
+    with app.app_context():
+        return import_transactions(open_text(io.BytesIO(data)), format, household[1], household[0], chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize('value, amount', [('1.234,56', 1234.56), ('1,234.56', 1234.56), ('-12,5', -12.5), (' 7 ', 7.0)])
+def test_amount_formats(value, amount):
+    assert parse_amount(value) == amount
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', 'NaN', 'abc'])
+def test_amounts_that_are_not_finite_numbers_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_amount(value)
+
+
+def test_cp1252_bytes_are_read_as_cp1252(app, household):
+    data = 'date,amount,description\n2024-05-10,-4.50,Café\n2024-05-11,-3,Crème brûlée\n'.encode('cp1252')
+    result = run_import(app, household, data)
+    assert (result.imported, result.error_count) == (2, 0)
+    with app.app_context():
+        assert {t.description for t in Transaction.query} == {'Café', 'Crème brûlée'}
+
+
+def test_utf8_with_a_byte_order_mark(app, household):
+    data = '\ufeffDate,Amount,Description\n2024-05-10,-4.50,Café\n'.encode('utf-8')
+    result = run_import(app, household, data)
+    assert result.imported == 1
+    with app.app_context():
+        assert Transaction.query.one().description == 'Café'
+
+
+def test_malformed_rows_are_reported_and_the_rest_imported(app, household):
+    data = (b'date,amount,description,currency\n'
+            b'2024-05-10,-10,ok,USD\n'
+            b'not a date,-10,bad date,USD\n'
+            b'2024-05-12,nan,bad amount,USD\n'
+            b'2024-05-13,-10,bad currency,XYZ\n'
+            b'2024-05-14,,missing amount,USD\n'
+            b'2024-05-15,25,ok,USD\n')
+    result = run_import(app, household, data, chunk_size=1)
+    assert result.imported == 2
+    assert [error.split(':')[0] for error in result.errors] == ['line 3', 'line 4', 'line 5', 'line 6']
+    with app.app_context():
+        totals = {(row.type, row.total) for row in MonthlySummary.query}
+        assert totals == {('expense', 10.0), ('income', 25.0)}
+
+
+def test_ofx(app, household):
+    data = (b'<OFX><CURDEF>EUR<STMTTRN><TRNAMT>-12.34<DTPOSTED>20240510120000<NAME>Bakery &amp; Co</STMTTRN>'
+            b'<STMTTRN><TRNAMT>100<DTPOSTED>20240511<MEMO>Refund</STMTTRN></OFX>')
+    result = run_import(app, household, data, format='ofx')
+    assert result.imported == 2
+    with app.app_context():
+        bakery = Transaction.query.filter_by(description='Bakery & Co').one()
+        assert (bakery.amount, bakery.currency, bakery.type) == (12.34, 'EUR', 'expense')
@@ -0,0 +1,24 @@
+import instrumentation
+from instrumentation import statement_shape
+
+
+def test_in_lists_share_a_shape():
+    assert statement_shape('SELECT * FROM t WHERE id IN (?, ?, ?)') == statement_shape('SELECT * FROM t WHERE id IN (?, ?)')
+
+
+def test_metrics_count_the_statements_of_each_endpoint(client, household):
+    instrumentation._stats.clear()
+    client.get('/')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'budget_requests_total{endpoint="main.index"} 1' in body
+    assert 'budget_db_queries_total{endpoint="main.index"}' in body
+
+
+def test_metrics_are_refused_to_other_hosts(client):
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 403
+
+
+def test_metrics_want_the_token_when_one_is_set(client, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'METRICS_TOKEN', 'sesame')
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer sesame'}).status_code == 200
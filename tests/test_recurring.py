@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from extensions import db
+from models import MonthlySummary, RecurringTransaction, Transaction
+from recurring_utils import add_months, materialize_due
+
+
+def add_recurring(household_id, due, amount=100.0, frequency='monthly'):
+    item = RecurringTransaction(amount=amount, currency='USD', description='Rent', frequency=frequency,
+                                next_due_date=due, anchor_day=due.day, type='expense', household_id=household_id)
+    db.session.add(item)
+    db.session.commit()
+    return item.id
+
+
+def test_monthly_items_keep_their_anchor_day():
+    assert add_months(datetime(2024, 1, 31), 1, 31) == datetime(2024, 2, 29)
+    assert add_months(datetime(2024, 2, 29), 1, 31) == datetime(2024, 3, 31)
+
+
+def test_reruns_create_nothing_new(app, household):
+    now = datetime(2024, 4, 15)
+    with app.app_context():
+        item_id = add_recurring(household[1], datetime(2024, 1, 31))
+
+        assert materialize_due(now=now) == 3
+        assert materialize_due(now=now) == 0
+
+        dates = [t.date for t in Transaction.query.filter_by(recurring_id=item_id).order_by(Transaction.date)]
+        assert dates == [datetime(2024, 1, 31), datetime(2024, 2, 29), datetime(2024, 3, 31)]
+        assert db.session.get(RecurringTransaction, item_id).next_due_date == datetime(2024, 4, 30)
+        assert sum(row.total for row in MonthlySummary.query.filter_by(household_id=household[1])) == 300.0
+
+
+def test_a_conflicting_item_does_not_block_the_rest_of_its_batch(app, household):
+    now = datetime(2024, 2, 15)
+    with app.app_context():
+        stuck_id = add_recurring(household[1], datetime(2024, 2, 1))
+        other_id = add_recurring(household[1], datetime(2024, 2, 1), amount=20.0)
+        # An occurrence left behind by an earlier item with the same id
+        db.session.add(Transaction(amount=100.0, currency='USD', type='expense', date=datetime(2024, 2, 1),
+                                   recurring_id=stuck_id, user_id=household[0], household_id=household[1]))
+        db.session.commit()
+
+        assert materialize_due(now=now) == 1
+
+        assert Transaction.query.filter_by(recurring_id=other_id).count() == 1
+        assert db.session.get(RecurringTransaction, other_id).next_due_date == datetime(2024, 3, 1)
+        assert db.session.get(RecurringTransaction, stuck_id).next_due_date == datetime(2024, 2, 1)
+        rollup = MonthlySummary.query.filter_by(household_id=household[1]).one()
+        assert (rollup.total, rollup.count) == (20.0, 1)
@@ -0,0 +1,79 @@
+import shutil
+
+import pytest
+from flask import g
+
+import replica
+from app import create_app
+from extensions import db
+from migrations import create_schema
+from models import Integration, SyncJob
+
+from conftest import register
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """An app whose replica is a copy of the primary taken before the test writes anything."""
+    primary, copy = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary}',
+        'SQLALCHEMY_BINDS': {replica.REPLICA_BIND: f'sqlite:///{copy}'},
+    })
+    with app.app_context():
+        create_schema()
+    client = app.test_client()
+    household = register(client)
+    with client.session_transaction() as session:
+        session.pop('last_write', None)
+    shutil.copy(primary, copy)
+    return app, client, household
+
+
+def add_transaction(client, description):
+    response = client.post('/transactions', data={'amount': '10', 'description': description, 'type': 'expense',
+                                                  'date': '2024-05-10', 'currency': 'USD'})
+    assert response.status_code == 302
+
+
+def last_write(client):
+    with client.session_transaction() as session:
+        return session.get('last_write')
+
+
+def test_reads_stay_on_the_primary_right_after_a_write(replica_app):
+    app, client, _ = replica_app
+    add_transaction(client, 'Groceries')
+    assert last_write(client) is not None
+    assert b'Groceries' in client.get('/').data
+
+
+def test_reads_go_to_the_replica_once_the_write_is_old(replica_app, monkeypatch):
+    app, client, _ = replica_app
+    add_transaction(client, 'Groceries')
+    monkeypatch.setattr(replica, 'REPLICA_READ_YOUR_WRITES', 0)
+    # The replica copy predates the transaction
+    assert b'Groceries' not in client.get('/').data
+
+
+def test_only_statements_that_change_rows_are_writes(replica_app):
+    app, client, household = replica_app
+    jobs = SyncJob.__table__
+    with app.test_request_context():
+        db.session.execute(jobs.update().where(jobs.c.status == 'running').values(status='failed'))
+        assert not g.get('database_write')
+        db.session.execute(jobs.insert().values(household_id=household[1], status='queued'))
+        assert g.get('database_write')
+
+
+def test_queueing_a_sync_from_the_dashboard_is_not_a_write(replica_app):
+    app, client, household = replica_app
+    with app.app_context():
+        db.session.add(Integration(platform='bybit', household_id=household[1]))
+        db.session.commit()
+
+    client.get('/')
+    with app.app_context():
+        assert SyncJob.query.count() == 1
+    assert last_write(client) is None
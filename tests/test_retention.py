@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from history_utils import build_target_dates, resample
+from models import Account, BalanceHistory
+from retention_utils import DAILY, MONTHLY, RAW, WEEKLY, backfill_levels, compact, history_conditions, record_history
+
+NOW = datetime(2024, 6, 15, 12, 0)
+
+
+@pytest.fixture
+def account_id(app, household):
+    with app.app_context():
+        account = Account(name='Broker', type='Investment', balance=0.0, household_id=household[1])
+        db.session.add(account)
+        db.session.commit()
+        yield account.id
+
+
+def record_series(account_id, dates):
+    for n, date in enumerate(dates):
+        record_history(account_id, float(n), 0.0, date)
+        db.session.flush()
+    db.session.commit()
+
+
+def series(days, hours=8):
+    """A point every `hours` over the `days` up to NOW."""
+    return [NOW - timedelta(days=days) + timedelta(hours=hours * i) for i in range(days * 24 // hours)]
+
+
+def levels(account_id):
+    return {p.date: p.level for p in BalanceHistory.query.filter_by(account_id=account_id)}
+
+
+def expected_level(date, dates):
+    later = [d for d in dates if d > date]
+    if not later:
+        return MONTHLY
+    level = RAW
+    if not any(d.date() == date.date() for d in later):
+        level = DAILY
+    if not any(d.isocalendar()[:2] == date.isocalendar()[:2] for d in later):
+        level = WEEKLY
+    if not any((d.year, d.month) == (date.year, date.month) for d in later):
+        level = MONTHLY
+    return level
+
+
+def test_each_point_is_tagged_with_the_buckets_it_closes(app, account_id):
+    dates = series(90)
+    with app.app_context():
+        record_series(account_id, dates)
+        assert levels(account_id) == {date: expected_level(date, dates) for date in dates}
+
+
+def test_a_late_point_gets_the_level_it_would_have_had(app, account_id):
+    dates = [datetime(2024, 5, 30), datetime(2024, 6, 2), datetime(2024, 5, 31)]
+    with app.app_context():
+        record_series(account_id, dates)
+        assert levels(account_id)[datetime(2024, 5, 31)] == MONTHLY
+
+
+def test_backfill_matches_the_levels_kept_while_recording(app, account_id):
+    with app.app_context():
+        record_series(account_id, series(60))
+        recorded = levels(account_id)
+        with db.engine.begin() as conn:
+            backfill_levels(conn)
+        db.session.expire_all()
+        assert levels(account_id) == recorded
+
+
+def chart(account_id, resolution, start, only_needed):
+    query = BalanceHistory.query.filter_by(account_id=account_id)
+    if only_needed:
+        query = query.filter(*history_conditions(resolution, start))
+    points = [(p.date, p.balance, p.invested_amount) for p in query.order_by(BalanceHistory.date)]
+    return resample(points, build_target_dates(start, NOW, resolution))
+
+
+@pytest.mark.parametrize('resolution, days', [('daily', 30), ('weekly', 365), ('monthly', 365)])
+def test_charts_read_from_their_level_match_charts_from_every_point(app, account_id, resolution, days):
+    with app.app_context():
+        record_series(account_id, series(400, hours=15))
+        start = NOW - timedelta(days=days)
+        assert chart(account_id, resolution, start, True) == chart(account_id, resolution, start, False)
+
+
+def test_compaction_keeps_what_the_charts_read(app, account_id):
+    with app.app_context():
+        record_series(account_id, series(400, hours=15))
+        start = NOW - timedelta(days=30)
+        before = chart(account_id, 'daily', start, False)
+
+        deleted = compact(now=NOW)
+        db.session.commit()
+
+        assert deleted > 0
+        assert chart(account_id, 'daily', start, False) == before
+        remaining = BalanceHistory.query.filter_by(account_id=account_id)
+        assert not remaining.filter(BalanceHistory.level == RAW, BalanceHistory.date < NOW - timedelta(days=7)).count()
+        assert remaining.filter(BalanceHistory.level == MONTHLY).count() >= 13
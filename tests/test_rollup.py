@@ -0,0 +1,140 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Category, MonthlySummary, RecurringTransaction, Transaction
+from rollup_utils import rebuild, record_mappings
+
+
+def ledger_totals(household_id):
+    """The rollup as it should be, computed from the ledger."""
+    totals = {}
+    for t in Transaction.query.filter_by(household_id=household_id):
+        key = (t.date.year, t.date.month, t.category_id, t.income_source_id, t.type, t.currency)
+        total, count = totals.get(key, (0.0, 0))
+        totals[key] = (round(total + t.amount, 6), count + 1)
+    return totals
+
+
+def rollup_totals(household_id):
+    totals = {}
+    for row in MonthlySummary.query.filter_by(household_id=household_id):
+        key = (row.year, row.month, row.category_id, row.income_source_id, row.type, row.currency)
+        assert key not in totals, f"duplicate rollup row {key}"
+        totals[key] = (round(row.total, 6), row.count)
+    return totals
+
+
+@pytest.fixture
+def check(app, household):
+    def check():
+        with app.app_context():
+            assert rollup_totals(household[1]) == ledger_totals(household[1])
+    return check
+
+
+def add_transaction(client, **fields):
+    data = {'amount': '10', 'description': 'x', 'type': 'expense', 'date': '2024-05-10', 'currency': 'USD'}
+    data.update(fields)
+    assert client.post('/transactions', data=data).status_code == 302
+
+
+def newest(app, household_id, model):
+    with app.app_context():
+        return model.query.filter_by(household_id=household_id).order_by(model.id.desc()).first().id
+
+
+def delete_transactions(app, client, household_id):
+    with app.app_context():
+        ids = [t.id for t in Transaction.query.filter_by(household_id=household_id)]
+    for transaction_id in ids:
+        assert client.get(f'/transactions/delete/{transaction_id}').status_code == 302
+
+
+def test_adds_to_one_bucket_increment_it(app, client, household, check):
+    add_transaction(client)
+    add_transaction(client, amount='5')
+    add_transaction(client, currency='EUR')
+    check()
+    with app.app_context():
+        assert MonthlySummary.query.count() == 2
+
+
+def test_edits_move_the_transaction_between_buckets(app, client, household, check):
+    add_transaction(client)
+    add_transaction(client)
+    transaction_id = newest(app, household[1], Transaction)
+    client.post(f'/transactions/update/{transaction_id}', data={
+        'amount': '7', 'description': 'x', 'type': 'expense', 'date': '2024-06-01', 'currency': 'USD'})
+    check()
+
+
+def test_deletes_empty_the_buckets(app, client, household, check):
+    add_transaction(client)
+    add_transaction(client, date='2024-06-10')
+    delete_transactions(app, client, household[1])
+    check()
+    with app.app_context():
+        assert MonthlySummary.query.count() == 0
+
+
+def test_deleting_a_category_moves_its_transactions_to_no_category(app, client, household, check):
+    client.post('/add_category', data={'name': 'Food', 'type': 'expense'})
+    category_id = newest(app, household[1], Category)
+    add_transaction(client, category_id=category_id)
+    add_transaction(client)
+
+    client.get(f'/delete_category/{category_id}')
+    check()
+    delete_transactions(app, client, household[1])
+    check()
+
+
+def test_deleting_a_recurring_item_moves_its_transactions_to_no_income_source(app, client, household, check):
+    client.post('/add_recurring', data={'amount': '100', 'description': 'Salary', 'frequency': 'monthly',
+                                        'next_due_date': '2030-01-01', 'type': 'income', 'currency': 'USD'})
+    recurring_id = newest(app, household[1], RecurringTransaction)
+    add_transaction(client, income_source_id=recurring_id)
+    add_transaction(client)
+
+    client.get(f'/delete_recurring/{recurring_id}')
+    check()
+    delete_transactions(app, client, household[1])
+    check()
+
+
+def test_bulk_inserts_add_to_existing_buckets(app, client, household, check):
+    add_transaction(client)
+    with app.app_context():
+        mappings = [{'amount': amount, 'currency': 'USD', 'type': 'expense', 'date': datetime(2024, 5, day),
+                     'category_id': None, 'income_source_id': None, 'user_id': household[0],
+                     'household_id': household[1], 'amount_in_base_currency': amount}
+                    for amount, day in ((1.0, 1), (2.0, 2), (3.0, 3))]
+        db.session.execute(Transaction.__table__.insert(), mappings)
+        record_mappings(mappings)
+        db.session.commit()
+    check()
+
+
+def test_a_bucket_with_null_ids_is_unique(app, household):
+    with app.app_context():
+        row = dict(household_id=household[1], year=2024, month=5, category_id=None, income_source_id=None,
+                   type='expense', currency='USD', total=1.0, count=1)
+        db.session.add(MonthlySummary(**row))
+        db.session.commit()
+        db.session.add(MonthlySummary(**row))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+
+
+def test_rebuild_repairs_a_drifted_rollup(app, client, household, check):
+    add_transaction(client)
+    add_transaction(client, date='2024-06-10')
+    with app.app_context():
+        MonthlySummary.query.filter_by(month=5).update({'total': 999.0})
+        MonthlySummary.query.filter_by(month=6).delete()
+        rebuild(household_id=household[1])
+        db.session.commit()
+    check()
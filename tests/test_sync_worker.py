@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import sync_worker
+from extensions import db
+from models import Integration, SyncJob
+from sync_worker import SyncWorker, enqueue_sync
+
+
+def running_job(household_id, heartbeat_age):
+    now = datetime.utcnow()
+    job = SyncJob(household_id=household_id, status='running', started_at=now - timedelta(hours=1),
+                  heartbeat_at=now - timedelta(seconds=heartbeat_age))
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_a_job_with_a_recent_heartbeat_is_left_running(app, household):
+    with app.app_context():
+        job = running_job(household[1], heartbeat_age=5)
+        assert enqueue_sync(household[1]).id == job.id
+        assert db.session.get(SyncJob, job.id).status == 'running'
+
+
+def test_a_job_without_a_heartbeat_is_failed_and_requeued(app, household):
+    with app.app_context():
+        job = running_job(household[1], heartbeat_age=sync_worker.SYNC_JOB_TIMEOUT + 60)
+        queued = enqueue_sync(household[1])
+        assert queued.id != job.id and queued.status == 'queued'
+        assert db.session.get(SyncJob, job.id).status == 'failed'
+
+
+def test_finish_leaves_a_job_that_is_no_longer_running_alone(app, household):
+    with app.app_context():
+        job = running_job(household[1], heartbeat_age=0)
+        SyncJob.query.filter_by(id=job.id).update({'status': 'failed', 'error': 'abandoned'})
+        db.session.commit()
+
+        SyncWorker(app).finish(job, [])
+        db.session.expire_all()
+        assert (job.status, job.error) == ('failed', 'abandoned')
+
+
+def test_stale_integrations_without_a_client_are_not_scheduled(app, household):
+    with app.app_context():
+        db.session.add(Integration(platform='unknown', household_id=household[1]))
+        db.session.commit()
+        SyncWorker(app, clients=sync_worker.LOCAL_CLIENTS).schedule_stale()
+        assert SyncJob.query.count() == 0
+
+
+def test_a_pass_syncs_the_queued_households(app, household, capsys):
+    with app.app_context():
+        db.session.add(Integration(platform='bybit', household_id=household[1]))
+        db.session.commit()
+    SyncWorker(app, clients=sync_worker.LOCAL_CLIENTS).run_once()
+    with app.app_context():
+        job = SyncJob.query.one()
+        assert job.status == 'success' and job.heartbeat_at is not None
+        assert Integration.query.one().last_synced is not None
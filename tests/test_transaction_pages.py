@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from app import TRANSACTIONS_PAGE_SIZE, transaction_page
+from extensions import db
+from models import Transaction
+
+from conftest import register
+
+
+def insert_transactions(app, household, dates):
+    with app.app_context():
+        db.session.execute(Transaction.__table__.insert(), [
+            {'amount': 1.0, 'currency': 'USD', 'amount_in_base_currency': 1.0, 'description': f't{i}',
+             'type': 'expense', 'date': date, 'user_id': household[0], 'household_id': household[1]}
+            for i, date in enumerate(dates)
+        ])
+        db.session.commit()
+
+
+def walk(client, year=2024, month=5):
+    """The ids of every page of /api/transactions, and the number of pages."""
+    ids, pages, params = [], 0, {'year': year, 'month': month}
+    while True:
+        body = client.get('/api/transactions', query_string=params).get_json()
+        pages += 1
+        ids += [t['id'] for t in body['transactions']]
+        if not body['next']:
+            return ids, pages
+        params = {'year': year, 'month': month, **body['next']}
+
+
+def expected_ids(app, household_id):
+    with app.app_context():
+        return [t.id for t in Transaction.query.filter_by(household_id=household_id)
+                .order_by(Transaction.date.desc(), Transaction.id.desc())]
+
+
+def test_rows_sharing_a_date_are_neither_repeated_nor_skipped(app, client, household):
+    insert_transactions(app, household, [datetime(2024, 5, 10)] * (TRANSACTIONS_PAGE_SIZE * 2 + 7))
+    ids, pages = walk(client)
+    assert ids == expected_ids(app, household[1])
+    assert pages == 3
+
+
+def test_a_full_last_page_has_no_next_cursor(app, client, household):
+    insert_transactions(app, household, [datetime(2024, 5, 1) + timedelta(hours=i) for i in range(TRANSACTIONS_PAGE_SIZE * 2)])
+    ids, pages = walk(client)
+    assert len(ids) == TRANSACTIONS_PAGE_SIZE * 2
+    assert pages == 2
+
+
+def test_a_page_covers_its_month_only(app, client, household):
+    insert_transactions(app, household, [datetime(2024, 4, 30, 23, 59, 59), datetime(2024, 5, 1),
+                                         datetime(2024, 5, 31, 23, 59, 59), datetime(2024, 6, 1)])
+    ids, _ = walk(client)
+    with app.app_context():
+        assert [db.session.get(Transaction, i).date.day for i in ids] == [31, 1]
+
+
+def test_other_households_are_not_listed(app, client, household):
+    other = register(app.test_client())
+    insert_transactions(app, other, [datetime(2024, 5, 10)] * 3)
+    insert_transactions(app, household, [datetime(2024, 5, 10)])
+    ids, _ = walk(client)
+    assert ids == expected_ids(app, household[1])
+
+
+def test_the_cursor_is_exclusive(app, household):
+    insert_transactions(app, household, [datetime(2024, 5, 10)] * 3 + [datetime(2024, 5, 11)])
+    with app.app_context():
+        first, cursor = transaction_page(household[1], datetime(2024, 5, 1), datetime(2024, 5, 31), limit=2)
+        second, end = transaction_page(household[1], datetime(2024, 5, 1), datetime(2024, 5, 31), before=cursor, limit=2)
+        assert cursor == (first[-1].date, first[-1].id)
+        assert not {t.id for t in first} & {t.id for t in second}
+        assert len(second) == 2 and end is None
+
+
+def test_a_malformed_cursor_is_rejected(client, household):
+    response = client.get('/api/transactions', query_string={'year': 2024, 'month': 5, 'before_id': '3', 'before_date': 'yesterday'})
+    assert response.status_code == 400